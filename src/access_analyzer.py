@@ -1,46 +1,247 @@
-from typing import Dict, List
-import pandas as pd
-from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+from collections import Counter, deque
+from datetime import datetime
+import threading
+import time
+from .anomaly_detector import AnomalyDetector
+from .event_store import EventStore
+from .utils import epoch_us, from_epoch_us
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
+class _UserWindow:
+    """Sliding-window counters for one user.
+
+    Buckets are kept oldest to newest as
+    ``[bucket_id, count, data_type_counts, action_counts]`` and only exist
+    for periods with at least one event. Window totals are maintained
+    alongside so reads never have to re-sum the buckets.
+    """
+
+    __slots__ = ('buckets', 'count', 'data_types', 'actions', 'last_access')
+
+    def __init__(self):
+        self.buckets: Deque[List] = deque()
+        self.count = 0
+        self.data_types: Counter = Counter()
+        self.actions: Counter = Counter()
+        self.last_access = 0.0
+
+    def add(
+            self,
+            bucket_id: int,
+            oldest_id: int,
+            timestamp: float,
+            data_type: str,
+            action: str
+    ):
+        """Record one event in its bucket."""
+        bucket = self._bucket(bucket_id, oldest_id)
+        if bucket is None:
+            return
+
+        bucket[1] += 1
+        bucket[2][data_type] += 1
+        bucket[3][action] += 1
+        self.count += 1
+        self.data_types[data_type] += 1
+        self.actions[action] += 1
+        self.last_access = max(self.last_access, timestamp)
+
+    def evict(self, oldest_id: int):
+        """Drop buckets that have slid out of the window."""
+        buckets = self.buckets
+        if not buckets or buckets[0][0] >= oldest_id:
+            return
+
+        while buckets and buckets[0][0] < oldest_id:
+            _, count, data_types, actions = buckets.popleft()
+            self.count -= count
+            self.data_types.subtract(data_types)
+            self.actions.subtract(actions)
+
+        if buckets:
+            self.data_types = +self.data_types
+            self.actions = +self.actions
+        else:
+            self.data_types.clear()
+            self.actions.clear()
+            self.last_access = 0.0
+
+    def _bucket(self, bucket_id: int, oldest_id: int) -> Optional[List]:
+        """Find or create the bucket for ``bucket_id``."""
+        if bucket_id < oldest_id:
+            return None
+
+        buckets = self.buckets
+        if not buckets or buckets[-1][0] < bucket_id:
+            bucket = [bucket_id, 0, Counter(), Counter()]
+            buckets.append(bucket)
+            return bucket
+
+        # Late event: walk back from the newest bucket
+        for position in range(len(buckets) - 1, -1, -1):
+            existing = buckets[position]
+            if existing[0] == bucket_id:
+                return existing
+            if existing[0] < bucket_id:
+                bucket = [bucket_id, 0, Counter(), Counter()]
+                buckets.insert(position + 1, bucket)
+                return bucket
+
+        bucket = [bucket_id, 0, Counter(), Counter()]
+        buckets.appendleft(bucket)
+        return bucket
+
+
 class AccessAnalyzer:
-    """Analyzes data access patterns."""
+    """Analyzes data access patterns.
+
+    Each user has a sliding window of ``lookback_days`` split into buckets of
+    ``bucket_seconds``. ``track_access`` updates the current bucket in O(1)
+    and expired buckets are evicted as the window moves, so memory per user
+    is bounded by the number of buckets. The window edge is accurate to one
+    bucket. Each time the window moves on by a bucket, users with no events
+    left in it are swept, so memory is bounded by the users active within
+    the window rather than every user ever seen.
+
+    With ``keep_history`` the raw events are also kept in a columnar
+    ``EventStore`` for ad hoc range queries; chunks older than the window
+    are dropped as it moves.
+
+    Events are also fed to the optional ``anomaly_detector``, whose risk
+    flags ``ContextHandler`` can score.
+    """
 
-    def __init__(self, lookback_days: int = 30):
+    def __init__(
+            self,
+            lookback_days: int = 30,
+            bucket_seconds: int = 3600,
+            keep_history: bool = True,
+            anomaly_detector: Optional[AnomalyDetector] = None
+    ):
         self.lookback_days = lookback_days
-        self.access_history: List[Dict] = []
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(
+            1, -(-lookback_days * 86400 // bucket_seconds)
+        )
+        self.windows: Dict[str, _UserWindow] = {}
+        self.access_history: Optional[EventStore] = (
+            EventStore() if keep_history else None
+        )
+        self.anomaly_detector = anomaly_detector
+        self._lock = threading.Lock()
+        self._swept_id = self._oldest_bucket_id()
 
-    def track_access(self, user_id: str, data_type: str, action: str):
+    def track_access(
+            self,
+            user_id: str,
+            data_type: str,
+            action: str,
+            timestamp: Optional[datetime] = None
+    ):
         """Record a data access event."""
-        self.access_history.append({
-            'timestamp': datetime.now().isoformat(),
-            'user_id': user_id,
-            'data_type': data_type,
-            'action': action
-        })
+        ts = timestamp.timestamp() if timestamp else time.time()
+        bucket_id = int(ts // self.bucket_seconds)
+
+        with self._lock:
+            oldest_id = self._oldest_bucket_id()
+            if oldest_id != self._swept_id:
+                self._sweep(oldest_id)
+
+            window = self.windows.get(user_id)
+            if window is None:
+                window = self.windows[user_id] = _UserWindow()
+            window.evict(oldest_id)
+            window.add(bucket_id, oldest_id, ts, data_type, action)
+
+            if self.access_history is not None:
+                self.access_history.append(
+                    user_id, data_type, action, int(ts * 1_000_000)
+                )
+                self.access_history.trim(
+                    oldest_id * self.bucket_seconds * 1_000_000
+                )
+
+        if self.anomaly_detector is not None:
+            self.anomaly_detector.observe(user_id, data_type, ts)
 
     def analyze_patterns(self, user_id: str) -> Dict:
         """Analyze access patterns for a user."""
         try:
-            df = pd.DataFrame(self.access_history)
-            if df.empty:
-                return {}
+            with self._lock:
+                window = self.windows.get(user_id)
+                if window is None:
+                    return {}
 
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            user_df = df[df['user_id'] == user_id]
+                window.evict(self._oldest_bucket_id())
+                if not window.count:
+                    del self.windows[user_id]
+                    return {}
 
-            cutoff = datetime.now() - timedelta(days=self.lookback_days)
-            recent_df = user_df[user_df['timestamp'] > cutoff]
+                return {
+                    'access_frequency': window.count,
+                    'data_types': dict(window.data_types),
+                    'actions': dict(window.actions),
+                    'last_access': datetime.fromtimestamp(
+                        window.last_access
+                    ).isoformat()
+                }
+        except Exception as e:
+            logger.error(f"Error analyzing patterns: {e}")
+            return {}
+
+    def analyze_history(
+            self,
+            user_id: str,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None
+    ) -> Dict:
+        """Analyze a user's retained events in an arbitrary time range."""
+        try:
+            if self.access_history is None:
+                return {}
+
+            with self._lock:
+                stats = self.access_history.aggregate(
+                    user_id,
+                    epoch_us(start) if start else None,
+                    epoch_us(end) if end else None
+                )
+            if not stats:
+                return {}
 
             return {
-                'access_frequency': len(recent_df),
-                'data_types': recent_df['data_type'].value_counts().to_dict(),
-                'actions': recent_df['action'].value_counts().to_dict(),
-                'last_access': recent_df['timestamp'].max().isoformat()
+                'access_frequency': stats['access_frequency'],
+                'data_types': stats['data_types'],
+                'actions': stats['actions'],
+                'last_access': from_epoch_us(
+                    stats['last_access_us']
+                ).isoformat()
             }
         except Exception as e:
-            logger.error(f"Error analyzing patterns: {e}")
+            logger.error(f"Error analyzing history: {e}")
             return {}
+
+    def sweep(self) -> int:
+        """Drop the windows of users idle for the whole lookback; returns
+        how many were dropped."""
+        with self._lock:
+            return self._sweep(self._oldest_bucket_id())
+
+    def _sweep(self, oldest_id: int) -> int:
+        self._swept_id = oldest_id
+        idle = [
+            user_id for user_id, window in self.windows.items()
+            if not window.buckets or window.buckets[-1][0] < oldest_id
+        ]
+        for user_id in idle:
+            del self.windows[user_id]
+        return len(idle)
+
+    def _oldest_bucket_id(self) -> int:
+        """Id of the oldest bucket still inside the window."""
+        current_id = int(time.time() // self.bucket_seconds)
+        return current_id - self.bucket_count + 1
@@ -0,0 +1,423 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from array import array
+from collections import OrderedDict
+import math
+import threading
+import time
+import numpy as np
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Risk flags raised by the detector; ``ContextHandler`` scores them
+HIGH_ACCESS_RATE = 'high_access_rate'
+ACCESS_SPIKE = 'access_spike'
+MANY_DATA_TYPES = 'many_data_types'
+
+BITMAP_BITS = 64
+
+# Forward-decayed weights are rescaled before exp() of this overflows
+MAX_DECAY_EXPONENT = 50.0
+MAX_FACTOR_EXPONENT = 700.0
+
+Cells = Sequence[int]
+
+
+class DecayedCountMinSketch:
+    """Count-min sketch of exponentially decayed counts.
+
+    Uses forward decay: an event at time ``t`` adds ``exp(lambda * (t -
+    landmark))`` and estimates are scaled back by the same factor for the
+    query time, so nothing has to be decayed per event. When the factor
+    grows large, every cell is rescaled and the landmark moves.
+    Conservative update keeps over-estimates from hash collisions small.
+
+    A decayed count ``c`` with half-life ``h`` corresponds to a rate of
+    ``c * ln(2) / h`` events per second.
+    """
+
+    def __init__(self, width: int, depth: int, half_life: float):
+        self.width = width
+        self.depth = depth
+        self.decay = math.log(2) / half_life
+        self.landmark: Optional[float] = None
+        # Called with the rescale factor, for holders of ``add`` results
+        self.on_rescale: Optional[Callable[[float], None]] = None
+        self.rows = [array('d', bytes(8 * width)) for _ in range(depth)]
+
+    def add(self, cells: Cells, timestamp: float, count: float = 1.0) -> float:
+        """Add a decayed count; returns the scaled estimate after it."""
+        weight = count * self._scale(timestamp)
+        rows = self.rows
+        values = [row[cell] for row, cell in zip(rows, cells)]
+        target = min(values) + weight
+        for row, cell, value in zip(rows, cells, values):
+            if value < target:
+                row[cell] = target
+        return target
+
+    def estimate(self, cells: Cells, timestamp: float) -> float:
+        """Decayed count as of ``timestamp``."""
+        if self.landmark is None:
+            return 0.0
+        scaled = min([row[cell] for row, cell in zip(self.rows, cells)])
+        return scaled / self._factor(timestamp)
+
+    def rate(self, cells: Cells, timestamp: float) -> float:
+        """Decayed event rate in events per second."""
+        return self.estimate(cells, timestamp) * self.decay
+
+    def unscale(self, scaled: float, timestamp: float) -> float:
+        """Turn a value returned by ``add`` into a decayed count."""
+        return scaled / self._factor(timestamp)
+
+    def _factor(self, timestamp: float) -> float:
+        # Long after the last rescale every count has decayed to nothing
+        return math.exp(min(
+            self.decay * (timestamp - self.landmark), MAX_FACTOR_EXPONENT
+        ))
+
+    def _scale(self, timestamp: float) -> float:
+        """Weight of one event at ``timestamp``, rescaling when needed."""
+        if self.landmark is None:
+            self.landmark = timestamp
+        exponent = self.decay * (timestamp - self.landmark)
+        if exponent > MAX_DECAY_EXPONENT:
+            shrink = math.exp(-exponent)
+            for row in self.rows:
+                np.frombuffer(row, dtype=np.float64)[:] *= shrink
+            self.landmark = timestamp
+            if self.on_rescale is not None:
+                self.on_rescale(shrink)
+            exponent = 0.0
+        return math.exp(exponent)
+
+
+class DistinctSketch:
+    """Estimates how many distinct values each key has seen recently.
+
+    Keys map to one 64-bit bitmap per row, count-min style; a value sets
+    one bit, and the estimate is the linear-counting count of the bitmap
+    with the fewest bits set. Bitmaps cover the current and previous
+    ``window`` seconds and are cleared as windows roll over. Suited to
+    small cardinalities, such as data types per user.
+    """
+
+    def __init__(self, width: int, depth: int, window: float):
+        self.width = width
+        self.depth = depth
+        self.window = window
+        self.window_id: Optional[int] = None
+        self.current = [array('Q', bytes(8 * width)) for _ in range(depth)]
+        self.previous = [array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def add(self, cells: Cells, value_hash: int, timestamp: float) -> float:
+        """Record a value; returns the distinct estimate after it."""
+        self._roll(timestamp)
+        bit = 1 << (value_hash % BITMAP_BITS)
+        bits = BITMAP_BITS
+        for current, previous, cell in zip(self.current, self.previous, cells):
+            value = current[cell] | bit
+            current[cell] = value
+            count = (value | previous[cell]).bit_count()
+            if count < bits:
+                bits = count
+        return self._linear_count(bits)
+
+    def estimate(self, cells: Cells) -> float:
+        return self._linear_count(min([
+            (current[cell] | previous[cell]).bit_count()
+            for current, previous, cell in zip(
+                self.current, self.previous, cells
+            )
+        ]))
+
+    @staticmethod
+    def _linear_count(bits: int) -> float:
+        """Distinct values behind ``bits`` set bits, allowing for values
+        that hashed to the same bit."""
+        if not bits:
+            return 0.0
+        if bits >= BITMAP_BITS:
+            return float(BITMAP_BITS)
+        return -BITMAP_BITS * math.log(1 - bits / BITMAP_BITS)
+
+    def _roll(self, timestamp: float):
+        window_id = int(timestamp // self.window)
+        if self.window_id is None:
+            self.window_id = window_id
+        if window_id <= self.window_id:
+            return
+
+        if window_id == self.window_id + 1:
+            self.previous, self.current = self.current, self.previous
+        else:
+            for row in self.previous:
+                np.frombuffer(row, dtype=np.uint64)[:] = 0
+        for row in self.current:
+            np.frombuffer(row, dtype=np.uint64)[:] = 0
+        self.window_id = window_id
+
+
+class AnomalyDetector:
+    """Streaming per-user access anomaly detection in fixed memory.
+
+    Fed one event at a time (``AccessAnalyzer.track_access`` calls
+    ``observe``), it keeps:
+
+    * a short-term and a baseline decayed access rate per user, in
+      ``DecayedCountMinSketch``es with half-lives ``short_half_life`` and
+      ``baseline_half_life`` seconds;
+    * the number of distinct data types per user over the last one to two
+      ``distinct_window`` seconds, in a ``DistinctSketch``;
+    * the ``top_k`` users by baseline rate (heavy hitters).
+
+    Each event costs ``depth`` cell updates per sketch and memory is
+    ``width * depth * 32`` bytes however many users there are. Sketches
+    over-estimate when many users share cells, so ``width`` should be
+    around the number of users active within a half-life.
+
+    After each event the user's flags are re-evaluated:
+    ``high_access_rate`` when the short-term rate exceeds
+    ``rate_threshold`` per minute, ``access_spike`` when it exceeds
+    ``spike_factor`` times the user's baseline rate (and at least
+    ``min_spike_rate`` per minute) and ``many_data_types`` when more than
+    ``distinct_threshold`` data types were accessed. Raised flags last
+    ``flag_ttl`` seconds, on a clock that is the later of the wall clock
+    and the latest event timestamp observed: flags raised by replayed
+    events last as long as live ones, and flags expire on a quiet stream.
+    At most ``max_flagged`` users are held, least recently flagged dropped
+    first. ``on_change(user_id)`` is called whenever a user's flags change:
+    raised, changed, cleared, expired (see ``expire``) or dropped.
+    """
+
+    def __init__(
+            self,
+            width: int = 1 << 16,
+            depth: int = 4,
+            short_half_life: float = 60.0,
+            baseline_half_life: float = 86400.0,
+            distinct_window: float = 3600.0,
+            rate_threshold: float = 120.0,
+            spike_factor: float = 10.0,
+            min_spike_rate: float = 10.0,
+            distinct_threshold: float = 6.0,
+            flag_ttl: float = 300.0,
+            top_k: int = 20,
+            max_flagged: int = 100000,
+            on_change: Optional[Callable[[str], None]] = None
+    ):
+        self.width = width
+        self.depth = depth
+        self.rate_threshold = rate_threshold
+        self.spike_factor = spike_factor
+        self.min_spike_rate = min_spike_rate
+        self.distinct_threshold = distinct_threshold
+        self.flag_ttl = flag_ttl
+        self.top_k = top_k
+        self.max_flagged = max_flagged
+        self.on_change = on_change
+
+        self.short_rates = DecayedCountMinSketch(width, depth, short_half_life)
+        self.baseline_rates = DecayedCountMinSketch(
+            width, depth, baseline_half_life
+        )
+        self.baseline_rates.on_rescale = self._rescale_heavy_hitters
+        self.data_types = DistinctSketch(width, depth, distinct_window)
+
+        self._heavy: Dict[str, float] = {}
+        self._heavy_floor = 0.0
+        # Oldest deadline first; _next_expiry is the deadline at the front
+        self._flagged: OrderedDict = OrderedDict()
+        self._next_expiry = float('inf')
+        self._clock = float('-inf')
+        self._lock = threading.Lock()
+
+    def observe(
+            self,
+            user_id: str,
+            data_type: str,
+            timestamp: Optional[float] = None
+    ) -> Tuple[str, ...]:
+        """Record one access event; returns the user's flags after it."""
+        ts = time.time() if timestamp is None else timestamp
+        cells = self._cells(user_id)
+
+        with self._lock:
+            self._clock = max(self._clock, ts)
+            short = self.short_rates.add(cells, ts)
+            baseline = self.baseline_rates.add(cells, ts)
+            distinct = self.data_types.add(cells, hash(data_type), ts)
+            self._track_heavy_hitter(user_id, baseline)
+
+            short_rate = self._per_minute(self.short_rates, short, ts)
+            baseline_rate = self._per_minute(
+                self.baseline_rates, baseline, ts
+            )
+            flags = []
+            if short_rate > self.rate_threshold:
+                flags.append(HIGH_ACCESS_RATE)
+            if short_rate >= self.min_spike_rate and \
+                    short_rate > self.spike_factor * baseline_rate:
+                flags.append(ACCESS_SPIKE)
+            if distinct > self.distinct_threshold:
+                flags.append(MANY_DATA_TYPES)
+            now = self._now()
+            changed = self._expire(now)
+            changed += self._set_flags(user_id, tuple(flags), now)
+
+        self._notify(changed)
+        return tuple(flags)
+
+    def flags(self, user_id: str) -> Tuple[str, ...]:
+        """A user's current risk flags; a dict lookup, safe on the hot
+        path."""
+        entry = self._flagged.get(user_id)
+        if entry is None or entry[1] < self._now():
+            return ()
+        return entry[0]
+
+    def expire(self) -> int:
+        """Clear flags that have run out and call ``on_change`` for their
+        users; returns how many were cleared.
+
+        Costs one comparison when nothing is due, so callers about to rely
+        on a user's context version can run it first.
+        """
+        now = self._now()
+        if self._next_expiry >= now:
+            return 0
+        with self._lock:
+            expired = self._expire(now)
+        self._notify(expired)
+        return len(expired)
+
+    def user_stats(
+            self,
+            user_id: str,
+            timestamp: Optional[float] = None
+    ) -> Dict:
+        """Sketch estimates for one user."""
+        ts = time.time() if timestamp is None else timestamp
+        cells = self._cells(user_id)
+        with self._lock:
+            return {
+                'rate_per_min': round(
+                    self.short_rates.rate(cells, ts) * 60, 3
+                ),
+                'baseline_rate_per_min': round(
+                    self.baseline_rates.rate(cells, ts) * 60, 3
+                ),
+                'distinct_data_types': round(
+                    self.data_types.estimate(cells), 2
+                ),
+                'flags': list(self.flags(user_id))
+            }
+
+    def heavy_hitters(
+            self,
+            timestamp: Optional[float] = None
+    ) -> List[Tuple[str, float]]:
+        """Top users by baseline rate, as ``(user_id, per-minute rate)``."""
+        ts = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self.baseline_rates.landmark is None:
+                return []
+            ranked = sorted(
+                self._heavy.items(), key=lambda item: item[1], reverse=True
+            )
+            return [
+                (user_id, round(
+                    self._per_minute(self.baseline_rates, scaled, ts), 3
+                ))
+                for user_id, scaled in ranked
+            ]
+
+    @staticmethod
+    def _per_minute(
+            sketch: DecayedCountMinSketch,
+            scaled: float,
+            timestamp: float
+    ) -> float:
+        """Per-minute rate from a scaled count returned by ``add``."""
+        return sketch.unscale(scaled, timestamp) * sketch.decay * 60
+
+    def _cells(self, user_id: str) -> List[int]:
+        """Column of ``user_id`` in each sketch row (double hashing)."""
+        h = hash(user_id) & 0xFFFFFFFFFFFFFFFF
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        width = self.width
+        return [(h1 + i * h2) % width for i in range(self.depth)]
+
+    def _track_heavy_hitter(self, user_id: str, scaled: float):
+        """Keep the ``top_k`` users by (scaled) baseline count."""
+        heavy = self._heavy
+        if user_id in heavy or len(heavy) < self.top_k:
+            heavy[user_id] = scaled
+            if len(heavy) == self.top_k:
+                self._heavy_floor = min(heavy.values())
+            return
+        if scaled <= self._heavy_floor:
+            return
+
+        del heavy[min(heavy, key=heavy.get)]
+        heavy[user_id] = scaled
+        self._heavy_floor = min(heavy.values())
+
+    def _rescale_heavy_hitters(self, shrink: float):
+        for user_id in self._heavy:
+            self._heavy[user_id] *= shrink
+        self._heavy_floor *= shrink
+
+    def _now(self) -> float:
+        return max(self._clock, time.time())
+
+    def _set_flags(
+            self,
+            user_id: str,
+            flags: Tuple[str, ...],
+            now: float
+    ) -> List[str]:
+        """Store a user's flags; returns the users whose active flags
+        changed, including any dropped to make room."""
+        flagged = self._flagged
+        entry = flagged.get(user_id)
+        previous = entry[0] if entry and entry[1] >= now else ()
+        changed = [user_id] if flags != previous else []
+
+        if flags:
+            flagged[user_id] = (flags, now + self.flag_ttl)
+            flagged.move_to_end(user_id)
+            if len(flagged) > self.max_flagged:
+                changed.append(flagged.popitem(last=False)[0])
+        elif entry is not None:
+            del flagged[user_id]
+        self._next_expiry = (
+            next(iter(flagged.values()))[1] if flagged else float('inf')
+        )
+        return changed
+
+    def _expire(self, now: float) -> List[str]:
+        """Drop flags whose deadline has passed; call with the lock held."""
+        flagged = self._flagged
+        expired = []
+        while flagged:
+            user_id, (_, deadline) = next(iter(flagged.items()))
+            if deadline >= now:
+                break
+            del flagged[user_id]
+            expired.append(user_id)
+        self._next_expiry = (
+            next(iter(flagged.values()))[1] if flagged else float('inf')
+        )
+        return expired
+
+    def _notify(self, user_ids: List[str]):
+        if self.on_change is None:
+            return
+        for user_id in user_ids:
+            try:
+                self.on_change(user_id)
+            except Exception as e:
+                logger.error(f"Anomaly callback error: {e}")
@@ -0,0 +1,166 @@
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+import json
+from .main import PrivacyEngine
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class AsyncPrivacyEngine:
+    """asyncio front end for ``PrivacyEngine`` with request coalescing.
+
+    Requests arriving within ``window`` seconds of each other are collected
+    into one micro-batch (flushed early at ``max_batch``) and checked with a
+    single ``check_access_batch`` call on an executor, so the event loop
+    never blocks on model inference or storage. Identical requests already
+    in flight share one future instead of being checked twice.
+
+    Results match awaiting each call on its own, in arrival order: batches
+    keep contexts in request order (see ``check_access_batch``), and a
+    request that brings a new context stops later requests of that user
+    from sharing a result computed before the change.
+    """
+
+    def __init__(
+            self,
+            engine: Optional[PrivacyEngine] = None,
+            window: float = 0.002,
+            max_batch: int = 512,
+            executor: Optional[Executor] = None
+    ):
+        self.engine = engine or PrivacyEngine()
+        self.window = window
+        self.max_batch = max_batch
+        self.coalesced = 0
+        self.batches = 0
+
+        # One worker by default so batches never run against the engine
+        # concurrently
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='AsyncPrivacyEngine'
+        )
+        self._pending: List[Tuple[Hashable, Dict, asyncio.Future]] = []
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._inflight_by_user: Dict[str, Set[Hashable]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def check_access(
+            self,
+            user_id: str,
+            data_type: str,
+            action: str,
+            context: Optional[Dict] = None
+    ) -> Dict:
+        """Check access permission without blocking the event loop."""
+        key = self._request_key(user_id, data_type, action, context)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return dict(await asyncio.shield(future))
+
+        if context:
+            self._forget_user(user_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        self._inflight_by_user.setdefault(user_id, set()).add(key)
+        self._pending.append((key, {
+            'user_id': user_id,
+            'data_type': data_type,
+            'action': action,
+            'context': context
+        }, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return dict(await asyncio.shield(future))
+
+    async def close(self):
+        """Flush pending requests and release the executor."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _flush(self):
+        """Hand the pending micro-batch to the executor."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(
+            self,
+            batch: List[Tuple[Hashable, Dict, asyncio.Future]]
+    ):
+        """Check a micro-batch and resolve its futures."""
+        loop = asyncio.get_running_loop()
+        requests = [request for _, request, _ in batch]
+        self.batches += 1
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self.engine.check_access_batch, requests
+            )
+        except Exception as e:
+            logger.error(f"Async batch check error: {e}")
+            results = [
+                {'allowed': False, 'reason': 'System error'}
+                for _ in requests
+            ]
+
+        for (key, _, future), result in zip(batch, results):
+            if self._inflight.get(key) is future:
+                self._discard_inflight(key)
+            if not future.done():
+                future.set_result(result)
+
+    def _forget_user(self, user_id: str):
+        """Stop new requests from joining a user's in-flight checks."""
+        for key in self._inflight_by_user.pop(user_id, ()):
+            del self._inflight[key]
+
+    def _discard_inflight(self, key: Hashable):
+        """Remove a completed check from the in-flight indexes."""
+        del self._inflight[key]
+        keys = self._inflight_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._inflight_by_user[key[0]]
+
+    @staticmethod
+    def _request_key(
+            user_id: str,
+            data_type: str,
+            action: str,
+            context: Optional[Dict]
+    ) -> Hashable:
+        """Identity of a request for in-flight deduplication."""
+        if not context:
+            return (user_id, data_type, action, None)
+        return (
+            user_id,
+            data_type,
+            action,
+            json.dumps(context, sort_keys=True, default=str)
+        )
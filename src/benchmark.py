@@ -0,0 +1,469 @@
+"""Reproducible benchmarks for the enforcement hot path.
+
+Generates a synthetic workload of users, policies, contexts and access
+events, then times each stage separately and the end-to-end path::
+
+    python -m src.benchmark --users 1000 --requests 5000 --output bench.json
+    python -m src.benchmark --compare bench.json
+
+Every stage reports p50/p99/mean latency, throughput and
+``process_peak_rss_mb``, the peak RSS of the whole benchmark process so
+far. Stages share the process, so a stage's figure also covers every
+stage before it; run a stage on its own with ``--stages`` to measure its
+memory. ``import_time`` times ``import src.main`` in fresh interpreters,
+so its throughput is imports per second. Results are written as JSON
+together with the workload parameters and library versions, so runs of
+different versions can be compared.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+from datetime import datetime, timedelta
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from .main import PrivacyEngine
+from .data_tracker import DataTracker
+from .access_analyzer import AccessAnalyzer
+from .logger import setup_logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = setup_logger(__name__)
+
+DATA_TYPES = [
+    'customer_data', 'financial_data', 'health_data', 'employee_data',
+    'marketing_data', 'audit_logs', 'source_code', 'analytics'
+]
+ACTIONS = ['read', 'write', 'delete', 'export', 'share']
+LOCATIONS = ['office', 'remote', 'vpn', 'home', 'travel']
+DEVICES = ['laptop', 'desktop', 'mobile', 'tablet']
+RISK_FLAGS = ['new_device', 'unusual_time', 'suspicious_ip']
+RULE_ACTIONS = ['allow', 'deny', 'require_mfa']
+
+IMPORT_RUNS = 5
+
+# Measures only the import itself, not interpreter startup
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter_ns(); import {module}; "
+    "print(time.perf_counter_ns() - t)"
+)
+
+DEFAULT_STAGES = [
+    'import_time', 'ml_predict', 'check_access', 'log_access',
+    'analyze_patterns', 'end_to_end'
+]
+
+
+def generate_workload(
+        users: int = 1000,
+        policies: int = 50,
+        requests: int = 5000,
+        events: int = 50000,
+        seed: int = 0
+) -> Dict:
+    """Build a deterministic synthetic workload.
+
+    Returns a dict of ``users``, per-user ``contexts``, ``policies``,
+    ``requests`` (dicts accepted by ``check_access_batch``) and ``events``
+    (``(user_id, data_type, action, timestamp)`` tuples spread over the
+    last 30 days).
+    """
+    rng = random.Random(seed)
+    user_ids = [f"user{i:06d}" for i in range(users)]
+
+    contexts = {}
+    for user_id in user_ids:
+        context = {
+            'location': rng.choice(LOCATIONS),
+            'device': rng.choice(DEVICES)
+        }
+        if rng.random() < 0.2:
+            context['risk_flags'] = rng.sample(RISK_FLAGS, rng.randint(1, 2))
+        contexts[user_id] = context
+
+    policy_set = {}
+    for i in range(policies):
+        rules = []
+        for j in range(rng.randint(1, 4)):
+            conditions = {'location': rng.sample(LOCATIONS, 2)}
+            if rng.random() < 0.5:
+                conditions['risk_score'] = round(rng.uniform(0.2, 0.8), 2)
+            rules.append({
+                'id': f"policy{i:04d}_rule{j}",
+                'data_type': rng.choice(DATA_TYPES),
+                'conditions': conditions,
+                'action': rng.choice(RULE_ACTIONS)
+            })
+        policy_set[f"policy{i:04d}"] = {
+            'rules': rules,
+            'actions': rng.sample(ACTIONS, rng.randint(1, len(ACTIONS)))
+        }
+
+    request_list = []
+    for _ in range(requests):
+        user_id = rng.choice(user_ids)
+        request = {
+            'user_id': user_id,
+            'data_type': rng.choice(DATA_TYPES),
+            'action': rng.choice(ACTIONS),
+            'context': None
+        }
+        # Most requests reuse the stored context; some move the user
+        if rng.random() < 0.1:
+            request['context'] = dict(
+                contexts[user_id], location=rng.choice(LOCATIONS)
+            )
+        request_list.append(request)
+
+    now = datetime.now()
+    window = 30 * 24 * 3600
+    event_list = [
+        (
+            rng.choice(user_ids),
+            rng.choice(DATA_TYPES),
+            rng.choice(ACTIONS),
+            now - timedelta(seconds=rng.uniform(0, window))
+        )
+        for _ in range(events)
+    ]
+    event_list.sort(key=lambda event: event[3])
+
+    return {
+        'users': user_ids,
+        'contexts': contexts,
+        'policies': policy_set,
+        'requests': request_list,
+        'events': event_list
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size over the lifetime of this process, in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / scale, 2)
+
+
+def measure(
+        func: Callable,
+        calls: Sequence,
+        warmup: int = 100
+) -> Dict:
+    """Time ``func(*args)`` for every args tuple in ``calls``.
+
+    The first ``warmup`` calls are run but not recorded.
+    """
+    for args in calls[:warmup]:
+        func(*args)
+
+    timed = calls[warmup:] or calls
+    latencies = np.empty(len(timed), dtype=np.int64)
+    perf_counter_ns = time.perf_counter_ns
+    started = perf_counter_ns()
+    for i, args in enumerate(timed):
+        t0 = perf_counter_ns()
+        func(*args)
+        latencies[i] = perf_counter_ns() - t0
+    elapsed = (perf_counter_ns() - started) / 1e9
+
+    return summarize(latencies, elapsed)
+
+
+def summarize(latencies_ns: np.ndarray, elapsed: float) -> Dict:
+    """Latency percentiles in microseconds plus throughput."""
+    latencies_us = latencies_ns / 1000
+    p50, p99 = np.percentile(latencies_us, [50, 99])
+    return {
+        'calls': int(len(latencies_us)),
+        'p50_us': round(float(p50), 2),
+        'p99_us': round(float(p99), 2),
+        'mean_us': round(float(latencies_us.mean()), 2),
+        'max_us': round(float(latencies_us.max()), 2),
+        'throughput_per_s': round(len(latencies_us) / elapsed, 1),
+        'process_peak_rss_mb': peak_rss_mb()
+    }
+
+
+def build_engine(
+        workload: Dict,
+        cache_size: int = 0,
+        compile_model: bool = False
+) -> PrivacyEngine:
+    """Create an engine loaded with the workload's policies and contexts.
+
+    The model is trained on labels derived from the synthetic contexts so
+    predictions go through a fitted forest.
+    """
+    engine = PrivacyEngine(cache_size=cache_size)
+    engine.ml_engine.compile_model = compile_model
+    engine.policy_manager.add_policies(workload['policies'])
+    for user_id, context in workload['contexts'].items():
+        engine.context_handler.update_context(user_id, context)
+
+    encoder = engine.ml_engine.encoder
+    features, labels = [], []
+    for request in workload['requests']:
+        user_id = request['user_id']
+        risk_score = engine.context_handler.evaluate_risk(
+            user_id, request['action']
+        )
+        features.append(encoder.request_features(
+            risk_score,
+            request['data_type'],
+            request['action'],
+            workload['contexts'][user_id]
+        ))
+        labels.append(int(risk_score < 0.5))
+    if len(set(labels)) < 2:
+        labels[0] = 1 - labels[0]
+    engine.ml_engine.train(features, labels)
+    return engine
+
+
+def _bench_ml_predict(workload: Dict, engine: PrivacyEngine, **_) -> Dict:
+    encoder = engine.ml_engine.encoder
+    calls = [
+        (encoder.request_features(
+            0.3, request['data_type'], request['action'],
+            workload['contexts'][request['user_id']]
+        ),)
+        for request in workload['requests']
+    ]
+    return measure(engine.ml_engine.predict, calls)
+
+
+def _bench_check_access(workload: Dict, engine: PrivacyEngine, **_) -> Dict:
+    calls = [
+        (r['user_id'], r['data_type'], r['action'], r['context'])
+        for r in workload['requests']
+    ]
+    return measure(engine.check_access, calls)
+
+
+def _bench_log_access(workload: Dict, db_dir: str, **_) -> Dict:
+    tracker = DataTracker(os.path.join(db_dir, 'log_access.db'))
+    calls = [
+        (r['user_id'], r['data_type'], r['action'], True, r['context'] or {})
+        for r in workload['requests']
+    ]
+    try:
+        return measure(tracker.log_access, calls)
+    finally:
+        tracker.close()
+
+
+def _bench_analyze_patterns(workload: Dict, **_) -> Dict:
+    analyzer = AccessAnalyzer(keep_history=False)
+    for user_id, data_type, action, timestamp in workload['events']:
+        analyzer.track_access(user_id, data_type, action, timestamp)
+    calls = [(r['user_id'],) for r in workload['requests']]
+    return measure(analyzer.analyze_patterns, calls)
+
+
+def _bench_end_to_end(
+        workload: Dict,
+        engine: PrivacyEngine,
+        db_dir: str,
+        **_
+) -> Dict:
+    """Decision, audit log write and pattern tracking for each request."""
+    tracker = DataTracker(os.path.join(db_dir, 'end_to_end.db'))
+    analyzer = AccessAnalyzer()
+
+    def handle(user_id, data_type, action, context):
+        result = engine.check_access(user_id, data_type, action, context)
+        tracker.log_access(
+            user_id, data_type, action, result['allowed'], context or {}
+        )
+        analyzer.track_access(user_id, data_type, action)
+        return result
+
+    calls = [
+        (r['user_id'], r['data_type'], r['action'], r['context'])
+        for r in workload['requests']
+    ]
+    try:
+        return measure(handle, calls)
+    finally:
+        tracker.close()
+
+
+def measure_import_time(
+        module: str = 'src.main',
+        runs: int = IMPORT_RUNS
+) -> Dict:
+    """Time importing ``module`` in ``runs`` fresh interpreters."""
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, '-c', IMPORT_SNIPPET.format(module=module)]
+    latencies = np.empty(runs, dtype=np.int64)
+    started = time.perf_counter()
+    for i in range(runs):
+        output = subprocess.run(
+            command, cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout
+        latencies[i] = int(output.split()[-1])
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def _bench_import_time(**_) -> Dict:
+    return measure_import_time()
+
+
+STAGES = {
+    'import_time': _bench_import_time,
+    'ml_predict': _bench_ml_predict,
+    'check_access': _bench_check_access,
+    'log_access': _bench_log_access,
+    'analyze_patterns': _bench_analyze_patterns,
+    'end_to_end': _bench_end_to_end
+}
+
+
+def run_benchmarks(
+        users: int = 1000,
+        policies: int = 50,
+        requests: int = 5000,
+        events: int = 50000,
+        seed: int = 0,
+        stages: Optional[List[str]] = None,
+        cache_size: int = 0,
+        compile_model: bool = False
+) -> Dict:
+    """Run the selected stages and return the JSON-serialisable report."""
+    stages = stages or DEFAULT_STAGES
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark stages: {sorted(unknown)}")
+
+    params = {
+        'users': users,
+        'policies': policies,
+        'requests': requests,
+        'events': events,
+        'seed': seed,
+        'cache_size': cache_size,
+        'compile_model': compile_model
+    }
+    workload = generate_workload(users, policies, requests, events, seed)
+    engine = build_engine(workload, cache_size, compile_model)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='ppee_bench_') as db_dir:
+        for stage in stages:
+            logger.info(f"Benchmarking {stage}")
+            results[stage] = STAGES[stage](
+                workload=workload, engine=engine, db_dir=db_dir
+            )
+
+    return {
+        'created_at': datetime.now().isoformat(),
+        'environment': environment(),
+        'params': params,
+        'results': results
+    }
+
+
+def environment() -> Dict:
+    """Interpreter, platform and library versions for the report."""
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """Format per-stage p50/p99/throughput changes against a baseline."""
+    lines = []
+    for stage, stats in current['results'].items():
+        base = baseline.get('results', {}).get(stage)
+        if not base:
+            lines.append(f"{stage:18s} (no baseline)")
+            continue
+        changes = []
+        for key in ('p50_us', 'p99_us', 'throughput_per_s'):
+            if base.get(key):
+                change = (stats[key] - base[key]) / base[key] * 100
+                changes.append(f"{key} {stats[key]:>10} ({change:+.1f}%)")
+        lines.append(f"{stage:18s} " + "  ".join(changes))
+    return lines
+
+
+def _quiet_engine_loggers():
+    """Keep engine INFO logging out of the measured latencies; the
+    benchmark's own progress messages stay."""
+    for name in list(logging.root.manager.loggerDict):
+        if name.split('.')[0] == __package__ and name != __name__:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--policies', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-size', type=int, default=0)
+    parser.add_argument(
+        '--compile-model', action='store_true',
+        help='serve predictions from the compiled forest'
+    )
+    parser.add_argument(
+        '--stages', nargs='+', choices=sorted(STAGES), default=None
+    )
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='baseline JSON report to diff')
+    parser.add_argument(
+        '--log-requests', action='store_true',
+        help='keep engine INFO logging enabled while timing'
+    )
+    args = parser.parse_args(argv)
+
+    if not args.log_requests:
+        _quiet_engine_loggers()
+
+    report = run_benchmarks(
+        users=args.users,
+        policies=args.policies,
+        requests=args.requests,
+        events=args.events,
+        seed=args.seed,
+        stages=args.stages,
+        cache_size=args.cache_size,
+        compile_model=args.compile_model
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("\n".join(compare(report, baseline)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
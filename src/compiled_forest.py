@@ -0,0 +1,128 @@
+from typing import Dict
+import numpy as np
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ARRAY_FIELDS = ('feature', 'threshold', 'children', 'leaf_value', 'roots')
+
+# Check for an all-leaf frontier only every few steps; the check itself
+# costs about as much as a step
+LEAF_CHECK_INTERVAL = 8
+
+
+class CompiledForest:
+    """Flat-array form of a fitted random forest for fast batched scoring.
+
+    All trees are concatenated into shared node arrays. ``children`` holds
+    ``[right, left]`` pairs so the next node is
+    ``children[2 * node + (x <= threshold)]``, and leaf nodes point to
+    themselves, so every row can be stepped through every tree at once for
+    ``max_depth`` iterations with plain NumPy indexing. Only the positive
+    class probability is kept at each leaf.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], max_depth: int):
+        for name in ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        """Export a fitted ``RandomForestClassifier``."""
+        if len(model.classes_) < 2:
+            raise ValueError("Model was trained on a single class")
+
+        features, thresholds, children = [], [], []
+        values, roots = [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            left = np.where(is_leaf, node_ids, tree.children_left)
+            right = np.where(is_leaf, node_ids, tree.children_right)
+            children.append(np.stack([right, left], axis=1).ravel() + offset)
+
+            counts = tree.value[:, 0, :]
+            values.append(counts[:, 1] / counts.sum(axis=1))
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        arrays = {
+            'feature': np.concatenate(features).astype(np.intp),
+            'threshold': np.concatenate(thresholds).astype(np.float64),
+            'children': np.concatenate(children).astype(np.intp),
+            'leaf_value': np.concatenate(values).astype(np.float64),
+            'roots': np.array(roots, dtype=np.intp)
+        }
+        return cls(arrays, max_depth)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Return the positive-class probability for each row of ``X``."""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[0] == 1:
+            return np.array([self._predict_row(X[0])])
+
+        rows = np.arange(X.shape[0])[None, :]
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for step in range(self.max_depth):
+            goes_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = self.children[2 * nodes + goes_left]
+            if step % LEAF_CHECK_INTERVAL == 0 and (next_nodes == nodes).all():
+                break
+            nodes = next_nodes
+
+        return self.leaf_value[nodes].mean(axis=0)
+
+    def _predict_row(self, x: np.ndarray) -> float:
+        """Single-row path over 1-D arrays, avoiding 2-D indexing."""
+        children = self.children
+        feature = self.feature
+        threshold = self.threshold
+        nodes = self.roots
+        for step in range(self.max_depth):
+            goes_left = x[feature[nodes]] <= threshold[nodes]
+            next_nodes = children[2 * nodes + goes_left]
+            if step % LEAF_CHECK_INTERVAL == 0 and (next_nodes == nodes).all():
+                break
+            nodes = next_nodes
+        return float(self.leaf_value[nodes].mean())
+
+    def to_dict(self) -> Dict:
+        """Node arrays and depth as a plain dict, e.g. for joblib."""
+        return {
+            'arrays': {name: getattr(self, name) for name in ARRAY_FIELDS},
+            'max_depth': self.max_depth
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CompiledForest':
+        return cls(data['arrays'], data['max_depth'])
+
+    def save(self, path: str):
+        """Write the node arrays to an ``.npz`` file."""
+        np.savez(
+            path,
+            max_depth=np.array(self.max_depth),
+            **{name: getattr(self, name) for name in ARRAY_FIELDS}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledForest':
+        """Read node arrays written by ``save``."""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in ARRAY_FIELDS}
+            return cls(arrays, int(data['max_depth']))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ARRAY_FIELDS)
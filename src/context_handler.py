@@ -1,54 +1,299 @@
-from typing import Dict, Optional
-from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import threading
+import time
+import numpy as np
+from .anomaly_detector import (
+    ACCESS_SPIKE, HIGH_ACCESS_RATE, MANY_DATA_TYPES, AnomalyDetector
+)
+from .context_store import ContextRecord, ContextStore, compact_context
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Bit position of each flag is its index here
+RISK_FACTORS = {
+    'unknown_location': 0.8,
+    'unusual_time': 0.6,
+    'suspicious_ip': 0.9,
+    'new_device': 0.7,
+    # Raised by an AnomalyDetector rather than sent with the context
+    HIGH_ACCESS_RATE: 0.7,
+    ACCESS_SPIKE: 0.6,
+    MANY_DATA_TYPES: 0.5
+}
+
+NO_CONTEXT_RISK = 1.0  # High risk if no context
+
 
 class ContextHandler:
-    """Handles user context and environment factors."""
+    """Handles user context and environment factors.
+
+    Contexts live in a ``ContextStore``; pass a bounded one to cap memory.
+    A context's version is drawn from a handler-wide counter, so a user who
+    is evicted and comes back never reuses an old version.
+
+    Risk flags are encoded as a bitmask when the context is written, and the
+    score of every possible mask is precomputed, so evaluating risk is a
+    single table lookup.
+
+    With an ``anomaly_detector``, the flags it currently raises for a user
+    are added to the mask of the stored context. A change in a user's flags
+    gives their context a new version, so cached decisions are not reused.
+    The detector's own ``on_change`` callback, if any, is still called.
 
-    def __init__(self):
-        self.contexts: Dict[str, Dict] = {}
+    Records are replaced with ``ContextStore.compare_and_set``, so a context
+    update and a flag change racing for the same user never undo each
+    other.
+    """
+
+    def __init__(
+            self,
+            store: Optional[ContextStore] = None,
+            anomaly_detector: Optional[AnomalyDetector] = None
+    ):
+        self.store = store if store is not None else ContextStore()
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self.risk_factors = dict(RISK_FACTORS)
+        self.rebuild_risk_table()
+        self.anomaly_detector = anomaly_detector
+        if anomaly_detector is not None:
+            on_change = anomaly_detector.on_change
+            if on_change is None:
+                anomaly_detector.on_change = self._anomaly_flags_changed
+            else:
+                def chained(user_id: str):
+                    self._anomaly_flags_changed(user_id)
+                    on_change(user_id)
+                anomaly_detector.on_change = chained
+
+    def rebuild_risk_table(self):
+        """Recompute flag bits and mask scores from ``risk_factors``.
+
+        Contexts written before the rebuild keep their old masks.
+        """
+        self._flag_bits = {
+            flag: 1 << i for i, flag in enumerate(self.risk_factors)
+        }
+        weights = list(self.risk_factors.values())
+        self._risk_table: List[float] = [
+            max(
+                (w for i, w in enumerate(weights) if mask >> i & 1),
+                default=0.0
+            )
+            for mask in range(1 << len(weights))
+        ]
+        self._risk_array = np.array(
+            self._risk_table + [NO_CONTEXT_RISK], dtype=np.float64
+        )
 
     def update_context(self, user_id: str, context_data: Dict) -> bool:
-        """Update user context."""
+        """Update user context.
+
+        The user's context version is only bumped when the data actually
+        changes, so cached decisions survive repeated identical updates.
+        """
         try:
-            self.contexts[user_id] = {
-                **context_data,
-                'last_updated': datetime.now().isoformat()
-            }
-            return True
+            context = compact_context(context_data)
+            risk_mask = self._risk_mask(context)
+            stored = {**context, 'last_updated': int(time.time())}
+            while True:
+                previous = self.store.get(user_id)
+                if previous is None or _changed(previous.context, context):
+                    version = self._next_version()
+                else:
+                    version = previous.version
+                if self.store.compare_and_set(
+                        user_id,
+                        previous,
+                        ContextRecord(stored, version, risk_mask)
+                ):
+                    return True
         except Exception as e:
             logger.error(f"Error updating context: {e}")
             return False
 
     def get_context(self, user_id: str) -> Optional[Dict]:
         """Get current context for a user."""
-        return self.contexts.get(user_id)
+        record = self.store.get(user_id)
+        return record.context if record is not None else None
 
-    def evaluate_risk(self, user_id: str, action: str) -> float:
-        """Evaluate risk based on context."""
-        try:
-            context = self.get_context(user_id)
-            if not context:
-                return 1.0  # High risk if no context
+    def get_version(self, user_id: str) -> int:
+        """Get the version of a user's context, 0 if never set.
+
+        Anomaly flags that have run out are expired first, so a version
+        read to key cached decisions never outlives a flag.
+        """
+        if self.anomaly_detector is not None:
+            self.anomaly_detector.expire()
+        record = self.store.get(user_id)
+        return record.version if record is not None else 0
 
-            risk_factors = {
-                'unknown_location': 0.8,
-                'unusual_time': 0.6,
-                'suspicious_ip': 0.9,
-                'new_device': 0.7
-            }
+    def export_state(self) -> Dict[str, Tuple[Dict, int, int]]:
+        """In-memory contexts, versions and risk masks keyed by user id.
 
-            risk_score = 0.0
-            flags = context.get('risk_flags', [])
+        Anomaly flags raised at export time are included in the masks.
+        """
+        return {
+            user_id: (
+                record.context,
+                record.version,
+                record.risk_mask | self._anomaly_mask(user_id)
+            )
+            for user_id, record in self.store.items()
+        }
 
-            for flag in flags:
-                if flag in risk_factors:
-                    risk_score = max(risk_score, risk_factors[flag])
+    def load_state(self, state: Dict[str, Tuple[Dict, int, int]]):
+        """Replace in-memory contexts with an exported state."""
+        self.store.clear()
+        for user_id, (context, version, risk_mask) in state.items():
+            self.store.put(
+                user_id, ContextRecord(context, version, risk_mask)
+            )
 
-            return risk_score
+    def export_records(
+            self,
+            user_ids: Iterable[str]
+    ) -> Dict[str, Tuple[Dict, int, int]]:
+        """Like ``export_state`` but only for ``user_ids``.
+
+        Users without a context get an empty one with version 0.
+        """
+        records = {}
+        for user_id in user_ids:
+            if user_id in records:
+                continue
+            record = self.store.get(user_id)
+            if record is None:
+                records[user_id] = ({}, 0, 0)
+            else:
+                records[user_id] = (
+                    record.context,
+                    record.version,
+                    record.risk_mask | self._anomaly_mask(user_id)
+                )
+        return records
+
+    def apply_records(self, records: Dict[str, Tuple[Dict, int, int]]):
+        """Store records from ``export_records``, leaving other users as
+        they are."""
+        for user_id, (context, version, risk_mask) in records.items():
+            current = self.store.get(user_id)
+            if (current is None or current.version != version
+                    or current.risk_mask != risk_mask):
+                self.store.put(
+                    user_id, ContextRecord(context, version, risk_mask)
+                )
+
+    def evaluate_risk(self, user_id: str, action: str) -> float:
+        """Evaluate risk based on context."""
+        try:
+            record = self.store.get(user_id)
+            if record is None or not record.context:
+                return NO_CONTEXT_RISK
+            if self.anomaly_detector is None:
+                return self._risk_table[record.risk_mask]
+            return self._risk_table[
+                record.risk_mask | self._anomaly_mask(user_id)
+            ]
         except Exception as e:
             logger.error(f"Error evaluating risk: {e}")
             return 1.0
+
+    def evaluate_context_risk(self, context: Dict) -> float:
+        """Risk of a context that is not stored, e.g. one read from the
+        access log."""
+        if not context:
+            return NO_CONTEXT_RISK
+        return self._risk_table[self._risk_mask(context)]
+
+    def evaluate_risk_batch(self, user_ids: Sequence[str]) -> np.ndarray:
+        """Evaluate risk for many users with one vectorised lookup."""
+        try:
+            no_context = len(self._risk_table)
+            masks = np.fromiter(
+                (
+                    self._record_mask(user_id, no_context)
+                    for user_id in user_ids
+                ),
+                dtype=np.intp,
+                count=len(user_ids)
+            )
+            return self._risk_array[masks]
+        except Exception as e:
+            logger.error(f"Error evaluating batch risk: {e}")
+            return np.full(len(user_ids), 1.0)
+
+    def _record_mask(self, user_id: str, no_context: int) -> int:
+        """Risk mask of a user, or the no-context slot of the risk array."""
+        record = self.store.get(user_id)
+        if record is None or not record.context:
+            return no_context
+        if self.anomaly_detector is None:
+            return record.risk_mask
+        return record.risk_mask | self._anomaly_mask(user_id)
+
+    def _anomaly_mask(self, user_id: str) -> int:
+        """Bitmask of the anomaly flags currently raised for a user."""
+        if self.anomaly_detector is None:
+            return 0
+        mask = 0
+        flag_bits = self._flag_bits
+        for flag in self.anomaly_detector.flags(user_id):
+            mask |= flag_bits.get(flag, 0)
+        return mask
+
+    def _anomaly_flags_changed(self, user_id: str):
+        """Re-version a user's context when their anomaly flags change."""
+        while True:
+            record = self.store.get(user_id)
+            if record is None or self.store.compare_and_set(
+                    user_id,
+                    record,
+                    ContextRecord(
+                        record.context, self._next_version(), record.risk_mask
+                    )
+            ):
+                return
+
+    def _next_version(self) -> int:
+        with self._generation_lock:
+            self.generation += 1
+            return self.generation
+
+    def _risk_mask(self, context: Dict) -> int:
+        """Encode a context's known risk flags as a bitmask."""
+        mask = 0
+        flag_bits = self._flag_bits
+        for flag in context.get('risk_flags', ()):
+            mask |= flag_bits.get(flag, 0)
+        return mask
+
+
+def split_on_context_changes(requests: List[Dict]) -> Iterator[List[Dict]]:
+    """Split a batch wherever a context would change a user already seen.
+
+    Applying each part's contexts and then checking the part gives the same
+    results as handling the requests one at a time.
+    """
+    start = 0
+    seen = set()
+    for i, request in enumerate(requests):
+        user_id = request['user_id']
+        if request.get('context') and user_id in seen:
+            yield requests[start:i]
+            start = i
+            seen.clear()
+        seen.add(user_id)
+    if start < len(requests):
+        yield requests[start:]
+
+
+def _changed(previous: Dict, context_data: Dict) -> bool:
+    """Check whether new context data differs from a stored context."""
+    if len(previous) - ('last_updated' in previous) != len(context_data):
+        return True
+    return any(
+        key not in previous or previous[key] != value
+        for key, value in context_data.items()
+    )
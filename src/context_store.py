@@ -0,0 +1,264 @@
+from typing import Dict, Iterator, Optional, Tuple
+from collections import OrderedDict
+import json
+import sqlite3
+import sys
+import threading
+import time
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ContextRecord:
+    """Compact per-user context entry.
+
+    ``context`` is the stored context dict with interned strings and an
+    epoch-seconds ``last_updated``; ``version`` changes whenever the context
+    data changes, ``risk_mask`` holds the risk flags the owner derived from
+    the context at write time and ``last_access`` drives idle eviction.
+    """
+
+    __slots__ = ('context', 'version', 'risk_mask', 'last_access')
+
+    def __init__(
+            self,
+            context: Dict,
+            version: int,
+            risk_mask: int = 0,
+            last_access: int = 0
+    ):
+        self.context = context
+        self.version = version
+        self.risk_mask = risk_mask
+        self.last_access = last_access or int(time.time())
+
+
+class SqliteSpillStore:
+    """SQLite backend holding context records evicted from memory."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS spilled_contexts (
+                    user_id TEXT PRIMARY KEY,
+                    version INTEGER,
+                    risk_mask INTEGER,
+                    context TEXT
+                )
+            """)
+
+    def save(self, user_id: str, record: ContextRecord):
+        """Write a record, replacing any older spilled copy."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO spilled_contexts VALUES (?, ?, ?, ?)",
+                (
+                    user_id,
+                    record.version,
+                    record.risk_mask,
+                    json.dumps(record.context)
+                )
+            )
+
+    def load(self, user_id: str) -> Optional[ContextRecord]:
+        """Remove and return a spilled record, if there is one."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT version, risk_mask, context FROM spilled_contexts "
+                "WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "DELETE FROM spilled_contexts WHERE user_id = ?", (user_id,)
+            )
+        return ContextRecord(
+            compact_context(json.loads(row[2])), row[0], row[1]
+        )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM spilled_contexts")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM spilled_contexts"
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Shard:
+    __slots__ = ('records', 'lock')
+
+    def __init__(self):
+        self.records: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+
+class ContextStore:
+    """Bounded, lock-striped store of per-user context records.
+
+    Users are spread over ``shards`` independently locked LRU maps. A shard
+    evicts its least recently used users once it holds more than its share
+    of ``max_users``, and users idle for longer than ``idle_ttl`` seconds
+    are evicted as the shard is touched. Evicted records go to the optional
+    ``spill`` backend and are transparently reloaded on the next read;
+    without one they are dropped.
+    """
+
+    def __init__(
+            self,
+            shards: int = 16,
+            max_users: Optional[int] = None,
+            idle_ttl: Optional[float] = None,
+            spill: Optional[SqliteSpillStore] = None
+    ):
+        self.shards = [_Shard() for _ in range(shards)]
+        self.shard_capacity = -(-max_users // shards) if max_users else None
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[ContextRecord]:
+        """Return a user's record and mark it recently used."""
+        shard = self._shard(user_id)
+        now = int(time.time())
+        with shard.lock:
+            record = shard.records.get(user_id)
+            if record is not None and self._expired(record, now):
+                self._evict(shard, user_id)
+                record = None
+
+            if record is None and self.spill is not None:
+                record = self.spill.load(user_id)
+                if record is not None:
+                    shard.records[user_id] = record
+                    self._enforce_limits(shard, now)
+
+            if record is None:
+                return None
+
+            record.last_access = now
+            shard.records.move_to_end(user_id)
+            return record
+
+    def put(self, user_id: str, record: ContextRecord):
+        """Insert or replace a user's record."""
+        shard = self._shard(user_id)
+        now = int(time.time())
+        record.last_access = now
+        with shard.lock:
+            shard.records[user_id] = record
+            shard.records.move_to_end(user_id)
+            self._enforce_limits(shard, now)
+
+    def compare_and_set(
+            self,
+            user_id: str,
+            expected: Optional[ContextRecord],
+            record: ContextRecord
+    ) -> bool:
+        """Store ``record`` only if the user's in-memory record is still
+        ``expected`` (None for no record); returns whether it was stored."""
+        shard = self._shard(user_id)
+        now = int(time.time())
+        with shard.lock:
+            if shard.records.get(user_id) is not expected:
+                return False
+            record.last_access = now
+            shard.records[user_id] = record
+            shard.records.move_to_end(user_id)
+            self._enforce_limits(shard, now)
+            return True
+
+    def items(self) -> Iterator[Tuple[str, ContextRecord]]:
+        """Iterate over in-memory records, one shard at a time."""
+        for shard in self.shards:
+            with shard.lock:
+                items = list(shard.records.items())
+            yield from items
+
+    def sweep(self) -> int:
+        """Evict every idle user now; returns the number evicted."""
+        if self.idle_ttl is None:
+            return 0
+
+        before = self.evictions
+        now = int(time.time())
+        for shard in self.shards:
+            with shard.lock:
+                self._evict_idle(shard, now)
+        return self.evictions - before
+
+    def clear(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.records.clear()
+        if self.spill is not None:
+            self.spill.clear()
+
+    def __len__(self) -> int:
+        return sum(len(shard.records) for shard in self.shards)
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self.shards[hash(user_id) % len(self.shards)]
+
+    def _expired(self, record: ContextRecord, now: int) -> bool:
+        return (
+            self.idle_ttl is not None and
+            now - record.last_access > self.idle_ttl
+        )
+
+    def _enforce_limits(self, shard: _Shard, now: int):
+        """Evict idle users, then least recently used ones over capacity."""
+        self._evict_idle(shard, now)
+        if self.shard_capacity is None:
+            return
+        while len(shard.records) > self.shard_capacity:
+            self._evict(shard, next(iter(shard.records)))
+
+    def _evict_idle(self, shard: _Shard, now: int):
+        """Evict from the LRU end while records are past the idle TTL."""
+        if self.idle_ttl is None:
+            return
+        while shard.records:
+            user_id, record = next(iter(shard.records.items()))
+            if not self._expired(record, now):
+                return
+            self._evict(shard, user_id)
+
+    def _evict(self, shard: _Shard, user_id: str):
+        record = shard.records.pop(user_id)
+        self.evictions += 1
+        if self.spill is not None:
+            try:
+                self.spill.save(user_id, record)
+            except Exception as e:
+                logger.error(f"Context spill error: {e}")
+
+
+def compact_context(context_data: Dict) -> Dict:
+    """Copy context data with interned keys and string values.
+
+    Lists of strings, such as ``risk_flags``, become tuples of interned
+    strings.
+    """
+    compact = {}
+    for key, value in context_data.items():
+        if isinstance(value, str):
+            value = sys.intern(value)
+        elif (isinstance(value, list) and
+                all(isinstance(v, str) for v in value)):
+            value = tuple(sys.intern(v) for v in value)
+        compact[sys.intern(key)] = value
+    return compact
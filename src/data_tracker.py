@@ -1,37 +1,154 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import groupby
 import json
+import queue
+import re
+import threading
+import time
+import atexit
+from .utils import epoch_us, from_epoch_us
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+SCHEMA_VERSION = 2
+
+BASE_TABLE = 'access_logs'
+
+PARTITION_FORMATS = {'day': '%Y%m%d', 'month': '%Y%m'}
+
+PARTITION_PATTERN = re.compile(r'^access_logs_(\d{6}|\d{8})$')
+
+MIGRATION_CHUNK_SIZE = 10000
+
+READ_CHUNK_SIZE = 10000
+
+MIN_TIMESTAMP = -(1 << 63)
+
+# Position of the last row read: (table, id)
+LogPosition = Tuple[str, int]
+
+_STOP = object()
+_FLUSH = object()
+
 
 class DataTracker:
-    """Tracks and logs data access events."""
+    """Tracks and logs data access events.
+
+    Timestamps are stored as integer epoch microseconds and every log table
+    carries a composite ``(user_id, timestamp)`` index. With ``partition``
+    set to ``'day'`` or ``'month'``, events are written to rolling
+    ``access_logs_<period>`` tables so old periods can be dropped cheaply by
+    ``prune``; the base ``access_logs`` table is kept as the oldest
+    partition and holds any migrated legacy rows.
+
+    With ``async_writes`` enabled, ``log_access`` only enqueues the event and
+    a background thread writes batches to a single long-lived WAL-mode
+    connection. Events are flushed when ``flush_size`` rows are pending or
+    ``flush_interval`` seconds have passed, whichever comes first, or when
+    ``flush`` is called.
+    """
+
+    def __init__(
+            self,
+            db_path: str = "data/access_logs.db",
+            async_writes: bool = False,
+            flush_size: int = 500,
+            flush_interval: float = 1.0,
+            queue_size: int = 10000,
+            put_timeout: Optional[float] = None,
+            partition: Optional[str] = None
+    ):
+        if partition is not None and partition not in PARTITION_FORMATS:
+            raise ValueError(f"Unknown partition scheme: {partition}")
 
-    def __init__(self, db_path: str = "data/access_logs.db"):
         self.db_path = db_path
+        self.async_writes = async_writes
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.partition = partition
+        self.dropped_events = 0
+
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._tables = {BASE_TABLE}
+        self._tables_lock = threading.Lock()
+
         self._init_db()
+        if async_writes:
+            self._start_writer(queue_size)
 
     def _init_db(self):
-        """Initialize SQLite database."""
+        """Initialize SQLite database and migrate older schemas."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS access_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp TEXT,
-                        user_id TEXT,
-                        data_type TEXT,
-                        action TEXT,
-                        success INTEGER,
-                        context TEXT
-                    )
-                """)
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            try:
+                self._migrate(conn)
+                self._tables.update(self._partition_tables(conn))
+            finally:
+                conn.close()
         except Exception as e:
             logger.error(f"Database initialization error: {e}")
 
+    def _migrate(self, conn: sqlite3.Connection):
+        """Bring the schema up to ``SCHEMA_VERSION`` in one transaction."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {
+                row[1]: row[2].upper()
+                for row in conn.execute(f"PRAGMA table_info({BASE_TABLE})")
+            }
+            if columns.get('timestamp') == 'TEXT':
+                conn.execute(
+                    f"ALTER TABLE {BASE_TABLE} RENAME TO legacy_access_logs"
+                )
+                _create_log_table(conn, BASE_TABLE)
+                self._copy_legacy_rows(conn)
+                conn.execute("DROP TABLE legacy_access_logs")
+                logger.info("Migrated access_logs to epoch timestamps")
+            else:
+                _create_log_table(conn, BASE_TABLE)
+
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _copy_legacy_rows(conn: sqlite3.Connection):
+        """Copy rows with ISO timestamps into the epoch-based table."""
+        last_id = 0
+        while True:
+            rows = conn.execute("""
+                SELECT id, timestamp, user_id, data_type, action,
+                       success, context
+                FROM legacy_access_logs
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, MIGRATION_CHUNK_SIZE)).fetchall()
+            if not rows:
+                return
+
+            conn.executemany(f"""
+                INSERT INTO {BASE_TABLE}
+                (id, timestamp, user_id, data_type, action, success, context)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (row[0], epoch_us(datetime.fromisoformat(row[1])), *row[2:])
+                for row in rows
+            ])
+            last_id = rows[-1][0]
+
     def log_access(
             self,
             user_id: str,
@@ -39,47 +156,400 @@ class DataTracker:
             action: str,
             success: bool,
             context: Dict
-    ):
-        """Log a data access event."""
+    ) -> bool:
+        """Log a data access event.
+
+        In async mode this blocks for up to ``put_timeout`` seconds (forever
+        if ``None``) while the write queue is full, and drops the event if it
+        is still full afterwards.
+        """
         try:
+            now = datetime.now()
+            row = (
+                self._table_for(now),
+                epoch_us(now),
+                user_id,
+                data_type,
+                action,
+                int(success),
+                json.dumps(context)
+            )
+
+            if self._queue is not None:
+                if self._closed:
+                    logger.error("Error logging access: tracker is closed")
+                    return False
+                try:
+                    self._queue.put(row, timeout=self.put_timeout)
+                except queue.Full:
+                    self.dropped_events += 1
+                    logger.warning("Access log queue full, event dropped")
+                    return False
+                return True
+
             with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO access_logs
-                    (timestamp, user_id, data_type, action, success, context)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    datetime.now().isoformat(),
-                    user_id,
-                    data_type,
-                    action,
-                    int(success),
-                    json.dumps(context)
-                ))
+                self._insert_rows(conn, [row])
+            return True
         except Exception as e:
             logger.error(f"Error logging access: {e}")
+            return False
 
     def get_user_history(
             self,
             user_id: str,
             limit: int = 100
     ) -> List[Dict]:
-        """Get access history for a user."""
+        """Get access history for a user, newest first.
+
+        Partitions are read newest to oldest through the
+        ``(user_id, timestamp)`` index, stopping once ``limit`` rows are
+        found.
+        """
         try:
+            history: List[Dict] = []
             with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("""
-                    SELECT * FROM access_logs
-                    WHERE user_id = ?
-                    ORDER BY timestamp DESC
-                    LIMIT ?
-                """, (user_id, limit))
-
-                return [{
-                    'timestamp': row[1],
-                    'data_type': row[3],
-                    'action': row[4],
-                    'success': bool(row[5]),
-                    'context': json.loads(row[6])
-                } for row in cursor.fetchall()]
+                for table in self._tables_newest_first(conn):
+                    remaining = limit - len(history)
+                    if remaining <= 0:
+                        break
+
+                    cursor = conn.execute(f"""
+                        SELECT timestamp, data_type, action, success, context
+                        FROM {table}
+                        WHERE user_id = ?
+                        ORDER BY timestamp DESC
+                        LIMIT ?
+                    """, (user_id, remaining))
+
+                    history.extend({
+                        'timestamp': from_epoch_us(row[0]).isoformat(),
+                        'data_type': row[1],
+                        'action': row[2],
+                        'success': bool(row[3]),
+                        'context': json.loads(row[4])
+                    } for row in cursor.fetchall())
+            return history
         except Exception as e:
             logger.error(f"Error retrieving history: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def iter_chunks(
+            self,
+            chunk_size: int = READ_CHUNK_SIZE,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            after: Optional[LogPosition] = None,
+            user_id: Optional[str] = None
+    ) -> Iterator[Tuple[LogPosition, List[Tuple]]]:
+        """Stream raw log rows in chunks, oldest table first.
+
+        Tables are read with keyset pagination, so memory use is bounded by
+        ``chunk_size`` and no ``OFFSET`` scans are needed. Without a user
+        filter each table is paged by ``id``; with ``user_id`` it is paged
+        by ``(timestamp, id)`` through the ``(user_id, timestamp)`` index.
+        Rows are ``(timestamp_us, user_id, data_type, action, success,
+        context_json)`` tuples, optionally limited to ``start <= timestamp
+        < end``; contexts are not decoded. Each chunk comes with the
+        position of its last row; pass it back as ``after`` to resume from
+        there.
+        """
+        bounds = []
+        if start is not None:
+            bounds.append(("timestamp >= ?", epoch_us(start)))
+        if end is not None:
+            bounds.append(("timestamp < ?", epoch_us(end)))
+
+        if user_id is None:
+            key = "id > ?"
+            order = "id"
+        else:
+            bounds.insert(0, ("user_id = ?", user_id))
+            key = "(timestamp, id) > (?, ?)"
+            order = "timestamp, id"
+        where = " AND ".join([key] + [condition for condition, _ in bounds])
+        params = [value for _, value in bounds]
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            tables = self._tables_oldest_first(conn)
+            if after is not None and after[0] in tables:
+                tables = tables[tables.index(after[0]):]
+
+            for table in tables:
+                if (start is not None and table != BASE_TABLE and
+                        _partition_end(table) <= start):
+                    continue
+
+                last_id = after[1] if after and after[0] == table else 0
+                last_ts = self._row_timestamp(conn, table, last_id)
+                while True:
+                    keyset = (
+                        (last_id,) if user_id is None else (last_ts, last_id)
+                    )
+                    rows = conn.execute(f"""
+                        SELECT id, timestamp, user_id, data_type, action,
+                               success, context
+                        FROM {table}
+                        WHERE {where}
+                        ORDER BY {order}
+                        LIMIT ?
+                    """, (*keyset, *params, chunk_size)).fetchall()
+                    if not rows:
+                        break
+
+                    last_id, last_ts = rows[-1][0], rows[-1][1]
+                    yield (table, last_id), [row[1:] for row in rows]
+                    if len(rows) < chunk_size:
+                        break
+        finally:
+            conn.close()
+
+    def iter_events(
+            self,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            user_id: Optional[str] = None,
+            chunk_size: int = READ_CHUNK_SIZE
+    ) -> Iterator[Tuple]:
+        """Stream raw log rows one at a time; see ``iter_chunks``."""
+        for _, rows in self.iter_chunks(
+                chunk_size, start, end, user_id=user_id
+        ):
+            yield from rows
+
+    def prune(self, retention_days: int) -> Dict[str, int]:
+        """Remove events older than the retention window.
+
+        Partitions that end before the cutoff are dropped whole; rows in the
+        base table are deleted individually.
+        """
+        result = {'partitions_dropped': 0, 'rows_deleted': 0}
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                for table in self._partition_tables(conn):
+                    if _partition_end(table) <= cutoff:
+                        conn.execute(f"DROP TABLE IF EXISTS {table}")
+                        with self._tables_lock:
+                            self._tables.discard(table)
+                        result['partitions_dropped'] += 1
+
+                cursor = conn.execute(
+                    f"DELETE FROM {BASE_TABLE} WHERE timestamp < ?",
+                    (epoch_us(cutoff),)
+                )
+                result['rows_deleted'] = cursor.rowcount
+
+            logger.info(
+                f"Pruned access logs older than {retention_days} days - "
+                f"Partitions: {result['partitions_dropped']}, "
+                f"Rows: {result['rows_deleted']}"
+            )
+        except Exception as e:
+            logger.error(f"Error pruning access logs: {e}")
+        return result
+
+    def flush(self):
+        """Block until every queued event has been written.
+
+        A flush marker is queued so the writer commits its pending batch
+        straight away instead of waiting out ``flush_interval``.
+        """
+        if self._queue is not None and self._writer.is_alive():
+            if not self._closed:
+                self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        """Flush pending events and stop the background writer."""
+        if self._queue is None or self._closed:
+            return
+
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _table_for(self, when: datetime) -> str:
+        """Name of the table an event at ``when`` is written to."""
+        if self.partition is None:
+            return BASE_TABLE
+        period = when.strftime(PARTITION_FORMATS[self.partition])
+        return f"{BASE_TABLE}_{period}"
+
+    def _insert_rows(self, conn: sqlite3.Connection, rows: Iterable[Tuple]):
+        """Insert routed rows, grouping consecutive rows by table."""
+        try:
+            for table, group in groupby(rows, key=lambda row: row[0]):
+                self._ensure_table(conn, table)
+                conn.executemany(f"""
+                    INSERT INTO {table}
+                    (timestamp, user_id, data_type, action, success, context)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [row[1:] for row in group])
+        except Exception:
+            # A rolled-back transaction may have undone a CREATE TABLE
+            with self._tables_lock:
+                self._tables = {BASE_TABLE}
+            raise
+
+    def _ensure_table(self, conn: sqlite3.Connection, table: str):
+        """Create a partition table the first time it is written to."""
+        if table in self._tables:
+            return
+        with self._tables_lock:
+            if table in self._tables:
+                return
+            _create_log_table(conn, table)
+            self._tables.add(table)
+
+    @staticmethod
+    def _partition_tables(conn: sqlite3.Connection) -> List[str]:
+        """Existing partition tables, oldest first."""
+        names = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+        return sorted(
+            name for (name,) in names if PARTITION_PATTERN.match(name)
+        )
+
+    def _tables_newest_first(self, conn: sqlite3.Connection) -> List[str]:
+        """All log tables in the order history queries should read them."""
+        return self._partition_tables(conn)[::-1] + [BASE_TABLE]
+
+    @staticmethod
+    def _row_timestamp(
+            conn: sqlite3.Connection,
+            table: str,
+            row_id: int
+    ) -> int:
+        """Timestamp of a row, used to resume a ``(timestamp, id)`` keyset."""
+        if not row_id:
+            return MIN_TIMESTAMP
+        row = conn.execute(
+            f"SELECT timestamp FROM {table} WHERE id = ?", (row_id,)
+        ).fetchone()
+        return row[0] if row else MIN_TIMESTAMP
+
+    def _tables_oldest_first(self, conn: sqlite3.Connection) -> List[str]:
+        """All log tables in the order streaming reads should read them."""
+        return [BASE_TABLE] + self._partition_tables(conn)
+
+    def _start_writer(self, queue_size: int):
+        """Start the background thread that drains the write queue."""
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(
+            target=self._run_writer,
+            name="DataTrackerWriter",
+            daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _run_writer(self):
+        """Drain the queue in batches until the stop sentinel arrives."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except Exception as e:
+            logger.error(f"Writer connection error: {e}")
+            self._drain_without_writing()
+            return
+
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _next_batch(self) -> Tuple[List[Tuple], bool]:
+        """Collect up to ``flush_size`` rows or until the interval elapses."""
+        batch: List[Tuple] = []
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch, False
+
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is _STOP:
+                self._queue.task_done()
+                return batch, True
+            if item is _FLUSH:
+                self._queue.task_done()
+                return batch, False
+            batch.append(item)
+            if len(batch) >= self.flush_size:
+                return batch, False
+
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple]):
+        """Insert a batch of rows in one transaction."""
+        try:
+            with conn:
+                self._insert_rows(conn, batch)
+        except Exception as e:
+            self.dropped_events += len(batch)
+            logger.error(f"Error writing access log batch: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _drain_without_writing(self):
+        """Discard queued events so ``flush`` and ``close`` cannot hang."""
+        while True:
+            item = self._queue.get()
+            self._queue.task_done()
+            if item is _STOP:
+                return
+            if item is not _FLUSH:
+                self.dropped_events += 1
+
+
+def _create_log_table(conn: sqlite3.Connection, table: str):
+    """Create an access log table and its history index."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp INTEGER NOT NULL,
+            user_id TEXT,
+            data_type TEXT,
+            action TEXT,
+            success INTEGER,
+            context TEXT
+        )
+    """)
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{table}_user_ts
+        ON {table} (user_id, timestamp)
+    """)
+
+
+def _partition_end(table: str) -> datetime:
+    """First instant after the period covered by a partition table."""
+    period = table[len(BASE_TABLE) + 1:]
+    if len(period) == 8:
+        return datetime.strptime(period, '%Y%m%d') + timedelta(days=1)
+
+    start = datetime.strptime(period, '%Y%m')
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
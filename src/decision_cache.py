@@ -0,0 +1,78 @@
+from typing import Dict, Hashable, Optional
+from collections import OrderedDict
+import threading
+import time
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class DecisionCache:
+    """Thread-safe LRU cache of access decisions with a TTL.
+
+    Keys are expected to embed the versions of every input a decision
+    depends on, so a changed context or policy set simply misses and the
+    stale entry ages out of the LRU.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """Return a cached decision, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, decision = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(decision)
+
+    def put(self, key: Hashable, decision: Dict):
+        """Store a decision, evicting the least recently used if full."""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, dict(decision))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached decision."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Cache counters for sizing and monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, TextIO
+from logging.handlers import QueueHandler, QueueListener
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DECISION_LOGGER = 'privacy_engine.decisions'
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats decision records as compact, one-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'ts': round(record.created, 6)}
+        entry.update(record.decision)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class _DecisionQueueHandler(QueueHandler):
+    """Queue handler that neither formats nor blocks in the caller.
+
+    Records are queued as-is and formatted by the listener thread; when
+    the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DecisionLogger:
+    """Structured, non-blocking log of access decisions.
+
+    Decisions are queued as records holding plain dicts through a
+    ``QueueHandler`` and written as JSON lines by a ``QueueListener``
+    thread, so request threads never format or do I/O. Every denial is
+    kept; allowed decisions are sampled at ``allow_sample_rate`` and carry
+    that rate so counts can be re-weighted downstream. Without ``path`` or
+    ``stream`` lines go to stderr.
+    """
+
+    def __init__(
+            self,
+            path: Optional[str] = None,
+            stream: Optional[TextIO] = None,
+            allow_sample_rate: float = 1.0,
+            queue_size: int = 10000
+    ):
+        self.allow_sample_rate = allow_sample_rate
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._output = logging.FileHandler(path)
+        else:
+            self._output = logging.StreamHandler(stream)
+        self._output.setFormatter(JsonLinesFormatter())
+
+        self._handler = _DecisionQueueHandler(queue.Queue(queue_size))
+        self._listener = QueueListener(self._handler.queue, self._output)
+        self._listener.start()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def dropped(self) -> int:
+        """Number of decisions dropped because the queue was full."""
+        return self._handler.dropped
+
+    def log_decision(
+            self,
+            user_id: str,
+            data_type: str,
+            action: str,
+            result: Dict
+    ):
+        """Queue one decision, subject to allow sampling."""
+        allowed = result.get('allowed', False)
+        if allowed and not self._sampled():
+            return
+
+        # Straight to the queue, bypassing logger lookup and handler locks
+        self._handler.enqueue(logging.makeLogRecord({
+            'name': DECISION_LOGGER,
+            'levelno': logging.INFO,
+            'levelname': 'INFO',
+            'msg': 'decision',
+            'decision': self._entry(user_id, data_type, action, result)
+        }))
+
+    def log_decisions(self, requests: List[Dict], results: List[Dict]):
+        """Queue the decisions of a batch, subject to allow sampling."""
+        for request, result in zip(requests, results):
+            self.log_decision(
+                request['user_id'],
+                request['data_type'],
+                request['action'],
+                result
+            )
+
+    def close(self):
+        """Write out queued decisions and stop the listener thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._listener.stop()
+        self._output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _sampled(self) -> bool:
+        rate = self.allow_sample_rate
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+    def _entry(
+            self,
+            user_id: str,
+            data_type: str,
+            action: str,
+            result: Dict
+    ) -> Dict:
+        allowed = result.get('allowed', False)
+        entry = {
+            'user_id': user_id,
+            'data_type': data_type,
+            'action': action,
+            'allowed': allowed,
+            'risk_score': result.get('risk_score'),
+            'confidence': result.get('confidence')
+        }
+        for key in ('rule_id', 'reason'):
+            if key in result:
+                entry[key] = result[key]
+        if allowed and self.allow_sample_rate < 1.0:
+            entry['sample_rate'] = self.allow_sample_rate
+        return entry
@@ -1,24 +1,50 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+import time
 from .policy_manager import PolicyManager
 from .context_handler import ContextHandler
 from .ml_engine import MLEngine
+from .rule_engine import CompiledRule, RequestFacts
+from .decision_cache import DecisionCache
+from .metrics import (
+    CACHE_HITS, CACHE_MISSES, DECISIONS, DENIALS, ERRORS, STAGE_SECONDS,
+    Instrumentation, decision_labels, denial_labels, stage_labels
+)
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Reasons given when a check failed rather than denied access, by the
+# enforcer and by the engines wrapping it
+ERROR_REASONS = frozenset({'Error during check', 'System error'})
+
 
 class PolicyEnforcer:
-    """Enforces privacy policies based on context and ML predictions."""
+    """Enforces privacy policies based on context and ML predictions.
+
+    With a ``DecisionCache`` attached, decisions are cached per
+    (user_id, data_type, action) together with the user's context version,
+    the policy set version and the model version, so any change to those
+    inputs forces a fresh decision. Rules with a ``time_range`` that rely on
+    the current time can stay cached for up to the cache TTL.
+
+    ``metrics`` times each stage of a check (policy lookup, context fetch,
+    risk evaluation, rule match, feature build, model prediction) and
+    counts decisions, denials, errors and cache hits.
+    """
 
     def __init__(
             self,
             policy_manager: PolicyManager,
             context_handler: ContextHandler,
-            ml_engine: MLEngine
+            ml_engine: MLEngine,
+            cache: Optional[DecisionCache] = None,
+            metrics: Optional[Instrumentation] = None
     ):
         self.policy_manager = policy_manager
         self.context_handler = context_handler
         self.ml_engine = ml_engine
+        self.cache = cache
+        self.metrics = metrics or Instrumentation()
         self.decision_threshold = 0.7
 
     def check_access(
@@ -28,39 +54,265 @@ class PolicyEnforcer:
             action: str
     ) -> Dict:
         """Check if access should be granted."""
+        timer = self.metrics.request()
+        if self.cache is None:
+            return self._check_access(user_id, data_type, action, timer)
+
+        key = self._cache_key(user_id, data_type, action)
+        result = self.cache.get(key)
+        timer.stage('cache_lookup')
+        if result is not None:
+            self.metrics.count(CACHE_HITS)
+            timer.finish((user_id, data_type, action), result, 'cache')
+            return result
+
+        self.metrics.count(CACHE_MISSES)
+        result = self._check_access(user_id, data_type, action, timer)
+        if 'reason' not in result:
+            self.cache.put(key, result)
+        return result
+
+    def _check_access(
+            self,
+            user_id: str,
+            data_type: str,
+            action: str,
+            timer
+    ) -> Dict:
+        """Compute an access decision without consulting the cache."""
+        request = (user_id, data_type, action)
         try:
             # Get relevant policies
-            policies = self.policy_manager.get_active_policies()
+            policies = self.policy_manager.get_policies_for(data_type, action)
+            timer.stage('policy_lookup')
 
             # Get user context
             context = self.context_handler.get_context(user_id)
+            timer.stage('context_fetch')
             if not context:
-                return {'allowed': False, 'reason': 'No context available'}
+                result = {'allowed': False, 'reason': 'No context available'}
+                timer.finish(request, result, 'no_context')
+                return result
 
             # Calculate risk
             risk_score = self.context_handler.evaluate_risk(user_id, action)
+            timer.stage('risk_evaluation')
+
+            # Explicit policy rules take precedence over the model
+            rule = self._match_rule(data_type, action, context, risk_score)
+            timer.stage('rule_match')
+            if rule is not None:
+                result = self._rule_decision(rule, risk_score, policies)
+                timer.finish(request, result, 'rule')
+                return result
 
             # Prepare features for ML
-            features = {
-                'risk_score': risk_score,
-                'data_type': hash(data_type) % 100,  # Simple feature
-                'action_type': hash(action) % 100,
-                'context_score': len(context) / 10
-            }
+            features = self._build_features(
+                risk_score, data_type, action, context
+            )
+            timer.stage('feature_build')
 
             # Get ML prediction
             access_score = self.ml_engine.predict(features)
+            timer.stage('model_predict')
 
-            # Make decision
-            allowed = access_score > self.decision_threshold
-
-            return {
-                'allowed': allowed,
-                'confidence': access_score,
-                'risk_score': risk_score,
-                'policy_ids': list(policies.keys())
-            }
+            result = self._decide(access_score, risk_score, policies)
+            timer.finish(request, result, 'model')
+            return result
 
         except Exception as e:
             logger.error(f"Access check error: {e}")
-            return {'allowed': False, 'reason': 'Error during check'}
\ No newline at end of file
+            self.metrics.count(ERRORS, (('operation', 'check_access'),))
+            result = {'allowed': False, 'reason': 'Error during check'}
+            timer.finish(request, result, 'error')
+            return result
+
+    def check_access_batch(self, requests: List[Dict]) -> List[Dict]:
+        """Check many access requests with a single model call.
+
+        Each request is a dict with ``user_id``, ``data_type`` and
+        ``action``. Results are returned in request order.
+        """
+        metrics = self.metrics
+        started = time.perf_counter() if metrics.enabled else 0.0
+        try:
+            results: List[Optional[Dict]] = [None] * len(requests)
+            sources: List[str] = ['model'] * len(requests)
+            keys: List = [None] * len(requests)
+            pending = []
+            misses = []
+            for i, request in enumerate(requests):
+                if self.cache is not None:
+                    key = self._cache_key(
+                        request['user_id'], request['data_type'],
+                        request['action']
+                    )
+                    results[i] = self.cache.get(key)
+                    if results[i] is not None:
+                        sources[i] = 'cache'
+                        continue
+                    keys[i] = key
+                misses.append(i)
+
+            risk_scores = self.context_handler.evaluate_risk_batch(
+                [requests[i]['user_id'] for i in misses]
+            ).tolist()
+            for i, risk_score in zip(misses, risk_scores):
+                request = requests[i]
+                action = request['action']
+                context = self.context_handler.get_context(request['user_id'])
+                if not context:
+                    results[i] = {
+                        'allowed': False,
+                        'reason': 'No context available'
+                    }
+                    sources[i] = 'no_context'
+                    continue
+
+                rule = self._match_rule(
+                    request['data_type'], action, context, risk_score
+                )
+                if rule is not None:
+                    results[i] = self._rule_decision(
+                        rule,
+                        risk_score,
+                        self.policy_manager.get_policies_for(
+                            request['data_type'], action
+                        )
+                    )
+                    sources[i] = 'rule'
+                    continue
+
+                features = self._build_features(
+                    risk_score, request['data_type'], action, context
+                )
+                pending.append((i, risk_score, features))
+
+            if metrics.enabled:
+                predict_started = time.perf_counter()
+                metrics.observe(
+                    STAGE_SECONDS,
+                    predict_started - started,
+                    stage_labels('batch_prepare')
+                )
+            scores = self.ml_engine.predict_batch(
+                [features for _, _, features in pending]
+            )
+            if metrics.enabled:
+                metrics.observe(
+                    STAGE_SECONDS,
+                    time.perf_counter() - predict_started,
+                    stage_labels('batch_model_predict')
+                )
+            for (i, risk_score, _), access_score in zip(pending, scores):
+                request = requests[i]
+                policies = self.policy_manager.get_policies_for(
+                    request['data_type'], request['action']
+                )
+                results[i] = self._decide(access_score, risk_score, policies)
+
+            if self.cache is not None:
+                for key, result in zip(keys, results):
+                    if key is not None and 'reason' not in result:
+                        self.cache.put(key, result)
+
+            if metrics.enabled:
+                self._count_batch(results, sources)
+            return results
+
+        except Exception as e:
+            logger.error(f"Batch access check error: {e}")
+            metrics.count(
+                ERRORS, (('operation', 'check_access_batch'),), len(requests)
+            )
+            return [
+                {'allowed': False, 'reason': 'Error during check'}
+                for _ in requests
+            ]
+
+    def _count_batch(self, results: List[Dict], sources: List[str]):
+        """Record decision, denial and cache counters for a batch."""
+        decisions: Dict = {}
+        for result, source in zip(results, sources):
+            key = (result['allowed'], source)
+            decisions[key] = decisions.get(key, 0) + 1
+
+        metrics = self.metrics
+        for (allowed, source), count in decisions.items():
+            metrics.count(DECISIONS, decision_labels(allowed, source), count)
+            if not allowed:
+                metrics.count(DENIALS, denial_labels(source), count)
+        if self.cache is not None:
+            hits = sources.count('cache')
+            metrics.count(CACHE_HITS, value=hits)
+            metrics.count(CACHE_MISSES, value=len(sources) - hits)
+
+    def _cache_key(self, user_id: str, data_type: str, action: str):
+        """Cache key covering every input version a decision depends on."""
+        return (
+            user_id,
+            data_type,
+            action,
+            self.context_handler.get_version(user_id),
+            self.policy_manager.version,
+            self.ml_engine.version
+        )
+
+    def _match_rule(
+            self,
+            data_type: str,
+            action: str,
+            context: Dict,
+            risk_score: float
+    ) -> Optional[CompiledRule]:
+        """Evaluate the compiled policy rules for a request."""
+        rules = self.policy_manager.get_rules_for(data_type, action)
+        if not rules:
+            return None
+        return rules.evaluate(
+            RequestFacts(data_type, action, context, risk_score)
+        )
+
+    def _build_features(
+            self,
+            risk_score: float,
+            data_type: str,
+            action: str,
+            context: Dict
+    ) -> Dict:
+        """Build the ML feature dict for a single request."""
+        return self.ml_engine.encoder.request_features(
+            risk_score, data_type, action, context
+        )
+
+    def _decide(
+            self,
+            access_score: float,
+            risk_score: float,
+            policies: Dict[str, Dict]
+    ) -> Dict:
+        """Turn a model score into an access decision."""
+        allowed = access_score > self.decision_threshold
+
+        return {
+            'allowed': allowed,
+            'confidence': access_score,
+            'risk_score': risk_score,
+            'policy_ids': list(policies.keys())
+        }
+
+    def _rule_decision(
+            self,
+            rule: CompiledRule,
+            risk_score: float,
+            policies: Dict[str, Dict]
+    ) -> Dict:
+        """Turn a matched policy rule into an access decision."""
+        return {
+            'allowed': rule.action == 'allow',
+            'confidence': None,
+            'risk_score': risk_score,
+            'policy_ids': list(policies.keys()),
+            'rule_id': rule.rule_id,
+            'rule_action': rule.action
+        }
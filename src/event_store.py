@@ -0,0 +1,202 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class Vocabulary:
+    """Dictionary encoding of strings to dense int32 codes."""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values or []:
+            self.encode(value)
+
+    def encode(self, value: str) -> int:
+        """Return the code for a value, assigning a new one if needed."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        """Return the code for a value without assigning one."""
+        return self.codes.get(value)
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class EventStore:
+    """Append-only columnar store of access events.
+
+    Events are held in fixed-size NumPy chunks: int64 epoch-microsecond
+    timestamps plus dictionary-encoded int32 codes for user, data type and
+    action, about 20 bytes per event. Full chunks are kept as-is and new
+    chunks are allocated as the store grows, so appends never copy old data.
+    """
+
+    def __init__(self, chunk_size: int = 65536):
+        self.chunk_size = chunk_size
+        self.users = Vocabulary()
+        self.data_types = Vocabulary()
+        self.actions = Vocabulary()
+        self._chunks: List[Columns] = []
+        self._chunk_max_ts: List[int] = []
+        self._current = self._new_chunk()
+        self._current_max_ts = np.iinfo(np.int64).min
+        self._fill = 0
+
+    def append(
+            self,
+            user_id: str,
+            data_type: str,
+            action: str,
+            timestamp_us: int
+    ):
+        """Append one event."""
+        if self._fill == self.chunk_size:
+            self._seal_chunk()
+
+        ts, users, data_types, actions = self._current
+        i = self._fill
+        ts[i] = timestamp_us
+        users[i] = self.users.encode(user_id)
+        data_types[i] = self.data_types.encode(data_type)
+        actions[i] = self.actions.encode(action)
+        self._fill = i + 1
+        if timestamp_us > self._current_max_ts:
+            self._current_max_ts = timestamp_us
+
+    def chunks(self) -> Iterator[Columns]:
+        """Iterate over column views, including the partly filled chunk."""
+        yield from self._chunks
+        if self._fill:
+            yield tuple(column[:self._fill] for column in self._current)
+
+    def aggregate(
+            self,
+            user_id: str,
+            start_us: Optional[int] = None,
+            end_us: Optional[int] = None
+    ) -> Dict:
+        """Count a user's events by data type and action in a time range.
+
+        ``start_us`` is inclusive and ``end_us`` exclusive. Returns an empty
+        dict when the user has no events in the range.
+        """
+        user_code = self.users.lookup(user_id)
+        if user_code is None:
+            return {}
+
+        data_type_counts = np.zeros(len(self.data_types), dtype=np.int64)
+        action_counts = np.zeros(len(self.actions), dtype=np.int64)
+        last_access = None
+
+        for ts, users, data_types, actions in self.chunks():
+            mask = users == user_code
+            if start_us is not None:
+                mask &= ts >= start_us
+            if end_us is not None:
+                mask &= ts < end_us
+            if not mask.any():
+                continue
+
+            data_type_counts += np.bincount(
+                data_types[mask], minlength=len(self.data_types)
+            )
+            action_counts += np.bincount(
+                actions[mask], minlength=len(self.actions)
+            )
+            chunk_last = int(ts[mask].max())
+            if last_access is None or chunk_last > last_access:
+                last_access = chunk_last
+
+        if last_access is None:
+            return {}
+
+        return {
+            'access_frequency': int(data_type_counts.sum()),
+            'data_types': self._decode_counts(
+                self.data_types, data_type_counts
+            ),
+            'actions': self._decode_counts(self.actions, action_counts),
+            'last_access_us': last_access
+        }
+
+    def trim(self, before_us: int) -> int:
+        """Drop sealed chunks whose events are all older than ``before_us``.
+
+        The vocabularies are then compacted so values that only appeared
+        in dropped chunks are forgotten. Returns the number of events
+        dropped.
+        """
+        dropped = 0
+        while self._chunks and self._chunk_max_ts[0] < before_us:
+            dropped += len(self._chunks.pop(0)[0])
+            self._chunk_max_ts.pop(0)
+        if dropped:
+            self._compact_vocabularies()
+        return dropped
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the column arrays."""
+        return sum(
+            column.nbytes
+            for chunk in self._chunks + [self._current]
+            for column in chunk
+        )
+
+    def __len__(self) -> int:
+        return sum(len(chunk[0]) for chunk in self._chunks) + self._fill
+
+    def _new_chunk(self) -> Columns:
+        return (
+            np.empty(self.chunk_size, dtype=np.int64),
+            np.empty(self.chunk_size, dtype=np.int32),
+            np.empty(self.chunk_size, dtype=np.int32),
+            np.empty(self.chunk_size, dtype=np.int32)
+        )
+
+    def _seal_chunk(self):
+        """Move the full current chunk to the sealed list."""
+        self._chunks.append(
+            tuple(column[:self._fill] for column in self._current)
+        )
+        self._chunk_max_ts.append(self._current_max_ts)
+        self._current = self._new_chunk()
+        self._current_max_ts = np.iinfo(np.int64).min
+        self._fill = 0
+
+    def _compact_vocabularies(self):
+        """Re-encode the code columns over the values still referenced."""
+        for column, name in ((1, 'users'), (2, 'data_types'), (3, 'actions')):
+            vocabulary = getattr(self, name)
+            used = np.zeros(len(vocabulary), dtype=bool)
+            for chunk in self.chunks():
+                used[chunk[column]] = True
+            if used.all():
+                continue
+
+            remap = (np.cumsum(used) - 1).astype(np.int32)
+            for chunk in self.chunks():
+                chunk[column][:] = remap[chunk[column]]
+            setattr(self, name, Vocabulary(
+                [vocabulary.values[code] for code in np.flatnonzero(used)]
+            ))
+
+    @staticmethod
+    def _decode_counts(vocabulary: Vocabulary, counts: np.ndarray) -> Dict:
+        return {
+            vocabulary.decode(code): int(counts[code])
+            for code in np.flatnonzero(counts)
+        }
@@ -0,0 +1,99 @@
+from typing import Dict, List, Optional
+from functools import lru_cache
+import hashlib
+import numpy as np
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FEATURE_NAMES = ['risk_score', 'data_type', 'action_type', 'context_score']
+
+DEFAULT_HASH_BUCKETS = 100
+
+
+@lru_cache(maxsize=65536)
+def stable_hash(value: str) -> int:
+    """Process-independent 64-bit hash of a string."""
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class FeatureEncoder:
+    """Turns access requests into model feature rows.
+
+    Categorical values use a stable hashing trick instead of the built-in
+    ``hash``, which is randomised per process, so the same request encodes
+    identically in every worker. The feature schema is fixed and saved with
+    the model; keys outside it are ignored by ``transform`` and logged the
+    first time they are seen.
+    """
+
+    def __init__(
+            self,
+            feature_names: Optional[List[str]] = None,
+            hash_buckets: int = DEFAULT_HASH_BUCKETS
+    ):
+        self.feature_names = list(feature_names or FEATURE_NAMES)
+        self.hash_buckets = hash_buckets
+        self._known = frozenset(self.feature_names)
+        self._reported = set()
+
+    def hash_category(self, value: str) -> int:
+        """Stable bucket for a categorical value."""
+        return stable_hash(value) % self.hash_buckets
+
+    def request_features(
+            self,
+            risk_score: float,
+            data_type: str,
+            action: str,
+            context: Dict
+    ) -> Dict:
+        """Build the feature dict for a single access request."""
+        return {
+            'risk_score': risk_score,
+            'data_type': self.hash_category(data_type),
+            'action_type': self.hash_category(action),
+            'context_score': len(context) / 10
+        }
+
+    def transform(self, feature_dicts: List[Dict]) -> np.ndarray:
+        """Encode feature dicts into a preallocated float matrix.
+
+        Missing features are encoded as 0. Features not in the schema are
+        dropped, with a warning the first time each one appears.
+        """
+        for fd in feature_dicts:
+            if not self._known.issuperset(fd):
+                self._report_unknown(fd)
+
+        n_rows = len(feature_dicts)
+        X = np.empty((n_rows, len(self.feature_names)), dtype=np.float64)
+        for j, name in enumerate(self.feature_names):
+            X[:, j] = np.fromiter(
+                (fd.get(name, 0) for fd in feature_dicts),
+                dtype=np.float64,
+                count=n_rows
+            )
+        return X
+
+    def _report_unknown(self, feature_dict: Dict):
+        """Log features missing from the schema, once per name."""
+        unknown = set(feature_dict) - self._known - self._reported
+        if unknown:
+            self._reported.update(unknown)
+            logger.warning(
+                f"Ignoring features not in the model schema: "
+                f"{sorted(unknown)}"
+            )
+
+    def to_dict(self) -> Dict:
+        """Serialisable schema, stored alongside the model."""
+        return {
+            'feature_names': list(self.feature_names),
+            'hash_buckets': self.hash_buckets
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FeatureEncoder':
+        return cls(data['feature_names'], data['hash_buckets'])
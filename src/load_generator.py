@@ -0,0 +1,433 @@
+"""Load generator for capacity planning a ``PrivacyEngine`` node.
+
+Drives the engine with a JSONL stream of requests, one
+``{"user_id", "data_type", "action", "context"}`` object per line::
+
+    python -m src.load_generator generate stream.jsonl --requests 100000
+    python -m src.load_generator run stream.jsonl --threads 4 --processes 2
+    python -m src.load_generator run stream.jsonl --qps 2000 --threads 8
+
+``generate`` also writes the workload's contexts, policies and a model
+trained on it next to the stream (see ``fixture_paths``). ``run`` uses them
+unless told otherwise, preloading every context before the clock starts,
+so requests reach the rules and the model instead of stopping at
+"No context available".
+
+Without ``--qps`` the run is closed-loop: every thread sends its next
+request as soon as the previous one returns. With ``--qps`` it is
+open-loop: request ``i`` is due at ``start + i / qps`` whether or not
+earlier requests have finished, which is how independent clients behave.
+
+The report holds the service-time distribution (see
+``benchmark.summarize``), error and no-context rates and a
+coordinated-omission-corrected p99. Open-loop latencies are measured
+from each request's due time, so time spent queued behind a slow request
+counts. Closed-loop runs have no schedule; their correction backfills the
+requests a stalled thread would have sent, assuming one every
+``--expected-interval`` (the median service time by default).
+"""
+from typing import Dict, Iterator, List, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import numpy as np
+from .main import PrivacyEngine
+from .benchmark import (
+    _quiet_engine_loggers, build_engine, generate_workload, summarize
+)
+from .enforcer import ERROR_REASONS
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Lets worker processes import the engine before the clock starts
+START_DELAY = 2.0
+
+
+def iter_requests(
+        path: str,
+        shard: int = 0,
+        shards: int = 1
+) -> Iterator[Dict]:
+    """Lazily read request dicts from a JSONL file.
+
+    Only every ``shards``-th non-blank line starting at ``shard`` is
+    parsed, so processes can split one file between them. Malformed lines
+    are logged and skipped.
+    """
+    with open(path, 'r') as f:
+        position = 0
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            position += 1
+            if (position - 1) % shards != shard:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict) or 'user_id' not in request:
+                    raise ValueError("not a request object")
+            except ValueError as e:
+                logger.warning(f"Skipping line {line_no} of {path}: {e}")
+                continue
+            yield request
+
+
+def fixture_paths(path: str) -> Dict[str, str]:
+    """Where ``write_requests`` puts the contexts, policies and model for
+    the stream at ``path``."""
+    return {
+        'contexts': f"{path}.contexts.json",
+        'policies': f"{path}.policies.json",
+        'model': f"{path}.model.joblib"
+    }
+
+
+def write_requests(path: str, requests: int = 100000, seed: int = 0,
+                   users: int = 1000, policies: int = 50) -> int:
+    """Write a synthetic request stream from ``generate_workload``.
+
+    The users' contexts, the policies and a model trained on the workload
+    (as in ``benchmark.build_engine``) are written to ``fixture_paths``.
+    """
+    workload = generate_workload(
+        users=users, policies=policies, requests=requests, events=0,
+        seed=seed
+    )
+    with open(path, 'w') as f:
+        for request in workload['requests']:
+            f.write(json.dumps(request, separators=(',', ':')) + '\n')
+
+    fixtures = fixture_paths(path)
+    with open(fixtures['contexts'], 'w') as f:
+        json.dump(workload['contexts'], f, separators=(',', ':'))
+    engine = build_engine(workload)
+    if not (engine.policy_manager.export_policies(fixtures['policies'])
+            and engine.ml_engine.save_model(fixtures['model'])):
+        raise OSError(f"Could not write fixtures for {path}")
+    return len(workload['requests'])
+
+
+def load_contexts(engine: PrivacyEngine, path: str) -> int:
+    """Set every ``user_id -> context`` entry of a JSON file on the
+    engine."""
+    with open(path, 'r') as f:
+        contexts = json.load(f)
+    for user_id, context in contexts.items():
+        engine.context_handler.update_context(user_id, context)
+    return len(contexts)
+
+
+def run_load(
+        path: str,
+        threads: int = 1,
+        processes: int = 1,
+        qps: Optional[float] = None,
+        limit: Optional[int] = None,
+        expected_interval_us: Optional[float] = None,
+        model_path: Optional[str] = None,
+        policy_file: Optional[str] = None,
+        cache_size: int = 0,
+        contexts_file: Optional[str] = None
+) -> Dict:
+    """Run a load test and return the report.
+
+    ``qps`` and ``limit`` apply to the whole run and are split evenly
+    between processes. Each process builds its own engine from
+    ``model_path``, ``policy_file`` and ``contexts_file``; any of them
+    left out is taken from the stream's ``fixture_paths`` if that exists.
+    """
+    if threads < 1 or processes < 1:
+        raise ValueError("threads and processes must be at least 1")
+    if qps is not None and qps <= 0:
+        raise ValueError("qps must be positive")
+
+    fixtures = {
+        name: fixture if os.path.exists(fixture) else None
+        for name, fixture in fixture_paths(path).items()
+    }
+    model_path = model_path or fixtures['model']
+    policy_file = policy_file or fixtures['policies']
+    contexts_file = contexts_file or fixtures['contexts']
+    if model_path is None:
+        logger.warning(
+            "No model given: predictions return a constant without "
+            "running a model"
+        )
+
+    start_epoch = time.time() + (START_DELAY if processes > 1 else 0.0)
+    jobs = [
+        {
+            'path': path,
+            'shard': shard,
+            'shards': processes,
+            'threads': threads,
+            'rate': qps / processes if qps else None,
+            'limit': _share(limit, shard, processes),
+            'start_epoch': start_epoch,
+            'model_path': model_path,
+            'policy_file': policy_file,
+            'contexts_file': contexts_file,
+            'cache_size': cache_size
+        }
+        for shard in range(processes)
+    ]
+
+    if processes == 1:
+        parts = [_run_shard(jobs[0])]
+    else:
+        with multiprocessing.get_context().Pool(processes) as pool:
+            parts = pool.map(_run_shard, jobs)
+
+    return _report(parts, qps, threads, processes, expected_interval_us)
+
+
+def correct_coordinated_omission(
+        latencies_ns: np.ndarray,
+        interval_ns: float
+) -> np.ndarray:
+    """Backfill the samples a closed-loop client missed while stalled.
+
+    A request that took ``k`` expected intervals hid ``k - 1`` requests
+    that would have waited ``latency - interval``, ``latency - 2 *
+    interval`` and so on; those are added to the samples, as HdrHistogram's
+    ``recordValueWithExpectedInterval`` does.
+    """
+    if interval_ns <= 0 or not len(latencies_ns):
+        return latencies_ns
+    missed = (latencies_ns // interval_ns).astype(np.int64) - 1
+    stalled = missed > 0
+    if not stalled.any():
+        return latencies_ns
+
+    counts = missed[stalled]
+    base = np.repeat(latencies_ns[stalled], counts)
+    # 1..k for each stalled sample
+    steps = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    ) + 1
+    backfill = base - (steps * interval_ns).astype(np.int64)
+    return np.concatenate([latencies_ns, backfill])
+
+
+def _share(total: Optional[int], shard: int, shards: int) -> Optional[int]:
+    if total is None:
+        return None
+    return total // shards + (1 if shard < total % shards else 0)
+
+
+def _run_shard(job: Dict) -> Dict:
+    """Drive one engine with ``job['threads']`` threads; runs in the
+    worker process."""
+    _quiet_engine_loggers()
+    engine = PrivacyEngine(job['model_path'], cache_size=job['cache_size'])
+    if job['policy_file']:
+        engine.policy_manager.load_policies(job['policy_file'])
+    if job['contexts_file']:
+        load_contexts(engine, job['contexts_file'])
+
+    requests = iter_requests(job['path'], job['shard'], job['shards'])
+    limit = job['limit']
+    rate = job['rate']
+    lock = threading.Lock()
+    issued = [0]
+    service: List[int] = []
+    response: List[int] = []
+    errors = [0]
+    no_context = [0]
+
+    # Shared across processes as wall-clock time, used as perf_counter time;
+    # a process that is late to start does not begin behind schedule
+    started = time.perf_counter() + max(job['start_epoch'] - time.time(), 0)
+    perf_counter = time.perf_counter
+
+    def worker():
+        local_service = []
+        local_response = []
+        local_errors = 0
+        local_no_context = 0
+        while True:
+            with lock:
+                i = issued[0]
+                if limit is not None and i >= limit:
+                    break
+                request = next(requests, None)
+                if request is None:
+                    break
+                issued[0] = i + 1
+
+            due = started + i / rate if rate else None
+            if due is not None:
+                delay = due - perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            t0 = perf_counter()
+            try:
+                result = engine.check_access(
+                    request['user_id'],
+                    request.get('data_type'),
+                    request.get('action'),
+                    request.get('context')
+                )
+                reason = result.get('reason')
+                if reason in ERROR_REASONS:
+                    local_errors += 1
+                elif reason == 'No context available':
+                    local_no_context += 1
+            except Exception:
+                local_errors += 1
+            t1 = perf_counter()
+            local_service.append(int((t1 - t0) * 1e9))
+            if due is not None:
+                local_response.append(int((t1 - due) * 1e9))
+
+        with lock:
+            service.extend(local_service)
+            response.extend(local_response)
+            errors[0] += local_errors
+            no_context[0] += local_no_context
+
+    delay = started - perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+    pool = [
+        threading.Thread(target=worker, name=f"LoadWorker-{n}")
+        for n in range(job['threads'])
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    return {
+        'service_ns': np.array(service, dtype=np.int64),
+        'response_ns': np.array(response, dtype=np.int64),
+        'errors': errors[0],
+        'no_context': no_context[0],
+        'elapsed': perf_counter() - started
+    }
+
+
+def _report(
+        parts: List[Dict],
+        qps: Optional[float],
+        threads: int,
+        processes: int,
+        expected_interval_us: Optional[float]
+) -> Dict:
+    service = np.concatenate([part['service_ns'] for part in parts])
+    if not len(service):
+        return {'calls': 0}
+    elapsed = max(part['elapsed'] for part in parts)
+    errors = sum(part['errors'] for part in parts)
+    no_context = sum(part['no_context'] for part in parts)
+
+    if qps:
+        corrected = np.concatenate([part['response_ns'] for part in parts])
+    else:
+        if expected_interval_us is None:
+            interval_ns = float(np.median(service))
+        else:
+            interval_ns = expected_interval_us * 1000
+        corrected = correct_coordinated_omission(service, interval_ns)
+
+    report = summarize(service, elapsed)
+    report.update({
+        'mode': 'open' if qps else 'closed',
+        'target_qps': qps,
+        'threads': threads,
+        'processes': processes,
+        'errors': errors,
+        'error_rate': round(errors / len(service), 6),
+        'no_context_rate': round(no_context / len(service), 6),
+        'p999_us': round(float(np.percentile(service, 99.9)) / 1000, 2),
+        'corrected_p99_us': round(
+            float(np.percentile(corrected, 99)) / 1000, 2
+        )
+    })
+    return report
+
+
+def _qps_missed(report: Dict) -> bool:
+    """Whether an open-loop run fell more than 5% short of its target."""
+    target = report.get('target_qps')
+    if not target or not report.get('calls'):
+        return False
+    return report['throughput_per_s'] < 0.95 * target
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='write a request stream')
+    generate.add_argument('path')
+    generate.add_argument('--requests', type=int, default=100000)
+    generate.add_argument('--users', type=int, default=1000)
+    generate.add_argument('--policies', type=int, default=50)
+    generate.add_argument('--seed', type=int, default=0)
+
+    run = commands.add_parser('run', help='drive the engine with a stream')
+    run.add_argument('path')
+    run.add_argument('--threads', type=int, default=1)
+    run.add_argument('--processes', type=int, default=1)
+    run.add_argument(
+        '--qps', type=float, default=None,
+        help='open-loop target rate; closed-loop if omitted'
+    )
+    run.add_argument('--limit', type=int, default=None)
+    run.add_argument(
+        '--expected-interval-us', type=float, default=None,
+        help='closed-loop send interval for the coordinated-omission '
+             'correction'
+    )
+    run.add_argument('--model', help='model file for the engine')
+    run.add_argument('--policies', help='JSON or packed policy file')
+    run.add_argument(
+        '--contexts', help='JSON file of user_id -> context to preload'
+    )
+    run.add_argument('--cache-size', type=int, default=0)
+    run.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        count = write_requests(
+            args.path, args.requests, args.seed, args.users, args.policies
+        )
+        logger.info(f"Wrote {count} requests to {args.path}")
+        return 0
+
+    _quiet_engine_loggers()
+    report = run_load(
+        args.path,
+        threads=args.threads,
+        processes=args.processes,
+        qps=args.qps,
+        limit=args.limit,
+        expected_interval_us=args.expected_interval_us,
+        model_path=args.model,
+        policy_file=args.policies,
+        cache_size=args.cache_size,
+        contexts_file=args.contexts
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if _qps_missed(report):
+        logger.warning(
+            f"Target rate not reached: {report['throughput_per_s']}/s of "
+            f"{report['target_qps']}/s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime
+import os
+import numpy as np
+from .data_tracker import DataTracker
+from .event_store import Vocabulary
+from .utils import ensure_directory, load_json, save_json
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EXPORT_FORMAT_VERSION = 2
+
+EXPORT_CHUNK_SIZE = 65536
+
+MANIFEST_FILE = 'manifest.json'
+
+# Dictionary-encoded columns
+CATEGORICAL_COLUMNS = ('user_id', 'data_type', 'action', 'context')
+
+
+def export_npz(
+        tracker: DataTracker,
+        directory: str,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[str] = None,
+        compress: bool = True
+) -> Optional[Dict]:
+    """Export the access log to columnar ``.npz`` chunks.
+
+    Each chunk file holds int64 epoch-microsecond ``timestamp``, int32
+    codes for ``user_id``, ``data_type``, ``action`` and ``context`` (the
+    raw context JSON, which repeats heavily) and a boolean ``success``
+    column. Codes index the chunk's own ``<column>_values`` string array,
+    so memory and the manifest stay bounded by the chunk size however
+    many distinct values the log holds. ``manifest.json`` is written last,
+    so a directory without one is an incomplete export. Returns the
+    manifest, or None on error.
+    """
+    try:
+        ensure_directory(directory)
+        save = np.savez_compressed if compress else np.savez
+        chunks: List[Dict] = []
+
+        for _, rows in tracker.iter_chunks(
+                chunk_size, start, end, user_id=user_id
+        ):
+            columns = _encode_rows(rows)
+            file_name = f"events_{len(chunks):05d}.npz"
+            save(os.path.join(directory, file_name), **columns)
+            chunks.append({'file': file_name, 'rows': len(rows)})
+
+        manifest = {
+            'format_version': EXPORT_FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(),
+            'rows': sum(chunk['rows'] for chunk in chunks),
+            'chunks': chunks
+        }
+        if not save_json(manifest, os.path.join(directory, MANIFEST_FILE)):
+            return None
+
+        logger.info(
+            f"Exported {manifest['rows']} access events in "
+            f"{len(chunks)} chunks to {directory}"
+        )
+        return manifest
+    except Exception as e:
+        logger.error(f"Access log export error: {e}")
+        return None
+
+
+def iter_npz_chunks(directory: str) -> Iterator[Dict[str, np.ndarray]]:
+    """Yield the column arrays of each exported chunk, in order."""
+    manifest = _load_manifest(directory)
+    for chunk in manifest['chunks']:
+        with np.load(os.path.join(directory, chunk['file'])) as data:
+            yield {name: data[name] for name in data.files}
+
+
+def iter_npz_events(directory: str) -> Iterator[Tuple]:
+    """Yield exported events as ``DataTracker.iter_events`` rows."""
+    for columns in iter_npz_chunks(directory):
+        users, data_types, actions, contexts = (
+            columns[f'{name}_values'].tolist() for name in CATEGORICAL_COLUMNS
+        )
+        for row in zip(
+                columns['timestamp'].tolist(),
+                columns['user_id'].tolist(),
+                columns['data_type'].tolist(),
+                columns['action'].tolist(),
+                columns['success'].tolist(),
+                columns['context'].tolist()
+        ):
+            yield (
+                row[0], users[row[1]], data_types[row[2]], actions[row[3]],
+                int(row[4]), contexts[row[5]]
+            )
+
+
+def _encode_rows(rows: List[Tuple]) -> Dict[str, np.ndarray]:
+    """Turn a chunk of log rows into typed columns, dictionary-encoding
+    the strings against vocabularies local to the chunk."""
+    n_rows = len(rows)
+    timestamps, users, data_types, actions, successes, contexts = zip(*rows)
+    columns = {
+        'timestamp': np.fromiter(timestamps, dtype=np.int64, count=n_rows),
+        'success': np.fromiter(successes, dtype=np.bool_, count=n_rows)
+    }
+    for name, values in (
+            ('user_id', users),
+            ('data_type', data_types),
+            ('action', actions),
+            ('context', contexts)
+    ):
+        vocabulary = Vocabulary()
+        encode = vocabulary.encode
+        columns[name] = np.fromiter(
+            (encode(value or '') for value in values),
+            dtype=np.int32,
+            count=n_rows
+        )
+        columns[f'{name}_values'] = np.array(vocabulary.values, dtype=np.str_)
+    return columns
+
+
+def _load_manifest(directory: str) -> Dict:
+    manifest = load_json(os.path.join(directory, MANIFEST_FILE))
+    if manifest is None:
+        raise ValueError(f"No complete access log export in {directory}")
+    if manifest.get('format_version') != EXPORT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported export format: {manifest.get('format_version')}"
+        )
+    return manifest
@@ -1,6 +1,7 @@
 import logging
-from typing import Optional
+from typing import Optional, TextIO
 import os
+import sys
 from datetime import datetime
 
 
@@ -16,21 +17,43 @@ class CustomFormatter(logging.Formatter):
         'RESET': '\033[0m'
     }
 
-    def format(self, record):
-        # Add color
-        if hasattr(sys.stdout, 'isatty') and sys.stdout.isatty():
-            record.levelname = (
+    def __init__(
+            self,
+            fmt: Optional[str] = None,
+            stream: Optional[TextIO] = None
+    ):
+        super().__init__(fmt)
+        # Decided once per handler rather than on every emit
+        stream = stream if stream is not None else sys.stderr
+        self.use_color = hasattr(stream, 'isatty') and stream.isatty()
+        self._cached_second = None
+        self._cached_prefix = ''
+
+    def formatMessage(self, record):
+        # Work on a copy of the record's fields so other handlers see the
+        # record unchanged
+        values = record.__dict__.copy()
+        if self.use_color:
+            values['levelname'] = (
                 f"{self.COLORS.get(record.levelname, '')}"
                 f"{record.levelname}"
                 f"{self.COLORS['RESET']}"
             )
 
         # Add metadata
-        record.timestamp = datetime.now().isoformat()
-        if not hasattr(record, 'metadata'):
-            record.metadata = {}
+        values['timestamp'] = self._timestamp(record.created)
+        values['metadata'] = values.get('metadata') or ''
+
+        return self._fmt % values
 
-        return super().format(record)
+    def _timestamp(self, created: float) -> str:
+        """ISO timestamp of the record, formatting the date part once per
+        second."""
+        second = int(created)
+        if second != self._cached_second:
+            self._cached_prefix = datetime.fromtimestamp(second).isoformat()
+            self._cached_second = second
+        return f"{self._cached_prefix}.{int((created - second) * 1e6):06d}"
 
 
 def setup_logger(
@@ -49,7 +72,8 @@ def setup_logger(
     console_handler = logging.StreamHandler()
     console_formatter = CustomFormatter(
         '%(timestamp)s - %(name)s - %(levelname)s - %(message)s'
-        '%(metadata)s'
+        '%(metadata)s',
+        console_handler.stream
     )
     console_handler.setFormatter(console_formatter)
     logger.addHandler(console_handler)
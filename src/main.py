@@ -1,25 +1,64 @@
+from typing import Dict, List, Optional
+import logging
 from .policy_manager import PolicyManager
 from .enforcer import PolicyEnforcer
-from .context_handler import ContextHandler
+from .context_handler import ContextHandler, split_on_context_changes
 from .ml_engine import MLEngine
+from .decision_cache import DecisionCache
+from .context_store import ContextStore
+from .metrics import Instrumentation
+from .decision_log import DecisionLogger
+from .anomaly_detector import AnomalyDetector
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
 class PrivacyEngine:
-    """Main class for privacy policy enforcement."""
+    """Main class for privacy policy enforcement.
 
-    def __init__(self, model_path: Optional[str] = None):
+    Individual decisions are not logged at INFO; pass a ``DecisionLogger``
+    to keep a structured decision log. With ``preload_model`` the ML
+    libraries and ``model_path`` load on a background thread, and only
+    model predictions wait for them. An ``anomaly_detector`` adds its risk
+    flags to context risk; feed it through ``AccessAnalyzer``.
+    """
+
+    def __init__(
+            self,
+            model_path: Optional[str] = None,
+            cache_size: int = 0,
+            cache_ttl: float = 60.0,
+            context_store: Optional[ContextStore] = None,
+            metrics: Optional[Instrumentation] = None,
+            decision_log: Optional[DecisionLogger] = None,
+            preload_model: bool = False,
+            anomaly_detector: Optional[AnomalyDetector] = None
+    ):
         try:
             self.policy_manager = PolicyManager()
-            self.context_handler = ContextHandler()
-            self.ml_engine = MLEngine(model_path)
+            self.context_handler = ContextHandler(
+                context_store, anomaly_detector
+            )
+            if preload_model:
+                # Serve rules and contexts while the model loads
+                self.ml_engine = MLEngine()
+                self.ml_engine.preload(model_path)
+            else:
+                self.ml_engine = MLEngine(model_path)
+            self.metrics = metrics or Instrumentation()
+            self.decision_log = decision_log
+            self.decision_cache = (
+                DecisionCache(cache_size, cache_ttl)
+                if cache_size > 0 else None
+            )
 
             self.enforcer = PolicyEnforcer(
                 self.policy_manager,
                 self.context_handler,
-                self.ml_engine
+                self.ml_engine,
+                self.decision_cache,
+                self.metrics
             )
 
         except Exception as e:
@@ -42,11 +81,13 @@ class PrivacyEngine:
             # Check access
             result = self.enforcer.check_access(user_id, data_type, action)
 
-            logger.info(
-                f"Access check - User: {user_id}, "
-                f"Type: {data_type}, "
-                f"Action: {action}, "
-                f"Result: {result['allowed']}"
+            if self.decision_log is not None:
+                self.decision_log.log_decision(
+                    user_id, data_type, action, result
+                )
+            logger.debug(
+                "Access check - User: %s, Type: %s, Action: %s, Result: %s",
+                user_id, data_type, action, result['allowed']
             )
 
             return result
@@ -55,6 +96,42 @@ class PrivacyEngine:
             logger.error(f"Access check error: {e}")
             return {'allowed': False, 'reason': 'System error'}
 
+    def check_access_batch(self, requests: List[Dict]) -> List[Dict]:
+        """Check access permission for a batch of requests.
+
+        Each request is a dict with ``user_id``, ``data_type``, ``action``
+        and an optional ``context``. Results are returned in request order
+        and match calling ``check_access`` for each request in turn: the
+        batch is split wherever a context would change a user already seen
+        in the current part, and each part is checked in one go.
+        """
+        try:
+            results = []
+            for part in split_on_context_changes(requests):
+                for request in part:
+                    if request.get('context'):
+                        self.context_handler.update_context(
+                            request['user_id'], request['context']
+                        )
+                results.extend(self.enforcer.check_access_batch(part))
+
+            if self.decision_log is not None:
+                self.decision_log.log_decisions(requests, results)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Batch access check - Requests: %d, Allowed: %d",
+                    len(requests), sum(1 for r in results if r['allowed'])
+                )
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Batch access check error: {e}")
+            return [
+                {'allowed': False, 'reason': 'System error'}
+                for _ in requests
+            ]
+
 
 if __name__ == "__main__":
     engine = PrivacyEngine()
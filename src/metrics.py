@@ -0,0 +1,383 @@
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+import os
+import random
+import threading
+import time
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+STAGE_SECONDS = 'enforcer_stage_seconds'
+REQUEST_SECONDS = 'enforcer_request_seconds'
+DECISIONS = 'enforcer_decisions_total'
+DENIALS = 'enforcer_denials_total'
+ERRORS = 'enforcer_errors_total'
+CACHE_HITS = 'enforcer_cache_hits_total'
+CACHE_MISSES = 'enforcer_cache_misses_total'
+
+# Upper bounds in seconds, from 1µs to 1s
+DEFAULT_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0
+)
+
+HELP = {
+    STAGE_SECONDS: 'Time spent in each enforcement stage.',
+    REQUEST_SECONDS: 'Total time per access check.',
+    DECISIONS: 'Access decisions by outcome and source.',
+    DENIALS: 'Denied requests by cause.',
+    ERRORS: 'Errors raised during access checks.',
+    CACHE_HITS: 'Decision cache hits.',
+    CACHE_MISSES: 'Decision cache misses.'
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts`` are per bucket, not cumulative."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsSink:
+    """Destination for enforcement metrics.
+
+    This base class discards everything. Subclass it to forward metrics to
+    another system (statsd, OpenTelemetry, ...); ``MetricsRegistry`` keeps
+    them in memory. ``record_request`` receives everything measured for one
+    access check at once and by default fans out to the other methods.
+    """
+
+    def increment(self, name: str, labels: Labels = (), value: int = 1):
+        pass
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        pass
+
+    def record_trace(self, trace: Dict):
+        pass
+
+    def record_request(
+            self,
+            spans: List[Tuple[str, float]],
+            total: float,
+            allowed: bool,
+            source: str
+    ):
+        """Record the stage timings and outcome of one access check."""
+        for stage, elapsed in spans:
+            self.observe(STAGE_SECONDS, elapsed, stage_labels(stage))
+        self.observe(REQUEST_SECONDS, total)
+        self.increment(DECISIONS, decision_labels(allowed, source))
+        if not allowed:
+            self.increment(DENIALS, denial_labels(source))
+
+
+class MetricsRegistry(MetricsSink):
+    """In-memory metrics sink with a Prometheus text exporter."""
+
+    def __init__(
+            self,
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+            trace_capacity: int = 1000
+    ):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.traces: Deque[Dict] = deque(maxlen=trace_capacity)
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, labels: Labels = (), value: int = 1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        with self._lock:
+            self._histogram(name, labels).observe(value)
+
+    def record_trace(self, trace: Dict):
+        self.traces.append(trace)
+
+    def record_request(
+            self,
+            spans: List[Tuple[str, float]],
+            total: float,
+            allowed: bool,
+            source: str
+    ):
+        counters = self.counters
+        with self._lock:
+            for stage, elapsed in spans:
+                self._histogram(
+                    STAGE_SECONDS, stage_labels(stage)
+                ).observe(elapsed)
+            self._histogram(REQUEST_SECONDS, ()).observe(total)
+
+            key = (DECISIONS, decision_labels(allowed, source))
+            counters[key] = counters.get(key, 0) + 1
+            if not allowed:
+                key = (DENIALS, denial_labels(source))
+                counters[key] = counters.get(key, 0) + 1
+
+    def _histogram(self, name: str, labels: Labels) -> Histogram:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        return histogram
+
+    def counter(self, name: str, **labels) -> int:
+        return self.counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get((name, _labels(labels)))
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.traces.clear()
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count)
+                for key, h in self.histograms.items()
+            )
+
+        lines: List[str] = []
+        previous = None
+        for (name, labels), value in counters:
+            if name != previous:
+                lines.extend(_header(name, 'counter'))
+                previous = name
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count in histograms:
+            if name != previous:
+                lines.extend(_header(name, 'histogram'))
+                previous = name
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = labels + (('le', repr(bound)),)
+                lines.append(
+                    f"{name}_bucket{_format_labels(le)} {cumulative}"
+                )
+            le = labels + (('le', '+Inf'),)
+            lines.append(f"{name}_bucket{_format_labels(le)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> bool:
+        """Atomically write the exposition text, e.g. for node_exporter's
+        textfile collector."""
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            logger.error(f"Metrics export error: {e}")
+            return False
+
+    def serve_prometheus(
+            self,
+            port: int = 9464,
+            host: str = '127.0.0.1'
+    ):
+        """Serve ``/metrics`` from a daemon thread; call ``shutdown()`` on
+        the returned server to stop it."""
+        # http.server pulls in the email package; only load it when serving
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header(
+                    'Content-Type', 'text/plain; version=0.0.4'
+                )
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=server.serve_forever, name='MetricsServer', daemon=True
+        ).start()
+        return server
+
+
+class RequestTimer:
+    """Times the stages of one access check.
+
+    Each ``stage`` call records the time since the previous call (or since
+    the timer started) under that stage name. Nothing reaches the sink
+    until ``finish``, which hands it everything in one call.
+    """
+
+    __slots__ = ('sink', 'started', 'last', 'spans', 'traced')
+
+    def __init__(self, sink: MetricsSink, traced: bool):
+        self.sink = sink
+        self.started = self.last = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.traced = traced
+
+    def stage(self, name: str):
+        now = time.perf_counter()
+        self.spans.append((name, now - self.last))
+        self.last = now
+
+    def finish(self, request: Tuple[str, str, str], result: Dict, source: str):
+        """Record the outcome of the check and its sampled trace."""
+        total = time.perf_counter() - self.started
+        allowed = result.get('allowed', False)
+        self.sink.record_request(self.spans, total, allowed, source)
+
+        if self.traced:
+            user_id, data_type, action = request
+            self.sink.record_trace({
+                'user_id': user_id,
+                'data_type': data_type,
+                'action': action,
+                'source': source,
+                'allowed': allowed,
+                'total_seconds': total,
+                'spans': self.spans
+            })
+
+
+class _NullTimer:
+    """Timer handed out while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def stage(self, name: str):
+        pass
+
+    def finish(self, request: Tuple[str, str, str], result: Dict, source: str):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """Hot-path instrumentation for ``PolicyEnforcer``.
+
+    Without a sink every call returns immediately (timers are a shared
+    no-op object), so disabled instrumentation costs a few attribute
+    lookups per request. ``trace_sample_rate`` is the fraction of requests
+    whose per-stage spans are recorded as traces.
+    """
+
+    def __init__(
+            self,
+            sink: Optional[MetricsSink] = None,
+            trace_sample_rate: float = 0.0
+    ):
+        self.sink = sink
+        self.trace_sample_rate = trace_sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def request(self):
+        """Start timing one access check."""
+        if self.sink is None:
+            return NULL_TIMER
+        traced = (
+            self.trace_sample_rate > 0 and
+            random.random() < self.trace_sample_rate
+        )
+        return RequestTimer(self.sink, traced)
+
+    def count(self, name: str, labels: Labels = (), value: int = 1):
+        if self.sink is not None:
+            self.sink.increment(name, labels, value)
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        if self.sink is not None:
+            self.sink.observe(name, value, labels)
+
+
+@lru_cache(maxsize=None)
+def stage_labels(stage: str) -> Labels:
+    return (('stage', stage),)
+
+
+@lru_cache(maxsize=None)
+def decision_labels(allowed: bool, source: str) -> Labels:
+    return (('decision', 'allow' if allowed else 'deny'), ('source', source))
+
+
+@lru_cache(maxsize=None)
+def denial_labels(source: str) -> Labels:
+    return (('cause', source),)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = [
+        f'{key}="{_escape(str(value))}"' for key, value in labels
+    ]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _header(name: str, kind: str) -> List[str]:
+    lines = []
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+    return lines
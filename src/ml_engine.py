@@ -1,22 +1,77 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+import threading
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-import joblib
+from .compiled_forest import CompiledForest
+from .feature_encoder import FeatureEncoder
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
 class MLEngine:
-    """Machine learning engine for policy decisions."""
+    """Machine learning engine for policy decisions.
 
-    def __init__(self, model_path: Optional[str] = None):
+    With ``compile_model`` enabled, the forest is exported to a
+    ``CompiledForest`` after every training run and predictions are served
+    from its flat arrays instead of sklearn's ``predict_proba``.
+
+    Features follow the fixed schema of the ``FeatureEncoder``, which is
+    saved with the model so every process loading it encodes requests the
+    same way.
+
+    sklearn and joblib are imported on first use (training, loading or
+    sklearn prediction), not when this module is imported. ``preload``
+    does that work, and optionally loads a model, on a background thread;
+    predictions wait for it to finish.
+    """
+
+    def __init__(
+            self,
+            model_path: Optional[str] = None,
+            compile_model: bool = False,
+            encoder: Optional[FeatureEncoder] = None
+    ):
         self.model = None
-        self.feature_names: List[str] = []
+        self.compiled: Optional[CompiledForest] = None
+        self.compile_model = compile_model
+        self.encoder = encoder or FeatureEncoder()
+        self.version = 0
+        self._ready = threading.Event()
+        self._ready.set()
         if model_path:
             self.load_model(model_path)
-        else:
-            self.model = RandomForestClassifier(n_estimators=100)
+
+    def preload(
+            self,
+            model_path: Optional[str] = None,
+            mmap_mode: Optional[str] = None
+    ) -> threading.Thread:
+        """Import the ML libraries and load ``model_path`` in the background.
+
+        Returns the started thread; ``wait_until_ready`` blocks until it is
+        done.
+        """
+        self._ready.clear()
+
+        def warm_start():
+            try:
+                _import_sklearn()
+                if model_path:
+                    self.load_model(model_path, mmap_mode)
+            except Exception as e:
+                logger.error(f"Model preload error: {e}")
+            finally:
+                self._ready.set()
+
+        thread = threading.Thread(
+            target=warm_start, name='MLEnginePreload', daemon=True
+        )
+        thread.start()
+        return thread
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a background preload; returns False on timeout."""
+        return self._ready.wait(timeout)
 
     def train(self, features: List[Dict], labels: List[int]):
         """Train the ML model."""
@@ -24,8 +79,15 @@ class MLEngine:
             if not features or not labels:
                 return False
 
+            self.wait_until_ready()
+            if self.model is None:
+                self.model = _new_model()
             X = self._prepare_features(features)
             self.model.fit(X, labels)
+            self.compiled = None
+            if self.compile_model:
+                self.compile()
+            self.version += 1
             return True
         except Exception as e:
             logger.error(f"Training error: {e}")
@@ -34,26 +96,149 @@ class MLEngine:
     def predict(self, feature_dict: Dict) -> float:
         """Predict access permission probability."""
         try:
-            if not self.model:
+            if not self._ready.is_set():
+                self._ready.wait()
+            if not self.model and self.compiled is None:
                 return 0.5
 
             X = self._prepare_features([feature_dict])
-            return float(self.model.predict_proba(X)[0][1])
+            return float(self._predict_proba(X)[0])
         except Exception as e:
             logger.error(f"Prediction error: {e}")
             return 0.5
 
+    def predict_batch(self, feature_dicts: List[Dict]) -> List[float]:
+        """Predict access permission probabilities for many rows at once."""
+        try:
+            if not feature_dicts:
+                return []
+            if not self._ready.is_set():
+                self._ready.wait()
+            if not self.model and self.compiled is None:
+                return [0.5] * len(feature_dicts)
+
+            X = self._prepare_features(feature_dicts)
+            return self._predict_proba(X).astype(float).tolist()
+        except Exception as e:
+            logger.error(f"Batch prediction error: {e}")
+            return [0.5] * len(feature_dicts)
+
+    @property
+    def feature_names(self) -> List[str]:
+        return self.encoder.feature_names
+
+    def save_model(
+            self,
+            model_path: str,
+            include_estimator: bool = True
+    ) -> bool:
+        """Save the model together with its feature schema.
+
+        The compiled forest, if any, is saved as plain arrays so it can be
+        memory-mapped on load. Without ``include_estimator`` only the
+        compiled forest is saved, so a process loading the file holds no
+        private copy of the sklearn model; it can predict but not retrain.
+        """
+        try:
+            import joblib
+
+            joblib.dump({
+                'model': self.model if include_estimator else None,
+                'encoder': self.encoder.to_dict(),
+                'compiled': self.compiled.to_dict() if self.compiled else None
+            }, model_path)
+            return True
+        except Exception as e:
+            logger.error(f"Model save error: {e}")
+            return False
+
+    def load_model(
+            self,
+            model_path: str,
+            mmap_mode: Optional[str] = None
+    ) -> bool:
+        """Load a model saved by ``save_model``.
+
+        With ``mmap_mode='r'`` the compiled forest arrays are memory-mapped
+        read-only, so processes loading the same file share one copy.
+        """
+        try:
+            import joblib
+
+            data = joblib.load(model_path, mmap_mode=mmap_mode)
+            compiled = None
+            if isinstance(data, dict):
+                self.model = data['model']
+                self.encoder = FeatureEncoder.from_dict(data['encoder'])
+                compiled = data.get('compiled')
+            else:
+                # Bare estimator saved before schemas were stored
+                self.model = data
+
+            self.compiled = None
+            if compiled is not None:
+                self.compiled = CompiledForest.from_dict(compiled)
+            elif self.compile_model:
+                self.compile()
+            self.version += 1
+            return True
+        except Exception as e:
+            logger.error(f"Model load error: {e}")
+            return False
+
+    def swap_model(self, model: Any) -> bool:
+        """Atomically replace the fitted model of a running engine.
+
+        The compiled forest is built before anything is replaced, so
+        concurrent predictions use either the old model or the new one,
+        never a mix, and never wait.
+        """
+        try:
+            compiled = None
+            if self.compile_model:
+                compiled = CompiledForest.from_sklearn(model)
+            self.model = model
+            self.compiled = compiled
+            self.version += 1
+            return True
+        except Exception as e:
+            logger.error(f"Model swap error: {e}")
+            return False
+
+    def compile(self) -> bool:
+        """Export the trained forest to flat arrays for fast prediction."""
+        try:
+            self.compiled = CompiledForest.from_sklearn(self.model)
+            return True
+        except Exception as e:
+            logger.error(f"Model compilation error: {e}")
+            self.compiled = None
+            return False
+
+    def _predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Positive-class probabilities from the fastest available model."""
+        if self.compiled is not None:
+            return self.compiled.predict_proba(X)
+        return self.model.predict_proba(X)[:, 1]
+
     def _prepare_features(self, feature_dicts: List[Dict]) -> np.ndarray:
         """Prepare feature dictionary for model."""
         try:
-            if not self.feature_names:
-                self.feature_names = list(feature_dicts[0].keys())
-
-            X = np.zeros((len(feature_dicts), len(self.feature_names)))
-            for i, fd in enumerate(feature_dicts):
-                for j, feature in enumerate(self.feature_names):
-                    X[i, j] = fd.get(feature, 0)
-            return X
+            return self.encoder.transform(feature_dicts)
         except Exception as e:
             logger.error(f"Feature preparation error: {e}")
-            return np.array([])
\ No newline at end of file
+            return np.array([])
+
+
+def _import_sklearn():
+    """Import the parts of sklearn the engine uses (the slow part of
+    startup)."""
+    from sklearn.ensemble import RandomForestClassifier
+    import joblib
+
+    return RandomForestClassifier
+
+
+def _new_model():
+    """Untrained forest used for the first training run."""
+    return _import_sklearn()(n_estimators=100)
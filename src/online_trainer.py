@@ -0,0 +1,195 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import copy
+import json
+import threading
+import numpy as np
+from .data_tracker import DataTracker, LogPosition, READ_CHUNK_SIZE
+from .context_handler import ContextHandler
+from .ml_engine import MLEngine, _import_sklearn
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CLASSES = np.array([0, 1])
+
+
+class OnlineTrainer:
+    """Incrementally trains an ``MLEngine`` from the access log.
+
+    Labeled events (``success`` is the label) are streamed out of the
+    ``DataTracker`` in chunks of ``chunk_size`` rows, so only one chunk is
+    ever held in memory. Each chunk updates a private copy of the model:
+
+    * estimators with ``partial_fit`` (e.g. ``SGDClassifier``) are updated
+      in place;
+    * random forests are warm-started, growing ``trees_per_chunk`` new
+      trees fitted on the chunk. With ``max_trees`` set, the oldest trees
+      are dropped so the forest tracks recent behaviour.
+
+    After every ``publish_every`` chunks (and at the end of a run) a
+    snapshot of the private model is swapped into the engine with
+    ``MLEngine.swap_model``; decisions keep using the previous model until
+    then and never wait on training. The read position is remembered, so
+    the next ``train_from_log`` call only sees new events.
+    """
+
+    def __init__(
+            self,
+            tracker: DataTracker,
+            ml_engine: MLEngine,
+            context_handler: Optional[ContextHandler] = None,
+            estimator: Any = None,
+            chunk_size: int = READ_CHUNK_SIZE,
+            trees_per_chunk: int = 10,
+            max_trees: Optional[int] = 500,
+            publish_every: int = 1
+    ):
+        self.tracker = tracker
+        self.ml_engine = ml_engine
+        self.context_handler = context_handler or ContextHandler()
+        self.chunk_size = chunk_size
+        self.trees_per_chunk = trees_per_chunk
+        self.max_trees = max_trees
+        self.publish_every = publish_every
+        self.position: Optional[LogPosition] = None
+        self.rows_trained = 0
+        self.chunks_skipped = 0
+
+        self._model = estimator
+        self._carry: Tuple[List[Dict], List[int]] = ([], [])
+        self._lock = threading.Lock()
+        self._stop: Optional[threading.Event] = None
+
+    def train_from_log(
+            self,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None
+    ) -> int:
+        """Train on events logged since the last call; returns rows used."""
+        with self._lock:
+            trained = 0
+            pending = 0
+            try:
+                for position, rows in self.tracker.iter_chunks(
+                        self.chunk_size, start, end, self.position
+                ):
+                    rows_used = self._train_chunk(rows)
+                    trained += rows_used
+                    self.rows_trained += rows_used
+                    self.position = position
+                    pending += 1
+                    if pending >= self.publish_every:
+                        self._publish()
+                        pending = 0
+            except Exception as e:
+                logger.error(f"Online training error: {e}")
+
+            if pending:
+                self._publish()
+            return trained
+
+    def start(self, interval: float = 60.0) -> threading.Thread:
+        """Keep training from the log every ``interval`` seconds.
+
+        Returns the daemon thread; call ``stop`` to end it.
+        """
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.is_set():
+                self.train_from_log()
+                self._stop.wait(interval)
+
+        thread = threading.Thread(
+            target=run, name='OnlineTrainer', daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def _train_chunk(self, rows: List[Tuple]) -> int:
+        """Update the private model with one chunk of log rows."""
+        features, labels = self._carry
+        for timestamp_us, _, data_type, action, success, context_json in rows:
+            context = json.loads(context_json) if context_json else {}
+            risk_score = self.context_handler.evaluate_context_risk(context)
+            # Stored contexts served at decision time carry last_updated
+            context['last_updated'] = timestamp_us
+            features.append(self.ml_engine.encoder.request_features(
+                risk_score, data_type, action, context
+            ))
+            labels.append(int(success))
+
+        # A forest cannot take a single-class chunk; keep the most recent
+        # rows for the next one
+        if len(set(labels)) < 2:
+            self._carry = (
+                features[-self.chunk_size:], labels[-self.chunk_size:]
+            )
+            self.chunks_skipped += 1
+            return 0
+        self._carry = ([], [])
+
+        X = self.ml_engine.encoder.transform(features)
+        y = np.asarray(labels)
+        model = self._model_for_update()
+        if hasattr(model, 'partial_fit'):
+            model.partial_fit(X, y, classes=CLASSES)
+        else:
+            model.n_estimators = (
+                len(getattr(model, 'estimators_', ())) + self.trees_per_chunk
+            )
+            model.fit(X, y)
+            self._trim_forest(model)
+        return len(labels)
+
+    def _model_for_update(self) -> Any:
+        """The private model, created on first use."""
+        if self._model is None:
+            current = self.ml_engine.model
+            if current is not None and _is_fitted(current) and (
+                    hasattr(current, 'estimators_') or
+                    hasattr(current, 'partial_fit')):
+                # Continue from the served model without touching it
+                self._model = self._snapshot(current)
+            else:
+                self._model = _import_sklearn()(n_estimators=0)
+            if not hasattr(self._model, 'partial_fit'):
+                self._model.set_params(warm_start=True)
+        return self._model
+
+    def _trim_forest(self, model: Any):
+        if self.max_trees and len(model.estimators_) > self.max_trees:
+            model.estimators_ = model.estimators_[-self.max_trees:]
+            model.n_estimators = len(model.estimators_)
+
+    def _publish(self):
+        """Swap a snapshot of the private model into the engine."""
+        if self._model is None or not _is_fitted(self._model):
+            return
+        if self.ml_engine.swap_model(self._snapshot(self._model)):
+            logger.info(
+                f"Published online model - Rows: {self.rows_trained}, "
+                f"Position: {self.position}"
+            )
+
+    @staticmethod
+    def _snapshot(model: Any) -> Any:
+        """Copy of a model that later training will not mutate.
+
+        Fitted trees are never changed by warm-starting, so a forest only
+        needs its own estimator list; other models are deep-copied.
+        """
+        if hasattr(model, 'estimators_'):
+            snapshot = copy.copy(model)
+            snapshot.estimators_ = list(model.estimators_)
+            return snapshot
+        return copy.deepcopy(model)
+
+
+def _is_fitted(model: Any) -> bool:
+    return hasattr(model, 'classes_')
@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from .rule_engine import CompiledRule, RuleEngine, RuleSet
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+WILDCARD = '*'
+
+IndexKey = Tuple[str, str]
+
+
+class PolicyIndex:
+    """Compiled, versioned lookup of active policies by (data_type, action).
+
+    Policies are bucketed under every (data_type, action) pair they declare.
+    A policy without ``data_types`` or ``actions`` is stored under the
+    wildcard for that axis and applies to every value of it. Each policy's
+    rules are compiled once when it is indexed.
+    """
+
+    def __init__(self, rule_engine: Optional[RuleEngine] = None):
+        self.version = 0
+        self.rule_engine = rule_engine or RuleEngine()
+        self._buckets: Dict[IndexKey, Dict[str, Dict]] = {}
+        self._keys: Dict[str, List[IndexKey]] = {}
+        self._compiled: Dict[str, List[CompiledRule]] = {}
+        self._resolved: Dict[IndexKey, Dict[str, Dict]] = {}
+        self._resolved_rules: Dict[IndexKey, RuleSet] = {}
+
+    def add(self, policy_id: str, policy: Dict):
+        """Index a policy, replacing any previous entry with the same id.
+
+        Raises ``RuleCompilationError``, leaving the index unchanged, if any
+        of the policy's rules cannot be compiled.
+        """
+        compiled = self.rule_engine.compile_policy(policy)
+        self._unlink(policy_id)
+
+        keys = [
+            (data_type, action)
+            for data_type in self._data_types(policy)
+            for action in self._actions(policy)
+        ]
+        for key in keys:
+            self._buckets.setdefault(key, {})[policy_id] = policy
+        self._keys[policy_id] = keys
+        self._compiled[policy_id] = compiled
+
+        self._bump()
+
+    def remove(self, policy_id: str) -> bool:
+        """Drop a policy from the index."""
+        if not self._unlink(policy_id):
+            return False
+        self._bump()
+        return True
+
+    def lookup(self, data_type: str, action: str) -> Dict[str, Dict]:
+        """Return the policies that apply to a data type and action.
+
+        The returned dict is shared between callers until the index changes
+        and must not be mutated.
+        """
+        key = (data_type, action)
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            return resolved
+
+        resolved = {}
+        for candidate in (
+                key,
+                (data_type, WILDCARD),
+                (WILDCARD, action),
+                (WILDCARD, WILDCARD)
+        ):
+            bucket = self._buckets.get(candidate)
+            if bucket:
+                resolved.update(bucket)
+
+        self._resolved[key] = resolved
+        return resolved
+
+    def lookup_rules(self, data_type: str, action: str) -> RuleSet:
+        """Return the compiled rules that apply to a data type and action."""
+        key = (data_type, action)
+        rule_set = self._resolved_rules.get(key)
+        if rule_set is not None:
+            return rule_set
+
+        rule_set = RuleSet(
+            rule
+            for policy_id in self.lookup(data_type, action)
+            for rule in self._compiled[policy_id]
+            if (rule.data_type is None or rule.data_type == data_type)
+            and (rule.request_action is None or rule.request_action == action)
+        )
+        self._resolved_rules[key] = rule_set
+        return rule_set
+
+    def copy(self) -> 'PolicyIndex':
+        """Independent index over the same policies, sharing their
+        compiled rules, for building the next version off to the side."""
+        index = PolicyIndex(self.rule_engine)
+        index.version = self.version
+        index._buckets = {
+            key: dict(bucket) for key, bucket in self._buckets.items()
+        }
+        index._keys = dict(self._keys)
+        index._compiled = dict(self._compiled)
+        return index
+
+    def __getstate__(self) -> Dict:
+        # Memoised lookups are rebuilt on demand; don't persist them
+        state = self.__dict__.copy()
+        state['_resolved'] = {}
+        state['_resolved_rules'] = {}
+        return state
+
+    def __contains__(self, policy_id: str) -> bool:
+        return policy_id in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _unlink(self, policy_id: str) -> bool:
+        """Remove a policy's bucket entries without bumping the version."""
+        keys = self._keys.pop(policy_id, None)
+        if keys is None:
+            return False
+        self._compiled.pop(policy_id, None)
+
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.pop(policy_id, None)
+            if not bucket:
+                del self._buckets[key]
+        return True
+
+    def _bump(self):
+        """Advance the version and drop memoised lookups."""
+        self.version += 1
+        self._resolved.clear()
+        self._resolved_rules.clear()
+
+    @staticmethod
+    def _data_types(policy: Dict) -> Iterable[str]:
+        """Data types a policy declares, falling back to its rules."""
+        data_types = policy.get('data_types')
+        if data_types:
+            return set(data_types)
+
+        rules = [r for r in policy.get('rules', []) if isinstance(r, dict)]
+        if not rules or any(not rule.get('data_type') for rule in rules):
+            return {WILDCARD}
+        return {rule['data_type'] for rule in rules}
+
+    @staticmethod
+    def _actions(policy: Dict) -> Iterable[str]:
+        """Actions a policy declares."""
+        return set(policy.get('actions') or ()) or {WILDCARD}
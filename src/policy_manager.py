@@ -1,43 +1,275 @@
-from typing import Dict, List, Optional
+from typing import Dict, Optional, Tuple
 import json
+import os
+import threading
 from datetime import datetime
+from .policy_index import PolicyIndex
+from .policy_snapshot import (
+    PolicySnapshot, build_snapshot, export_json, load, save_packed
+)
+from .rule_engine import RuleSet
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
 class PolicyManager:
-    """Manages privacy policies and their rules."""
+    """Manages privacy policies and their rules.
+
+    ``policy_file`` may be a packed policy file written by
+    ``save_policies`` or a JSON policy file; see ``policy_snapshot``.
+
+    The policy set is held as immutable generations (``PolicySnapshot``).
+    Readers get the current one with a single attribute read, so they see
+    either the old or the new policy set and never a partial update.
+    Writers are serialized; each builds the next generation from copies
+    and publishes it with one assignment.
+    """
 
     def __init__(self, policy_file: Optional[str] = None):
-        self.policies: Dict[str, Dict] = {}
-        self.active_policies: Dict[str, bool] = {}
+        self._generation = PolicySnapshot({}, {}, PolicyIndex())
+        self._write_lock = threading.Lock()
+        self._watch_stop: Optional[threading.Event] = None
         if policy_file:
             self.load_policies(policy_file)
 
+    @property
+    def generation(self) -> PolicySnapshot:
+        """The current policy set; read it once to get a consistent view."""
+        return self._generation
+
+    @property
+    def policies(self) -> Dict[str, Dict]:
+        return self._generation.policies
+
+    @property
+    def active_policies(self) -> Dict[str, bool]:
+        return self._generation.active_policies
+
+    @property
+    def index(self) -> PolicyIndex:
+        return self._generation.index
+
+    @property
+    def version(self) -> int:
+        """Version of the active policy set, bumped on every change."""
+        return self._generation.index.version
+
     def add_policy(self, policy_id: str, policy_data: Dict) -> bool:
         """Add or update a policy."""
+        if not self.add_policies({policy_id: policy_data}):
+            return False
+        logger.info(f"Policy {policy_id} added/updated")
+        return True
+
+    def add_policies(self, policies: Dict[str, Dict]) -> bool:
+        """Add or update many policies as one new generation.
+
+        Each generation is a copy of the last, so adding policies one at a
+        time costs O(number of policies) per call; this copies once. If any
+        policy fails to compile none of them is added.
+        """
         try:
-            self.policies[policy_id] = {
-                **policy_data,
-                'last_updated': datetime.now().isoformat(),
-                'version': policy_data.get('version', 1) + 1
+            now = datetime.now().isoformat()
+            policies = {
+                policy_id: {
+                    **policy_data,
+                    'last_updated': now,
+                    'version': policy_data.get('version', 1) + 1
+                }
+                for policy_id, policy_data in policies.items()
             }
-            self.active_policies[policy_id] = True
-            logger.info(f"Policy {policy_id} added/updated")
+            with self._write_lock:
+                current = self._generation
+                index = current.index.copy()
+                for policy_id, policy in policies.items():
+                    index.add(policy_id, policy)
+                self._generation = PolicySnapshot(
+                    {**current.policies, **policies},
+                    {
+                        **current.active_policies,
+                        **dict.fromkeys(policies, True)
+                    },
+                    index,
+                    index.version
+                )
             return True
         except Exception as e:
-            logger.error(f"Error adding policy: {e}")
+            logger.error(f"Error adding policies: {e}")
+            return False
+
+    def deactivate_policy(self, policy_id: str) -> bool:
+        """Stop enforcing a policy without deleting it."""
+        if not self._set_active(policy_id, False):
+            return False
+        logger.info(f"Policy {policy_id} deactivated")
+        return True
+
+    def activate_policy(self, policy_id: str) -> bool:
+        """Resume enforcing a previously deactivated policy."""
+        if not self._set_active(policy_id, True):
+            return False
+        logger.info(f"Policy {policy_id} activated")
+        return True
+
+    def replace_policies(self, policies: Dict[str, Dict]) -> bool:
+        """Replace the whole policy set with already-stored policies.
+
+        Unlike ``add_policy`` the policies are taken as-is, without bumping
+        their version or timestamp; all of them become active.
+        """
+        try:
+            return self.install(
+                build_snapshot(policies, rule_engine=self.index.rule_engine)
+            )
+        except Exception as e:
+            logger.error(f"Error replacing policies: {e}")
             return False
 
+    def install(self, snapshot: PolicySnapshot) -> bool:
+        """Publish a compiled policy set while requests are being served.
+
+        The snapshot becomes the current generation and must not be
+        modified afterwards. The version keeps increasing so decision
+        caches never serve the old set.
+        """
+        with self._write_lock:
+            version = max(self.version + 1, snapshot.version)
+            snapshot.index.version = version
+            snapshot.version = version
+            self._generation = snapshot
+        logger.info(
+            f"Policy set replaced with {len(snapshot.policies)} policies"
+        )
+        return True
+
+    def load_policies(self, policy_file: str) -> bool:
+        """Load and install a packed or a JSON policy file."""
+        try:
+            return self.install(load(policy_file, self.index.rule_engine))
+        except Exception as e:
+            logger.error(f"Error loading policies: {e}")
+            return False
+
+    def save_policies(self, packed_file: str) -> bool:
+        """Atomically write the policy set as a packed policy file."""
+        try:
+            save_packed(self._generation, packed_file)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving packed policies: {e}")
+            return False
+
+    def export_policies(self, json_file: str) -> bool:
+        """Atomically write the policy set as readable JSON."""
+        try:
+            export_json(self._generation, json_file)
+            return True
+        except Exception as e:
+            logger.error(f"Error exporting policies: {e}")
+            return False
+
+    def snapshot(self) -> PolicySnapshot:
+        """The current policy set as a ``PolicySnapshot``."""
+        return self._generation
+
+    def watch(
+            self,
+            policy_file: str,
+            interval: float = 1.0
+    ) -> threading.Thread:
+        """Reload ``policy_file`` whenever it changes on disk.
+
+        The file is polled every ``interval`` seconds. A changed file is
+        loaded and compiled on the watcher thread and then installed;
+        requests keep being enforced with the previous generation until
+        then, and if the file cannot be loaded (e.g. it is half written)
+        the previous generation stays in place until the file changes
+        again. Returns the daemon thread; call ``stop_watching`` to end it.
+        """
+        self.stop_watching()
+        stop = self._watch_stop = threading.Event()
+
+        # Taken before the thread starts, so a change made right after
+        # ``watch`` returns is not missed
+        initial = _file_signature(policy_file)
+
+        def run():
+            seen = initial
+            while not stop.wait(interval):
+                try:
+                    signature = _file_signature(policy_file)
+                    if signature is None or signature == seen:
+                        continue
+                    seen = signature
+                    if self.load_policies(policy_file):
+                        logger.info(f"Reloaded policies from {policy_file}")
+                except Exception as e:
+                    # Keep watching; the current generation stays in force
+                    logger.error(f"Policy watcher error: {e}")
+
+        thread = threading.Thread(
+            target=run, name='PolicyWatcher', daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
     def get_active_policies(self) -> Dict[str, Dict]:
-        """Get all active policies."""
-        return {
-            pid: policy for pid, policy in self.policies.items()
-            if self.active_policies.get(pid, False)
-        }
+        """Get all active policies.
+
+        The returned dict belongs to the current generation and must not
+        be mutated.
+        """
+        return self._generation.active
+
+    def get_policies_for(self, data_type: str, action: str) -> Dict[str, Dict]:
+        """Get the active policies that apply to a data type and action."""
+        return self._generation.index.lookup(data_type, action)
+
+    def get_rules_for(self, data_type: str, action: str) -> RuleSet:
+        """Get the compiled rules that apply to a data type and action."""
+        return self._generation.index.lookup_rules(data_type, action)
 
     def validate_policy(self, policy_data: Dict) -> bool:
         """Validate policy structure."""
         required_fields = {'rules', 'data_types', 'actions'}
         return all(field in policy_data for field in required_fields)
+
+    def _set_active(self, policy_id: str, active: bool) -> bool:
+        """Publish a generation with one policy switched on or off."""
+        with self._write_lock:
+            current = self._generation
+            policy = current.policies.get(policy_id)
+            if policy is None:
+                return False
+
+            index = current.index.copy()
+            if active:
+                index.add(policy_id, policy)
+            else:
+                index.remove(policy_id)
+            self._generation = PolicySnapshot(
+                current.policies,
+                {**current.active_policies, policy_id: active},
+                index,
+                index.version
+            )
+            return True
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """What identifies a version of a file on disk, or None if missing.
+
+    Atomic replacement gives the file a new inode even when the size and
+    modification time happen to match.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
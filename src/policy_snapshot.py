@@ -0,0 +1,275 @@
+"""Save and load policy sets.
+
+Packed policy files are a compact export format: a checksummed binary
+header in front of the minified policy dicts and the policy set version.
+Rules are compiled on load, as for JSON, so a packed file loads about as
+fast as JSON does; it does not depend on the engine's internal classes
+and stays loadable across releases. Readable JSON import and export are
+kept for humans and version control.
+
+    python -m src.policy_snapshot pack policies.json policies.pack
+    python -m src.policy_snapshot export policies.pack policies.json
+"""
+from typing import Dict, List, Optional
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+from .policy_index import PolicyIndex
+from .rule_engine import RuleEngine
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MAGIC = b'PPSNAP\x00\x01'
+
+PACKED_FORMAT_VERSION = 2
+
+JSON_FORMAT_VERSION = 1
+
+# magic, format version, reserved, policy set version, payload size,
+# sha256 of the payload
+HEADER = struct.Struct('<8sHHQQ32s')
+
+
+class SnapshotError(ValueError):
+    """Raised for missing, truncated, corrupt, unsupported or invalid
+    policy files."""
+
+
+class PolicySnapshot:
+    """A complete policy set; ``PolicyManager`` serves one at a time as
+    its current generation.
+
+    ``index`` holds every active policy with its rules already compiled,
+    ``active`` maps the ids of active policies to their policies and
+    ``version`` is the policy set version. Once published, a snapshot and
+    the dicts it holds are never mutated.
+    """
+
+    __slots__ = ('policies', 'active_policies', 'index', 'version', 'active')
+
+    def __init__(
+            self,
+            policies: Dict[str, Dict],
+            active_policies: Dict[str, bool],
+            index: PolicyIndex,
+            version: int = 0
+    ):
+        self.policies = policies
+        self.active_policies = active_policies
+        self.index = index
+        self.version = version
+        self.active = {
+            pid: policy for pid, policy in policies.items()
+            if active_policies.get(pid, False)
+        }
+
+
+def build_snapshot(
+        policies: Dict[str, Dict],
+        active_policies: Optional[Dict[str, bool]] = None,
+        rule_engine: Optional[RuleEngine] = None,
+        version: int = 0
+) -> PolicySnapshot:
+    """Compile a policy set; policies missing from ``active_policies``
+    are active."""
+    active_policies = active_policies or {}
+    index = PolicyIndex(rule_engine)
+    active = {}
+    for policy_id, policy in policies.items():
+        active[policy_id] = bool(active_policies.get(policy_id, True))
+        if active[policy_id]:
+            index.add(policy_id, policy)
+    index.version = version
+    return PolicySnapshot(dict(policies), active, index, version)
+
+
+def save_packed(snapshot: PolicySnapshot, path: str):
+    """Write a packed policy file, atomically replacing ``path``."""
+    payload = json.dumps({
+        'policies': snapshot.policies,
+        'active_policies': snapshot.active_policies,
+        'saved_at': datetime.now().isoformat()
+    }, separators=(',', ':')).encode()
+    header = HEADER.pack(
+        MAGIC, PACKED_FORMAT_VERSION, 0, snapshot.version, len(payload),
+        hashlib.sha256(payload).digest()
+    )
+    _write_atomic(path, header + payload)
+
+
+def load_packed(
+        path: str,
+        rule_engine: Optional[RuleEngine] = None
+) -> PolicySnapshot:
+    """Verify a packed policy file and compile the policies it holds.
+
+    Any problem with the file, from a bad checksum to a rule that does not
+    compile, raises ``SnapshotError``.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        raise SnapshotError(f"Cannot read packed policy file {path}: {e}")
+
+    if len(data) < HEADER.size:
+        raise SnapshotError(f"Truncated packed policy file: {path}")
+    magic, format_version, _, version, size, checksum = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError(f"Not a packed policy file: {path}")
+    if format_version != PACKED_FORMAT_VERSION:
+        raise SnapshotError(
+            f"Unsupported packed format {format_version} in {path}; "
+            f"compile it again from JSON"
+        )
+    payload = data[HEADER.size:]
+    if len(payload) != size:
+        raise SnapshotError(f"Truncated packed policy file: {path}")
+    if hashlib.sha256(payload).digest() != checksum:
+        raise SnapshotError(f"Packed policy file checksum mismatch: {path}")
+
+    try:
+        data = json.loads(payload)
+    except ValueError as e:
+        raise SnapshotError(f"Cannot decode packed policy file {path}: {e}")
+    if not isinstance(data, dict):
+        raise SnapshotError(f"Packed policy file must hold an object: {path}")
+    return _build(
+        path, data.get('policies'), data.get('active_policies'),
+        rule_engine, version
+    )
+
+
+def is_packed(path: str) -> bool:
+    """Check whether a file starts with the packed format magic."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def export_json(snapshot: PolicySnapshot, path: str):
+    """Write a policy set as readable JSON, atomically replacing ``path``."""
+    data = {
+        'format_version': JSON_FORMAT_VERSION,
+        'version': snapshot.version,
+        'exported_at': datetime.now().isoformat(),
+        'policies': snapshot.policies,
+        'inactive': sorted(
+            pid for pid, active in snapshot.active_policies.items()
+            if not active
+        )
+    }
+    _write_atomic(
+        path, json.dumps(data, indent=2, sort_keys=True).encode() + b'\n'
+    )
+
+
+def import_json(
+        path: str,
+        rule_engine: Optional[RuleEngine] = None
+) -> PolicySnapshot:
+    """Read and compile a JSON policy file.
+
+    Accepts files written by ``export_json`` as well as a plain mapping of
+    policy id to policy.
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot read policy file {path}: {e}")
+    if not isinstance(data, dict):
+        raise SnapshotError(f"Policy file must hold an object: {path}")
+
+    if 'format_version' not in data:
+        return _build(path, data, None, rule_engine, 0)
+    if data['format_version'] != JSON_FORMAT_VERSION:
+        raise SnapshotError(
+            f"Unsupported policy file format: {data['format_version']}"
+        )
+    inactive = data.get('inactive', [])
+    version = data.get('version', 0)
+    if not isinstance(inactive, list) or not isinstance(version, int):
+        raise SnapshotError(f"Malformed policy file: {path}")
+    return _build(
+        path,
+        data.get('policies', {}),
+        {pid: False for pid in inactive if isinstance(pid, str)},
+        rule_engine,
+        version
+    )
+
+
+def load(
+        path: str,
+        rule_engine: Optional[RuleEngine] = None
+) -> PolicySnapshot:
+    """Load a packed or a JSON policy file, whichever ``path`` is."""
+    if is_packed(path):
+        return load_packed(path, rule_engine)
+    return import_json(path, rule_engine)
+
+
+def _build(
+        path: str,
+        policies,
+        active_policies,
+        rule_engine: Optional[RuleEngine],
+        version: int
+) -> PolicySnapshot:
+    """``build_snapshot`` for decoded file data, raising ``SnapshotError``
+    for anything that is not a valid policy set."""
+    if not isinstance(policies, dict) or not all(
+            isinstance(policy, dict) for policy in policies.values()):
+        raise SnapshotError(f"Policies must be a mapping of objects: {path}")
+    if active_policies is not None and not isinstance(active_policies, dict):
+        raise SnapshotError(f"Malformed active policies in {path}")
+    try:
+        return build_snapshot(policies, active_policies, rule_engine, version)
+    except Exception as e:
+        raise SnapshotError(f"Invalid policy in {path}: {e}") from e
+
+
+def _write_atomic(path: str, data: bytes):
+    """Write to a temporary file and rename it over ``path``, so readers
+    only ever see the old file or the complete new one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('pack', 'export'))
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args(argv)
+
+    try:
+        snapshot = load(args.source)
+        if args.command == 'pack':
+            save_packed(snapshot, args.target)
+        else:
+            export_json(snapshot, args.target)
+    except (OSError, SnapshotError) as e:
+        logger.error(f"Policy file error: {e}")
+        return 1
+    logger.info(
+        f"Wrote {len(snapshot.policies)} policies to {args.target}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
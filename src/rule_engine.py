@@ -0,0 +1,296 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+# Lower value wins: deny overrides step-up actions, which override allow
+ACTION_PRECEDENCE = {'deny': 0, 'allow': 2}
+DEFAULT_PRECEDENCE = 1
+
+NUMERIC_FIELDS = {'risk_score', 'attempt_count'}
+
+# Keyed by the first three letters so 'mon' and 'Monday' both work
+DAY_NAMES = {
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6
+}
+
+# Rough number of distinct values per field, used to estimate selectivity
+FIELD_CARDINALITY = {'day_of_week': 7, 'network_type': 4}
+DEFAULT_CARDINALITY = 10
+
+
+class RequestFacts:
+    """Flattened view of one request that compiled predicates read from."""
+
+    __slots__ = ('data_type', 'action', 'context', 'risk_score',
+                 'minute', 'weekday')
+
+    def __init__(
+            self,
+            data_type: str,
+            action: str,
+            context: Dict,
+            risk_score: float,
+            when: Optional[datetime] = None
+    ):
+        self.data_type = data_type
+        self.action = action
+        self.context = context
+        self.risk_score = risk_score
+
+        if when is None:
+            when = _context_time(context)
+        self.minute = when.hour * 60 + when.minute
+        self.weekday = when.weekday()
+
+    def get(self, field: str) -> Any:
+        """Look up a condition field for this request."""
+        if field == 'risk_score':
+            return self.risk_score
+        if field == 'day_of_week':
+            return self.weekday
+        if field == 'attempt_count':
+            return self.context.get(
+                'attempt_count', self.context.get('failed_attempts', 0)
+            )
+        return self.context.get(field)
+
+
+class MembershipPredicate:
+    """Field value must be one of a fixed set."""
+
+    __slots__ = ('field', 'values', 'selectivity')
+
+    def __init__(self, field: str, values: Iterable):
+        self.field = field
+        self.values = frozenset(values)
+        cardinality = FIELD_CARDINALITY.get(field, DEFAULT_CARDINALITY)
+        self.selectivity = min(1.0, len(self.values) / cardinality)
+
+    def __call__(self, facts: RequestFacts) -> bool:
+        value = facts.get(self.field)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return not self.values.isdisjoint(value)
+        try:
+            return value in self.values
+        except TypeError:
+            return False
+
+
+class TimeRangePredicate:
+    """Request minute-of-day must fall in a half-open window.
+
+    Windows whose end is before their start wrap around midnight.
+    """
+
+    __slots__ = ('start', 'end', 'selectivity')
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        span = (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+        self.selectivity = span / MINUTES_PER_DAY
+
+    def __call__(self, facts: RequestFacts) -> bool:
+        minute = facts.minute
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+
+class RangePredicate:
+    """Numeric field must lie within inclusive bounds."""
+
+    __slots__ = ('field', 'low', 'high', 'selectivity')
+
+    def __init__(self, field: str, low: float, high: float):
+        self.field = field
+        self.low = low
+        self.high = high
+        if field == 'risk_score':
+            self.selectivity = max(0.0, min(high, 1.0) - max(low, 0.0))
+        else:
+            self.selectivity = 0.5
+
+    def __call__(self, facts: RequestFacts) -> bool:
+        value = facts.get(self.field)
+        if value is None:
+            return False
+        try:
+            return self.low <= value <= self.high
+        except TypeError:
+            return False
+
+
+class CompiledRule:
+    """A rule whose conditions are precompiled predicates.
+
+    Predicates are ordered most-selective-first so a non-matching request
+    is rejected after as few checks as possible. ``request_action``, when
+    set, limits the rule to requests for that action.
+    """
+
+    __slots__ = ('rule_id', 'data_type', 'action', 'predicates', 'precedence',
+                 'request_action')
+
+    def __init__(
+            self,
+            rule_id: Optional[str],
+            data_type: Optional[str],
+            action: str,
+            predicates: List,
+            request_action: Optional[str] = None
+    ):
+        self.rule_id = rule_id
+        self.data_type = data_type
+        self.request_action = request_action
+        self.action = action
+        self.predicates = tuple(
+            sorted(predicates, key=lambda p: p.selectivity)
+        )
+        self.precedence = ACTION_PRECEDENCE.get(action, DEFAULT_PRECEDENCE)
+
+    def matches(self, facts: RequestFacts) -> bool:
+        """Check whether every condition holds for a request."""
+        if self.data_type is not None and self.data_type != facts.data_type:
+            return False
+        if (self.request_action is not None
+                and self.request_action != facts.action):
+            return False
+        for predicate in self.predicates:
+            if not predicate(facts):
+                return False
+        return True
+
+
+class RuleSet:
+    """Ordered collection of compiled rules with deny-overrides semantics."""
+
+    __slots__ = ('rules',)
+
+    def __init__(self, rules: Iterable[CompiledRule]):
+        self.rules = tuple(sorted(
+            rules, key=lambda r: (r.precedence, len(r.predicates))
+        ))
+
+    def evaluate(self, facts: RequestFacts) -> Optional[CompiledRule]:
+        """Return the winning rule for a request, if any rule matches.
+
+        Rules are sorted by action precedence, so the first match is the
+        winner and evaluation stops there.
+        """
+        for rule in self.rules:
+            if rule.matches(facts):
+                return rule
+        return None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+
+class RuleCompilationError(ValueError):
+    """Raised for a rule that cannot be compiled."""
+
+
+class RuleEngine:
+    """Compiles policy and generated rule dicts into predicate objects.
+
+    A rule that cannot be compiled raises ``RuleCompilationError`` instead
+    of being skipped, so a broken deny rule never silently stops denying.
+    """
+
+    def compile_rule(self, rule: Dict) -> CompiledRule:
+        """Compile a single rule dict."""
+        if not isinstance(rule, dict):
+            raise RuleCompilationError(f"Rule is not a dict: {rule!r}")
+        try:
+            predicates = [
+                self._compile_condition(field, value)
+                for field, value in rule.get('conditions', {}).items()
+            ]
+            return CompiledRule(
+                rule.get('id'),
+                rule.get('data_type'),
+                rule.get('action', 'deny'),
+                predicates,
+                rule.get('request_action')
+            )
+        except Exception as e:
+            raise RuleCompilationError(
+                f"Cannot compile rule {rule.get('id')!r}: {e}"
+            ) from e
+
+    def compile_rules(self, rules: Iterable[Dict]) -> List[CompiledRule]:
+        """Compile many rule dicts; any failure rejects them all."""
+        return [self.compile_rule(rule) for rule in rules]
+
+    def compile_policy(self, policy: Dict) -> List[CompiledRule]:
+        """Compile the rules carried by a policy."""
+        return self.compile_rules(policy.get('rules', []))
+
+    def _compile_condition(self, field: str, value: Any):
+        """Turn one condition entry into a predicate."""
+        if field == 'time_range':
+            start, end = value
+            return TimeRangePredicate(_to_minute(start), _to_minute(end))
+
+        if field == 'day_of_week':
+            days = value if isinstance(value, (list, tuple, set)) else [value]
+            return MembershipPredicate(field, [_to_weekday(d) for d in days])
+
+        # Bare numbers are a maximum only for numeric fields; elsewhere
+        # they must match exactly
+        if field in NUMERIC_FIELDS or isinstance(value, dict):
+            low, high = _to_bounds(value)
+            return RangePredicate(field, low, high)
+
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return MembershipPredicate(field, value)
+        return MembershipPredicate(field, [value])
+
+
+def _context_time(context: Dict) -> datetime:
+    """Request time from the context, falling back to now."""
+    value = context.get('time')
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def _to_minute(value: Any) -> int:
+    """Convert ``HH:MM`` or an hour number to minute of day."""
+    if isinstance(value, str):
+        hours, _, minutes = value.partition(':')
+        return (int(hours) * 60 + int(minutes or 0)) % MINUTES_PER_DAY
+    return int(value * 60) % MINUTES_PER_DAY
+
+
+def _to_weekday(value: Any) -> int:
+    """Convert a day name or number to ``datetime.weekday()`` form."""
+    if isinstance(value, str):
+        return DAY_NAMES[value.strip().lower()[:3]]
+    return int(value)
+
+
+def _to_bounds(value: Any) -> Tuple[float, float]:
+    """Convert a numeric condition to inclusive (low, high) bounds.
+
+    A bare number is treated as a maximum.
+    """
+    if isinstance(value, dict):
+        return (
+            value.get('min', float('-inf')),
+            value.get('max', float('inf'))
+        )
+    if isinstance(value, (list, tuple)):
+        low, high = value
+        return (float(low), float(high))
+    return (float('-inf'), float(value))
@@ -1,13 +1,26 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import json
 from datetime import datetime
+import numpy as np
+from .data_tracker import DataTracker, READ_CHUNK_SIZE
+from .utils import hash_data
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Context JSON strings whose location is remembered during mining
+LOCATION_CACHE_SIZE = 100000
+
+UNKNOWN_LOCATION = ''
+
 
 class RuleGenerator:
-    """Generates dynamic privacy rules based on patterns."""
+    """Generates dynamic privacy rules based on patterns.
+
+    Rule ids are content hashes of a rule's type, data type, request
+    action, conditions and action, so identical rules always share an id
+    and distinct rules never collide.
+    """
 
     def __init__(self):
         self.rules: Dict[str, Dict] = {}
@@ -28,6 +41,9 @@ class RuleGenerator:
                 'actions': ['allow', 'deny', 'require_verification']
             }
         }
+        self._rule_types = {
+            t['type'] for t in self.rule_templates.values()
+        }
 
     def generate_rule(
             self,
@@ -41,7 +57,7 @@ class RuleGenerator:
 
             template = self.rule_templates[rule_type]
             rule = {
-                'id': f"rule_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                'id': None,
                 'type': template['type'],
                 'created_at': datetime.now().isoformat(),
                 'conditions': {},
@@ -58,8 +74,10 @@ class RuleGenerator:
             if risk_score < 0.3:
                 rule['action'] = 'allow'
             elif risk_score < 0.7:
-                rule['action'] = template['actions'][-1]  # Use strictest non-deny action
+                # Use strictest non-deny action
+                rule['action'] = template['actions'][-1]
 
+            rule['id'] = rule_id(rule)
             return rule
 
         except Exception as e:
@@ -76,11 +94,188 @@ class RuleGenerator:
             if not rule['conditions']:
                 return False
 
-            if rule['type'] not in {t['type'] for t in self.rule_templates.values()}:
+            if rule['type'] not in self._rule_types:
                 return False
 
             return True
 
         except Exception as e:
             logger.error(f"Rule validation error: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def validate_rules(self, rules: Iterable[Dict]) -> List[Dict]:
+        """Return the rules that pass ``validate_rule``."""
+        return [rule for rule in rules if self.validate_rule(rule)]
+
+    def mine_rules(
+            self,
+            tracker: DataTracker,
+            min_support: int = 100,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            chunk_size: int = READ_CHUNK_SIZE
+    ) -> List[Dict]:
+        """Mine location-based rules from the whole access log at once.
+
+        The log is read in a single streaming pass. Events are grouped by
+        (data_type, action, location) with NumPy aggregation per chunk,
+        counting events, failures and distinct users, so memory grows with
+        the number of groups rather than events. Every group seen at least
+        ``min_support`` times becomes a candidate rule whose action follows
+        ``generate_rule``'s risk thresholds, with the failure rate as the
+        risk score. Candidates are validated in bulk, deduplicated by
+        content-hash id and added to ``self.rules``.
+        """
+        try:
+            stats = _GroupStats()
+            for _, rows in tracker.iter_chunks(chunk_size, start, end):
+                stats.add_chunk(rows)
+
+            created_at = datetime.now().isoformat()
+            candidates = []
+            for group, count, failures, users in stats.groups():
+                if count < min_support:
+                    continue
+                data_type, action, location = group
+                if location == UNKNOWN_LOCATION:
+                    continue
+                rule = self.generate_rule(
+                    {
+                        'location': [location],
+                        'risk_score': failures / count
+                    },
+                    'location_based'
+                )
+                if rule is None:
+                    continue
+                rule.update({
+                    'data_type': data_type,
+                    'request_action': action,
+                    'created_at': created_at,
+                    'support': count,
+                    'users': users,
+                    'risk_score': round(failures / count, 4)
+                })
+                rule['id'] = rule_id(rule)
+                candidates.append(rule)
+
+            mined = {
+                rule['id']: rule for rule in self.validate_rules(candidates)
+            }
+            self.rules.update(mined)
+            logger.info(
+                f"Mined {len(mined)} rules from {stats.events} events in "
+                f"{len(stats.group_codes)} groups"
+            )
+            return list(mined.values())
+
+        except Exception as e:
+            logger.error(f"Rule mining error: {e}")
+            return []
+
+
+class _GroupStats:
+    """Streaming per-group event, failure and distinct-user counts."""
+
+    def __init__(self):
+        self.group_codes: Dict[Tuple[str, str, str], int] = {}
+        self.user_codes: Dict[str, int] = {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.failures = np.zeros(0, dtype=np.int64)
+        self.user_pairs = np.zeros(0, dtype=np.int64)
+        self.events = 0
+        self._locations: Dict[str, str] = {}
+        self._pending_pairs: List[np.ndarray] = []
+        self._pending_size = 0
+
+    def add_chunk(self, rows: List[Tuple]):
+        n_rows = len(rows)
+        groups = np.empty(n_rows, dtype=np.int64)
+        users = np.empty(n_rows, dtype=np.int64)
+        successes = np.empty(n_rows, dtype=np.int64)
+
+        group_codes = self.group_codes
+        user_codes = self.user_codes
+        for i, row in enumerate(rows):
+            _, user_id, data_type, action, success, context = row
+            key = (data_type, action, self._location(context))
+            code = group_codes.get(key)
+            if code is None:
+                code = group_codes[key] = len(group_codes)
+            groups[i] = code
+
+            code = user_codes.get(user_id)
+            if code is None:
+                code = user_codes[user_id] = len(user_codes)
+            users[i] = code
+            successes[i] = success
+
+        n_groups = len(group_codes)
+        self.counts = _grow(self.counts, n_groups)
+        self.failures = _grow(self.failures, n_groups)
+        self.counts += np.bincount(groups, minlength=n_groups)
+        self.failures += np.bincount(
+            groups, weights=1 - successes, minlength=n_groups
+        ).astype(np.int64)
+        pairs = np.unique(groups << 32 | users)
+        self._pending_pairs.append(pairs)
+        self._pending_size += len(pairs)
+        # Merge into the sorted set only once the buffer rivals it in size
+        if self._pending_size >= max(len(self.user_pairs), 1 << 20):
+            self._merge_pairs()
+        self.events += n_rows
+
+    def _merge_pairs(self):
+        if self._pending_pairs:
+            self.user_pairs = np.unique(
+                np.concatenate([self.user_pairs] + self._pending_pairs)
+            )
+            self._pending_pairs = []
+            self._pending_size = 0
+
+    def groups(self):
+        """Yield (group, count, failures, distinct users) for each group."""
+        self._merge_pairs()
+        users = np.bincount(
+            self.user_pairs >> 32, minlength=len(self.group_codes)
+        )
+        for group, code in self.group_codes.items():
+            yield (
+                group,
+                int(self.counts[code]),
+                int(self.failures[code]),
+                int(users[code])
+            )
+
+    def _location(self, context: Optional[str]) -> str:
+        """Location from a raw context JSON string, cached per string."""
+        location = self._locations.get(context)
+        if location is None:
+            try:
+                value = (
+                    json.loads(context).get('location') if context else None
+                )
+            except (ValueError, AttributeError):
+                value = None
+            location = value if isinstance(value, str) else UNKNOWN_LOCATION
+            if len(self._locations) >= LOCATION_CACHE_SIZE:
+                self._locations.clear()
+            self._locations[context] = location
+        return location
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Zero-pad a counts array to ``size`` entries."""
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.zeros(size - len(array), array.dtype)])
+
+
+def rule_id(rule: Dict) -> str:
+    """Content-hash id of a rule, independent of when it was created."""
+    content = {
+        key: rule.get(key)
+        for key in ('type', 'data_type', 'request_action', 'conditions',
+                    'action')
+    }
+    return f"rule_{hash_data(content)[:16]}"
\ No newline at end of file
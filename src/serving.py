@@ -0,0 +1,283 @@
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from .policy_manager import PolicyManager
+from .context_handler import ContextHandler, split_on_context_changes
+from .context_store import ContextStore
+from .ml_engine import MLEngine
+from .enforcer import PolicyEnforcer
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Sequence number and payload length, ahead of the pickled payload
+HEADER = struct.Struct('<QQ')
+
+
+class SharedSnapshot:
+    """Pickled object published through a shared memory block.
+
+    Writers bump a sequence number to an odd value while writing and to the
+    next even value when done (a seqlock), so readers in other processes
+    never see a torn payload and can cheaply check whether anything changed.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+
+    @classmethod
+    def create(cls, capacity: int) -> 'SharedSnapshot':
+        """Allocate a new block able to hold ``capacity`` payload bytes."""
+        shm = shared_memory.SharedMemory(
+            create=True, size=HEADER.size + capacity
+        )
+        HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedSnapshot':
+        """Open a block created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def sequence(self) -> int:
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def publish(self, obj: Any) -> int:
+        """Write a new version of the snapshot and return its sequence."""
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        if HEADER.size + len(payload) > self.shm.size:
+            raise ValueError(
+                f"Snapshot of {len(payload)} bytes exceeds shared block"
+            )
+
+        buf = self.shm.buf
+        sequence = self.sequence
+        HEADER.pack_into(buf, 0, sequence + 1, 0)
+        buf[HEADER.size:HEADER.size + len(payload)] = payload
+        HEADER.pack_into(buf, 0, sequence + 2, len(payload))
+        return sequence + 2
+
+    def read(self) -> Tuple[int, Any]:
+        """Return a consistent (sequence, object) pair."""
+        buf = self.shm.buf
+        while True:
+            sequence, length = HEADER.unpack_from(buf, 0)
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            payload = bytes(buf[HEADER.size:HEADER.size + length])
+            if HEADER.unpack_from(buf, 0)[0] == sequence:
+                return sequence, (pickle.loads(payload) if length else None)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class _Worker:
+    """Per-process enforcement state.
+
+    Policies are synced from the shared snapshot; contexts arrive with each
+    batch as the parent's records for the users in it, so the context store
+    is only a cache and is bounded to ``context_capacity`` users.
+    """
+
+    def __init__(
+            self,
+            model_path: str,
+            policy_name: str,
+            context_capacity: int
+    ):
+        self.policy_snapshot = SharedSnapshot.attach(policy_name)
+        self.policy_sequence = -1
+
+        self.policy_manager = PolicyManager()
+        self.context_handler = ContextHandler(
+            ContextStore(max_users=context_capacity)
+        )
+        self.ml_engine = MLEngine()
+        self.ml_engine.load_model(model_path, mmap_mode='r')
+        self.enforcer = PolicyEnforcer(
+            self.policy_manager,
+            self.context_handler,
+            self.ml_engine
+        )
+
+    def sync(self):
+        """Reload policies if a newer snapshot was published."""
+        if self.policy_snapshot.sequence != self.policy_sequence:
+            self.policy_sequence, policies = self.policy_snapshot.read()
+            self.policy_manager.replace_policies(policies or {})
+
+    def check_access_batch(
+            self,
+            records: Dict[str, Tuple[Dict, int, int]],
+            requests: List[Dict]
+    ) -> List[Dict]:
+        self.sync()
+        self.context_handler.apply_records(records)
+        return self.enforcer.check_access_batch(requests)
+
+
+_worker: Optional[_Worker] = None
+
+
+def _init_worker(model_path: str, policy_name: str, context_capacity: int):
+    global _worker
+    _worker = _Worker(model_path, policy_name, context_capacity)
+
+
+def _run_batch(
+        records: Dict[str, Tuple[Dict, int, int]],
+        requests: List[Dict]
+) -> List[Dict]:
+    return _worker.check_access_batch(records, requests)
+
+
+class ProcessPoolEngine:
+    """Serves access checks from a pool of worker processes.
+
+    The model is compiled to a ``CompiledForest`` and saved once without
+    the sklearn estimator, and every worker memory-maps its arrays
+    read-only, so the forest is in memory once however many workers run.
+    Policies are published through a shared memory snapshot that workers
+    reload when it changes. Requests are split into batches of
+    ``batch_size`` and each batch is scored with one vectorised model call
+    in a worker.
+
+    A ``context`` sent with a request is applied to ``engine.context_handler``
+    before dispatch, in request order as ``PrivacyEngine.check_access_batch``
+    does. Each batch then carries the current context records of its users,
+    so workers never need the whole context store and results do not depend
+    on which worker handles a request.
+    """
+
+    def __init__(
+            self,
+            engine,
+            workers: Optional[int] = None,
+            batch_size: int = 256,
+            snapshot_capacity: int = 64 * 1024 * 1024,
+            start_method: str = 'spawn',
+            worker_context_capacity: int = 100000
+    ):
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.snapshot_capacity = snapshot_capacity
+        self.start_method = start_method
+        self.worker_context_capacity = worker_context_capacity
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._model_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._policies: Optional[SharedSnapshot] = None
+        self._policy_version = -1
+        self._publish_lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Save the model, publish snapshots and start the workers."""
+        try:
+            self._model_dir = tempfile.TemporaryDirectory(prefix='ppee_')
+            model_path = os.path.join(self._model_dir.name, 'model.joblib')
+            ml_engine = self.engine.ml_engine
+            if ml_engine.model is not None and ml_engine.compiled is None:
+                if not ml_engine.compile():
+                    raise RuntimeError("could not compile model for workers")
+            if not ml_engine.save_model(model_path, include_estimator=False):
+                raise RuntimeError("could not save model for workers")
+
+            self._policies = SharedSnapshot.create(self.snapshot_capacity)
+            self.publish()
+
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(
+                    model_path,
+                    self._policies.name,
+                    self.worker_context_capacity
+                )
+            )
+            logger.info(f"Started {self.workers} enforcement workers")
+            return True
+        except Exception as e:
+            logger.error(f"Worker pool start error: {e}")
+            self.stop()
+            return False
+
+    def publish(self):
+        """Publish the policy set if it changed since the last call."""
+        with self._publish_lock:
+            generation = self.engine.policy_manager.generation
+            if generation.version != self._policy_version:
+                self._policies.publish(dict(generation.active))
+                self._policy_version = generation.version
+
+    def check_access_batch(self, requests: List[Dict]) -> List[Dict]:
+        """Check requests across the worker pool, preserving order."""
+        try:
+            if self._pool is None:
+                raise RuntimeError("worker pool is not running")
+
+            self.publish()
+            context_handler = self.engine.context_handler
+            futures = []
+            for part in split_on_context_changes(requests):
+                for request in part:
+                    if request.get('context'):
+                        context_handler.update_context(
+                            request['user_id'], request['context']
+                        )
+                for i in range(0, len(part), self.batch_size):
+                    batch = part[i:i + self.batch_size]
+                    records = context_handler.export_records(
+                        request['user_id'] for request in batch
+                    )
+                    futures.append(
+                        self._pool.submit(_run_batch, records, batch)
+                    )
+
+            results: List[Dict] = []
+            for future in futures:
+                results.extend(future.result())
+            return results
+        except Exception as e:
+            logger.error(f"Pooled access check error: {e}")
+            return [
+                {'allowed': False, 'reason': 'System error'}
+                for _ in requests
+            ]
+
+    def stop(self):
+        """Shut down workers and release shared resources."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._policies is not None:
+            self._policies.close()
+            self._policies = None
+        if self._model_dir is not None:
+            self._model_dir.cleanup()
+            self._model_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -1,16 +1,36 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence
 from datetime import datetime
 import json
+import time
+import numpy as np
+from .context_store import ContextRecord, ContextStore, compact_context
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+LOCATION_CHANGE = 1
+NEW_DEVICE = 2
+VPN_USAGE = 4
+UNUSUAL_TIME = 8
+
+MASK_LIMIT = 16
+
+MAX_FAILED_ATTEMPTS_RISK = 0.8
 
-class UserContext:
-    """Manages and evaluates user context information."""
 
-    def __init__(self):
-        self.contexts: Dict[str, Dict] = {}
+class UserContext:
+    """Manages and evaluates user context information.
+
+    Location, device and VPN checks are done once when the context is
+    written and stored as a bitmask. Only the time-of-day bit is added per
+    request, and the score for every mask comes from a table built from
+    ``risk_factors``. Failed attempts can take any count, so their share,
+    ``min(failed_attempts * factor, MAX_FAILED_ATTEMPTS_RISK)``, is added
+    to the table score per request.
+    """
+
+    def __init__(self, store: Optional[ContextStore] = None):
+        self.store = store if store is not None else ContextStore()
         self.risk_factors = {
             'location_change': 0.3,
             'unusual_time': 0.4,
@@ -18,6 +38,26 @@ class UserContext:
             'vpn_usage': 0.2,
             'failed_attempts': 0.6
         }
+        self.rebuild_risk_table()
+
+    def rebuild_risk_table(self):
+        """Precompute the score of every risk mask from ``risk_factors``."""
+        factors = self.risk_factors
+        table: List[float] = []
+        for mask in range(MASK_LIMIT):
+            risk_score = 0.0
+            if mask & LOCATION_CHANGE:
+                risk_score += factors['location_change']
+            if mask & UNUSUAL_TIME:
+                risk_score += factors['unusual_time']
+            if mask & NEW_DEVICE:
+                risk_score += factors['new_device']
+            if mask & VPN_USAGE:
+                risk_score += factors['vpn_usage']
+            table.append(min(risk_score, 1.0))
+
+        self._risk_table = table
+        self._risk_array = np.array(table + [1.0], dtype=np.float64)
 
     def update_context(
             self,
@@ -26,14 +66,18 @@ class UserContext:
     ) -> bool:
         """Update user's context."""
         try:
-            old_context = self.contexts.get(user_id, {})
-
-            self.contexts[user_id] = {
-                **context_data,
-                'last_updated': datetime.now().isoformat(),
-                'previous_location': old_context.get('location'),
-                'previous_device': old_context.get('device')
-            }
+            old_record = self.store.get(user_id)
+            old_context = old_record.context if old_record else {}
+
+            context = compact_context(context_data)
+            context['last_updated'] = int(time.time())
+            context['previous_location'] = old_context.get('location')
+            context['previous_device'] = old_context.get('device')
+            self.store.put(user_id, ContextRecord(
+                context,
+                old_record.version + 1 if old_record else 1,
+                self._risk_mask(context)
+            ))
 
             return True
         except Exception as e:
@@ -43,41 +87,80 @@ class UserContext:
     def evaluate_risk(self, user_id: str) -> float:
         """Evaluate risk based on user's context."""
         try:
-            context = self.contexts.get(user_id)
-            if not context:
+            record = self.store.get(user_id)
+            if record is None:
                 return 1.0
-
-            risk_score = 0.0
-
-            # Check location change
-            if (context.get('previous_location') and
-                    context.get('location') != context['previous_location']):
-                risk_score += self.risk_factors['location_change']
-
-            # Check time
-            current_hour = datetime.now().hour
-            if current_hour < 6 or current_hour > 22:  # Outside business hours
-                risk_score += self.risk_factors['unusual_time']
-
-            # Check device
-            if (context.get('previous_device') and
-                    context.get('device') != context['previous_device']):
-                risk_score += self.risk_factors['new_device']
-
-            # Check VPN
-            if context.get('vpn_enabled'):
-                risk_score += self.risk_factors['vpn_usage']
-
-            # Check failed attempts
-            failed_attempts = context.get('failed_attempts', 0)
-            if failed_attempts > 0:
-                risk_score += min(
-                    self.risk_factors['failed_attempts'] * failed_attempts,
-                    0.8
-                )
-
-            return min(risk_score, 1.0)
+            risk_score = self._risk_table[record.risk_mask | self._time_bit()]
+            failed_risk = self._failed_attempts_risk(record.context)
+            if failed_risk:
+                return min(risk_score + failed_risk, 1.0)
+            return risk_score
 
         except Exception as e:
             logger.error(f"Risk evaluation error: {e}")
-            return 1.0
\ No newline at end of file
+            return 1.0
+
+    def evaluate_risk_batch(self, user_ids: Sequence[str]) -> np.ndarray:
+        """Evaluate risk for many users with one vectorised lookup."""
+        try:
+            time_bit = self._time_bit()
+            records = [self.store.get(user_id) for user_id in user_ids]
+            masks = np.fromiter(
+                (
+                    MASK_LIMIT if record is None
+                    else record.risk_mask | time_bit
+                    for record in records
+                ),
+                dtype=np.intp,
+                count=len(records)
+            )
+            failed = np.fromiter(
+                (
+                    self._failed_attempts_risk(record.context)
+                    if record is not None else 0.0
+                    for record in records
+                ),
+                dtype=np.float64,
+                count=len(records)
+            )
+            return np.minimum(self._risk_array[masks] + failed, 1.0)
+        except Exception as e:
+            logger.error(f"Batch risk evaluation error: {e}")
+            return np.full(len(user_ids), 1.0)
+
+    def _failed_attempts_risk(self, context: Dict) -> float:
+        failed_attempts = context.get('failed_attempts', 0)
+        if failed_attempts > 0:
+            return min(
+                self.risk_factors['failed_attempts'] * failed_attempts,
+                MAX_FAILED_ATTEMPTS_RISK
+            )
+        return 0.0
+
+    @staticmethod
+    def _time_bit() -> int:
+        current_hour = datetime.now().hour
+        if current_hour < 6 or current_hour > 22:  # Outside business hours
+            return UNUSUAL_TIME
+        return 0
+
+    @staticmethod
+    def _risk_mask(context: Dict) -> int:
+        """Encode the context-only risk checks as a bitmask."""
+        mask = 0
+
+        # Check location change
+        if (context.get('previous_location') and
+                context.get('location') != context['previous_location']):
+            mask |= LOCATION_CHANGE
+
+        # Check device
+        if (context.get('previous_device') and
+                context.get('device') != context['previous_device']):
+            mask |= NEW_DEVICE
+
+        # Check VPN
+        if context.get('vpn_enabled'):
+            mask |= VPN_USAGE
+
+        return mask
@@ -3,6 +3,7 @@ import hashlib
 import json
 from pathlib import Path
 import time
+from datetime import datetime
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -78,4 +79,15 @@ def sanitize_value(value: Any) -> Any:
         return sanitize_input(value)
     elif isinstance(value, list):
         return [sanitize_value(v) for v in value]
-    return value
\ No newline at end of file
+    return value
+
+def epoch_us(dt: Optional[datetime] = None) -> int:
+    """Convert a datetime (default now) to integer epoch microseconds."""
+    if dt is None:
+        return time.time_ns() // 1000
+    return round(dt.timestamp() * 1_000_000)
+
+def from_epoch_us(value: int) -> datetime:
+    """Convert integer epoch microseconds to a local datetime."""
+    seconds, micros = divmod(value, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros)
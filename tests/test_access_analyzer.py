@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+from src.access_analyzer import AccessAnalyzer
+
+
+def test_idle_users_are_swept_when_the_window_moves(monkeypatch):
+    now = [datetime(2024, 1, 10, 12).timestamp()]
+    monkeypatch.setattr('src.access_analyzer.time.time', lambda: now[0])
+    analyzer = AccessAnalyzer(
+        lookback_days=1, bucket_seconds=3600, keep_history=False
+    )
+    start = datetime.fromtimestamp(now[0])
+    for i in range(100):
+        analyzer.track_access(f'user{i}', 'customer_data', 'read', start)
+    assert len(analyzer.windows) == 100
+
+    now[0] += 2 * 86400
+    analyzer.track_access(
+        'active', 'customer_data', 'read', start + timedelta(days=2)
+    )
+    assert list(analyzer.windows) == ['active']
+    assert analyzer.analyze_patterns('active')['access_frequency'] == 1
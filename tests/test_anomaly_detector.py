@@ -0,0 +1,75 @@
+import pytest
+from src.anomaly_detector import HIGH_ACCESS_RATE, AnomalyDetector
+from src.context_handler import ContextHandler
+
+# Long past, as when replaying an old access log
+START = 1_000_000.0
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def wall_clock(monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr('src.anomaly_detector.time.time', lambda: now[0])
+    return now
+
+
+def flood(detector, user_id, start, events=50):
+    for i in range(events):
+        detector.observe(user_id, 'customer_data', start + i * 0.1)
+
+
+def test_replayed_flags_last_flag_ttl_then_expire_on_a_quiet_stream(
+        wall_clock):
+    changed = []
+    detector = AnomalyDetector(
+        width=1024, rate_threshold=20, flag_ttl=300, on_change=changed.append
+    )
+    flood(detector, 'alice', START)
+    assert HIGH_ACCESS_RATE in detector.flags('alice')
+
+    wall_clock[0] += 200
+    assert HIGH_ACCESS_RATE in detector.flags('alice')
+    assert detector.expire() == 0
+
+    changed.clear()
+    wall_clock[0] += 200
+    assert detector.flags('alice') == ()
+    assert detector.expire() == 1
+    assert changed == ['alice']
+
+
+def test_on_change_fires_on_raise_and_clear(wall_clock):
+    changed = []
+    detector = AnomalyDetector(
+        width=1024, rate_threshold=20, spike_factor=1e9,
+        on_change=changed.append
+    )
+    flood(detector, 'alice', NOW)
+    assert changed == ['alice']
+
+    # Long enough for the short-term rate to decay below the threshold
+    wall_clock[0] += 3600
+    detector.observe('alice', 'customer_data', NOW + 3600)
+    assert detector.flags('alice') == ()
+    assert changed == ['alice', 'alice']
+
+
+def test_expired_flag_re_versions_the_context(wall_clock):
+    changed = []
+    detector = AnomalyDetector(
+        width=1024, rate_threshold=20, flag_ttl=300, on_change=changed.append
+    )
+    handler = ContextHandler(anomaly_detector=detector)
+    handler.update_context('alice', {'location': 'office'})
+    version = handler.get_version('alice')
+
+    flood(detector, 'alice', NOW)
+    assert changed and set(changed) == {'alice'}
+    flagged_version = handler.get_version('alice')
+    assert flagged_version > version
+    assert handler.evaluate_risk('alice', 'read') > 0
+
+    wall_clock[0] += 600
+    assert handler.get_version('alice') > flagged_version
+    assert handler.evaluate_risk('alice', 'read') == 0
@@ -0,0 +1,70 @@
+import asyncio
+from src.async_engine import AsyncPrivacyEngine
+from tests.test_batch import make_engine, request
+
+SEQUENCE = [
+    request('alice', 'office'),
+    request('alice'),
+    request('alice', 'home'),
+    request('alice'),
+    request('alice', 'office'),
+    request('bob', 'home')
+]
+
+
+def check(engine, r):
+    return engine.check_access(
+        r['user_id'], r['data_type'], r['action'], r['context']
+    )
+
+
+def test_concurrent_calls_match_separate_calls():
+    single = make_engine()
+    expected = [check(single, r)['allowed'] for r in SEQUENCE]
+
+    async def run():
+        async with AsyncPrivacyEngine(make_engine(), window=0.05) as engine:
+            results = await asyncio.gather(
+                *(check(engine, r) for r in SEQUENCE)
+            )
+            assert engine._inflight == {}
+            assert engine._inflight_by_user == {}
+            return [result['allowed'] for result in results], engine.batches
+
+    allowed, batches = asyncio.run(run())
+    assert expected == [True, True, False, False, True, False]
+    assert allowed == expected
+    # Everything arrived within one window
+    assert batches == 1
+
+
+def test_new_context_stops_coalescing_for_that_user_only():
+    def submit(engine, r):
+        return asyncio.ensure_future(check(engine, r))
+
+    async def run():
+        async with AsyncPrivacyEngine(make_engine(), window=0.05) as engine:
+            calls = [
+                submit(engine, request('alice')),
+                submit(engine, request('bob')),
+            ]
+            await asyncio.sleep(0)
+            assert set(engine._inflight_by_user) == {'alice', 'bob'}
+
+            calls.append(submit(engine, request('alice', 'home')))
+            await asyncio.sleep(0)
+            assert engine._inflight_by_user['alice'] == {
+                engine._request_key(
+                    'alice', 'customer_data', 'read', {'location': 'home'}
+                )
+            }
+
+            # bob's check is still shared, alice's old one is not
+            calls += [
+                submit(engine, request('bob')),
+                submit(engine, request('alice'))
+            ]
+            await asyncio.gather(*calls)
+            return engine.coalesced
+
+    assert asyncio.run(run()) == 1
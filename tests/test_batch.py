@@ -0,0 +1,51 @@
+from src.main import PrivacyEngine
+
+LOCATION_POLICY = {
+    'data_types': ['customer_data'],
+    'actions': ['read'],
+    'rules': [
+        {'data_type': 'customer_data', 'action': 'allow',
+         'conditions': {'location': 'office'}},
+        {'data_type': 'customer_data', 'action': 'deny',
+         'conditions': {'location': 'home'}}
+    ]
+}
+
+
+def make_engine():
+    engine = PrivacyEngine()
+    engine.policy_manager.add_policy('location', LOCATION_POLICY)
+    return engine
+
+
+def request(user_id, location=None):
+    return {
+        'user_id': user_id,
+        'data_type': 'customer_data',
+        'action': 'read',
+        'context': {'location': location} if location else None
+    }
+
+
+def test_batch_applies_each_context_before_its_own_check():
+    requests = [
+        request('alice', 'office'),
+        request('bob', 'home'),
+        request('alice', 'home'),
+        request('alice'),
+        request('bob', 'office')
+    ]
+
+    single = make_engine()
+    expected = [
+        single.check_access(r['user_id'], r['data_type'], r['action'],
+                            r['context'])['allowed']
+        for r in requests
+    ]
+    batched = [
+        result['allowed']
+        for result in make_engine().check_access_batch(requests)
+    ]
+
+    assert expected == [True, False, False, False, True]
+    assert batched == expected
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from src.compiled_forest import CompiledForest
+
+
+def fitted_forest(n_rows, seed=0, **params):
+    rng = np.random.default_rng(seed)
+    X = rng.random((n_rows, 6))
+    y = (X[:, 0] + 0.3 * X[:, 1] > 0.6).astype(int)
+    model = RandomForestClassifier(random_state=seed, **params).fit(X, y)
+    return model, rng.random((200, 6))
+
+
+@pytest.mark.parametrize('n_rows, params', [
+    (400, {'n_estimators': 20, 'max_depth': 6}),
+    # Grown to pure, single-class leaves
+    (400, {'n_estimators': 20}),
+    # Bootstrap samples of a few rows leave trees that saw one class
+    (20, {'n_estimators': 30, 'max_samples': 3})
+], ids=['shallow', 'pure_leaves', 'single_class_trees'])
+def test_predict_proba_matches_sklearn(n_rows, params):
+    model, X = fitted_forest(n_rows, **params)
+    compiled = CompiledForest.from_sklearn(model)
+    expected = model.predict_proba(X)[:, 1]
+
+    np.testing.assert_allclose(compiled.predict_proba(X), expected)
+    for row, value in zip(X[:20], expected):
+        np.testing.assert_allclose(
+            compiled.predict_proba(row[None, :]), [value]
+        )
@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import pytest
+import src.data_tracker as data_tracker
+from src.data_tracker import DataTracker, SCHEMA_VERSION
+from src.utils import epoch_us
+
+DAY_ONE = datetime(2024, 3, 1, 9, 30)
+DAY_TWO = datetime(2024, 3, 2, 14, 0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Pin ``datetime.now()`` inside ``src.data_tracker``."""
+    current = {'now': DAY_ONE}
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return current['now']
+
+    monkeypatch.setattr(data_tracker, 'datetime', FrozenDatetime)
+    return current
+
+
+def tables(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(
+            name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+                " AND name LIKE 'access_logs%'"
+            )
+        )
+
+
+def legacy_db(db_path, rows):
+    """Create a database with the original TEXT-timestamp schema."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE access_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                user_id TEXT,
+                data_type TEXT,
+                action TEXT,
+                success INTEGER,
+                context TEXT
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO access_logs
+            (timestamp, user_id, data_type, action, success, context)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def test_migrates_legacy_iso_timestamps_to_epoch(tmp_path):
+    db_path = str(tmp_path / 'access.db')
+    legacy_db(db_path, [
+        (DAY_ONE.isoformat(), 'alice', 'customer_data', 'read', 1,
+         '{"location": "office"}'),
+        (DAY_TWO.isoformat(), 'alice', 'customer_data', 'write', 0, '{}'),
+    ])
+
+    tracker = DataTracker(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == (
+            SCHEMA_VERSION
+        )
+        assert conn.execute(
+            "SELECT id, timestamp, typeof(timestamp) FROM access_logs"
+        ).fetchall() == [
+            (1, epoch_us(DAY_ONE), 'integer'),
+            (2, epoch_us(DAY_TWO), 'integer'),
+        ]
+    assert tables(db_path) == ['access_logs']
+
+    events = list(tracker.iter_events())
+    assert events[0] == (
+        epoch_us(DAY_ONE), 'alice', 'customer_data', 'read', 1,
+        '{"location": "office"}'
+    )
+    history = tracker.get_user_history('alice')
+    assert [event['timestamp'] for event in history] == [
+        DAY_TWO.isoformat(), DAY_ONE.isoformat()
+    ]
+    assert history[1]['context'] == {'location': 'office'}
+
+    # Reopening an already migrated database leaves it alone
+    assert len(list(DataTracker(db_path).iter_events())) == 2
+
+
+def test_day_partitions_route_by_event_time(tmp_path, clock):
+    db_path = str(tmp_path / 'access.db')
+    tracker = DataTracker(db_path, partition='day')
+
+    tracker.log_access('alice', 'customer_data', 'read', True, {})
+    clock['now'] = DAY_TWO
+    tracker.log_access('alice', 'customer_data', 'write', True, {})
+    tracker.log_access('bob', 'customer_data', 'read', False, {})
+
+    assert tables(db_path) == [
+        'access_logs', 'access_logs_20240301', 'access_logs_20240302'
+    ]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute(
+            "SELECT count(*) FROM access_logs_20240302"
+        ).fetchone()[0] == 2
+        assert conn.execute(
+            "SELECT count(*) FROM access_logs"
+        ).fetchone()[0] == 0
+
+
+def test_history_is_newest_first_across_partitions(tmp_path, clock):
+    db_path = str(tmp_path / 'access.db')
+    legacy_db(db_path, [
+        ((DAY_ONE - timedelta(days=1)).isoformat(), 'alice', 'customer_data',
+         'legacy', 1, '{}'),
+    ])
+    tracker = DataTracker(db_path, partition='day')
+
+    tracker.log_access('alice', 'customer_data', 'first', True, {})
+    clock['now'] = DAY_TWO
+    tracker.log_access('alice', 'customer_data', 'second', True, {})
+    clock['now'] = DAY_TWO + timedelta(hours=1)
+    tracker.log_access('alice', 'customer_data', 'third', True, {})
+
+    actions = [event['action'] for event in tracker.get_user_history('alice')]
+    assert actions == ['third', 'second', 'first', 'legacy']
+    limited = tracker.get_user_history('alice', limit=3)
+    assert [event['action'] for event in limited] == [
+        'third', 'second', 'first'
+    ]
+
+
+def test_prune_drops_old_partitions_and_base_rows(tmp_path, clock):
+    db_path = str(tmp_path / 'access.db')
+    legacy_db(db_path, [
+        ((DAY_ONE - timedelta(days=30)).isoformat(), 'alice',
+         'customer_data', 'old', 1, '{}'),
+        (DAY_TWO.isoformat(), 'alice', 'customer_data', 'recent', 1, '{}'),
+    ])
+    tracker = DataTracker(db_path, partition='day')
+    tracker.log_access('alice', 'customer_data', 'read', True, {})
+    clock['now'] = DAY_TWO
+    tracker.log_access('alice', 'customer_data', 'read', True, {})
+
+    clock['now'] = DAY_TWO + timedelta(days=1)
+    result = tracker.prune(retention_days=1)
+
+    assert result == {'partitions_dropped': 1, 'rows_deleted': 1}
+    assert tables(db_path) == ['access_logs', 'access_logs_20240302']
+    actions = [event['action'] for event in tracker.get_user_history('alice')]
+    assert actions == ['read', 'recent']
+
+    # A dropped partition is recreated if an event for it arrives again
+    clock['now'] = DAY_ONE
+    assert tracker.log_access('alice', 'customer_data', 'late', True, {})
+    assert 'access_logs_20240301' in tables(db_path)
+
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT count(*) FROM access_logs").fetchone()[0]
+
+
+def test_async_writes_are_visible_after_flush(tmp_path):
+    db_path = str(tmp_path / 'access.db')
+    tracker = DataTracker(db_path, async_writes=True, flush_interval=60)
+
+    for i in range(5):
+        tracker.log_access(f'user{i}', 'customer_data', 'read', True, {})
+    assert count_rows(db_path) == 0
+    tracker.flush()
+
+    assert count_rows(db_path) == 5
+    assert tracker.get_user_history('user3')[0]['action'] == 'read'
+    tracker.close()
+
+
+def test_full_queue_drops_and_counts_events(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'access.db')
+    tracker = DataTracker(
+        db_path, async_writes=True, flush_size=1, queue_size=1,
+        put_timeout=0.01
+    )
+    writing = threading.Event()
+    release = threading.Event()
+    write_batch = tracker._write_batch
+
+    def blocked_write(conn, batch):
+        writing.set()
+        release.wait()
+        write_batch(conn, batch)
+
+    monkeypatch.setattr(tracker, '_write_batch', blocked_write)
+
+    # The writer holds the first event, the second fills the queue
+    assert tracker.log_access('alice', 'customer_data', 'read', True, {})
+    assert writing.wait(timeout=5)
+    assert tracker.log_access('alice', 'customer_data', 'read', True, {})
+    assert not tracker.log_access('alice', 'customer_data', 'read', True, {})
+    assert tracker.dropped_events == 1
+
+    release.set()
+    tracker.close()
+    assert count_rows(db_path) == 2
+
+
+def test_close_drains_pending_events_and_rejects_later_writes(tmp_path):
+    db_path = str(tmp_path / 'access.db')
+    tracker = DataTracker(
+        db_path, async_writes=True, flush_size=1000, flush_interval=60
+    )
+    for i in range(50):
+        tracker.log_access('alice', 'customer_data', 'read', True, {'i': i})
+
+    tracker.close()
+
+    assert count_rows(db_path) == 50
+    assert not tracker._writer.is_alive()
+    assert not tracker.log_access('alice', 'customer_data', 'read', True, {})
+    assert count_rows(db_path) == 50
+    assert tracker.dropped_events == 0
@@ -0,0 +1,58 @@
+import pytest
+from sklearn.dummy import DummyClassifier
+from src.main import PrivacyEngine
+from tests.test_batch import LOCATION_POLICY
+
+OTHER_POLICY = {
+    'data_types': ['billing_data'],
+    'actions': ['read'],
+    'rules': [{'data_type': 'billing_data', 'action': 'deny',
+               'conditions': {'location': 'home'}}]
+}
+
+
+@pytest.fixture
+def engine():
+    engine = PrivacyEngine(cache_size=100)
+    engine.policy_manager.add_policy('location', LOCATION_POLICY)
+    engine.policy_manager.add_policy('other', OTHER_POLICY)
+    engine.context_handler.update_context('alice', {'location': 'office'})
+    return engine
+
+
+def check(engine):
+    """Check alice's read and report whether the cache answered it."""
+    cache = engine.enforcer.cache
+    hits = cache.hits
+    result = engine.check_access('alice', 'customer_data', 'read')
+    assert result['allowed']
+    return cache.hits > hits
+
+
+def test_repeated_check_hits(engine):
+    assert not check(engine)
+    assert check(engine)
+
+
+def test_identical_context_update_keeps_the_hit(engine):
+    check(engine)
+    engine.context_handler.update_context('alice', {'location': 'office'})
+    assert check(engine)
+
+
+@pytest.mark.parametrize('change', [
+    lambda e: e.context_handler.update_context(
+        'alice', {'location': 'office', 'device': 'laptop'}
+    ),
+    lambda e: e.policy_manager.add_policy('new', OTHER_POLICY),
+    lambda e: e.policy_manager.deactivate_policy('other'),
+    lambda e: e.ml_engine.swap_model(
+        DummyClassifier().fit([[0], [1]], [0, 1])
+    )
+], ids=['context', 'add_policy', 'deactivate_policy', 'model_swap'])
+def test_changed_input_forces_a_miss(engine, change):
+    check(engine)
+    assert check(engine)
+    assert change(engine)
+    assert not check(engine)
+    assert check(engine)
@@ -0,0 +1,29 @@
+from src.event_store import EventStore
+
+
+def test_trim_forgets_values_only_seen_in_dropped_chunks():
+    store = EventStore(chunk_size=4)
+    for i in range(4):
+        store.append(f'old{i}', 'archive', 'read', i)
+    for i in range(4):
+        store.append(f'user{i % 2}', 'customer_data', 'write', 100 + i)
+    store.append('user1', 'customer_data', 'read', 200)
+
+    assert store.trim(before_us=50) == 4
+    assert len(store) == 5
+    assert store.users.values == ['user0', 'user1']
+    assert store.data_types.values == ['customer_data']
+    assert store.actions.values == ['read', 'write']
+
+    assert store.aggregate('old0') == {}
+    assert store.aggregate('user1') == {
+        'access_frequency': 3,
+        'data_types': {'customer_data': 3},
+        'actions': {'write': 2, 'read': 1},
+        'last_access_us': 200
+    }
+
+    # New values are appended after the compacted codes
+    store.append('user2', 'archive', 'delete', 300)
+    assert store.aggregate('user2')['actions'] == {'delete': 1}
+    assert store.aggregate('user0')['access_frequency'] == 2
@@ -0,0 +1,21 @@
+import logging
+from src.feature_encoder import FeatureEncoder
+
+
+def test_unknown_features_are_dropped_and_logged_once(caplog):
+    encoder = FeatureEncoder(['risk_score', 'context_score'])
+    rows = [
+        {'risk_score': 0.5, 'context_score': 0.2, 'device': 3},
+        {'risk_score': 0.1, 'device': 4, 'geo': 1},
+    ]
+
+    with caplog.at_level(logging.WARNING, logger='src.feature_encoder'):
+        X = encoder.transform(rows)
+        encoder.transform(rows)
+
+    assert X.tolist() == [[0.5, 0.2], [0.1, 0.0]]
+    warnings = [r.getMessage() for r in caplog.records]
+    assert warnings == [
+        "Ignoring features not in the model schema: ['device']",
+        "Ignoring features not in the model schema: ['geo']",
+    ]
@@ -0,0 +1,11 @@
+from src.load_generator import run_load, write_requests
+
+
+def test_generated_stream_reaches_rules_and_model(tmp_path):
+    path = str(tmp_path / 'stream.jsonl')
+    write_requests(path, requests=2000, users=200, policies=20)
+
+    report = run_load(path, threads=2)
+    assert report['calls'] == 2000
+    assert report['errors'] == 0
+    assert report['no_context_rate'] < 0.01
@@ -0,0 +1,24 @@
+import os
+from src.data_tracker import DataTracker
+from src.log_export import export_npz, iter_npz_chunks, iter_npz_events
+
+
+def test_export_round_trip_with_chunk_local_vocabularies(tmp_path):
+    tracker = DataTracker(str(tmp_path / 'access.db'))
+    for i in range(10):
+        tracker.log_access(
+            f'user{i}', 'customer_data', 'read', i % 2 == 0,
+            {'location': 'office', 'request': i}
+        )
+    expected = list(tracker.iter_events())
+
+    directory = str(tmp_path / 'export')
+    manifest = export_npz(tracker, directory, chunk_size=4)
+    assert manifest['rows'] == 10
+    assert 'vocabularies' not in manifest
+
+    chunks = list(iter_npz_chunks(directory))
+    assert [len(chunk['user_id_values']) for chunk in chunks] == [4, 4, 2]
+    assert list(iter_npz_events(directory)) == expected
+    tracker.close()
+    assert os.path.exists(os.path.join(directory, 'manifest.json'))
@@ -0,0 +1,110 @@
+import json
+import time
+import pytest
+from src.policy_manager import PolicyManager
+from src.policy_snapshot import (
+    SnapshotError, build_snapshot, import_json, load, load_packed,
+    save_packed
+)
+from tests.test_batch import LOCATION_POLICY
+
+
+@pytest.mark.parametrize('content', [
+    '{"p": [1, 2]}',
+    '{"p": {"rules": "not a list"}}',
+    '{"p": {"rules": [{"data_type": "x", "conditions": 5}]}}',
+    '{"format_version": 1, "policies": []}',
+    '{"format_version": 1, "policies": {}, "inactive": 3}',
+    '[]',
+    '{not json'
+])
+def test_malformed_policy_file_raises_snapshot_error(tmp_path, content):
+    path = tmp_path / 'policies.json'
+    path.write_text(content)
+
+    with pytest.raises(SnapshotError):
+        import_json(str(path))
+    manager = PolicyManager(str(path))
+    assert manager.policies == {}
+
+
+def test_packed_round_trip_recompiles(tmp_path):
+    path = str(tmp_path / 'policies.pack')
+    snapshot = build_snapshot(
+        {'location': LOCATION_POLICY, 'off': LOCATION_POLICY},
+        {'off': False},
+        version=7
+    )
+    save_packed(snapshot, path)
+
+    loaded = load(path)
+    assert loaded.version == 7
+    assert loaded.policies == snapshot.policies
+    assert loaded.active_policies == {'location': True, 'off': False}
+    assert list(loaded.index.lookup('customer_data', 'read')) == ['location']
+
+
+def test_corrupt_packed_file_raises_snapshot_error(tmp_path):
+    path = tmp_path / 'policies.pack'
+    save_packed(build_snapshot({'location': LOCATION_POLICY}), str(path))
+    data = bytearray(path.read_bytes())
+    data[-2] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(SnapshotError):
+        load_packed(str(path))
+    assert not PolicyManager(str(path)).policies
+
+
+def test_watcher_survives_bad_files(tmp_path, monkeypatch):
+    path = tmp_path / 'policies.json'
+    path.write_text(json.dumps({'location': LOCATION_POLICY}))
+    manager = PolicyManager(str(path))
+    before = manager.generation
+
+    calls = []
+
+    def broken_load(policy_file):
+        calls.append(policy_file)
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(manager, 'load_policies', broken_load)
+    thread = manager.watch(str(path), interval=0.01)
+    try:
+        path.write_text('{not json')
+        _wait_for(lambda: calls)
+        assert thread.is_alive()
+        assert manager.generation is before
+
+        monkeypatch.undo()
+        path.write_text(json.dumps({'other': LOCATION_POLICY}))
+        _wait_for(lambda: 'other' in manager.policies)
+    finally:
+        manager.stop_watching()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_add_policies_publishes_one_generation():
+    manager = PolicyManager()
+    manager.add_policy('first', LOCATION_POLICY)
+    before = manager.version
+
+    assert manager.add_policies({
+        'second': LOCATION_POLICY, 'third': LOCATION_POLICY
+    })
+    assert set(manager.active_policies) == {'first', 'second', 'third'}
+    assert set(manager.get_policies_for('customer_data', 'read')) == {
+        'first', 'second', 'third'
+    }
+    assert manager.version > before
+
+    broken = {'rules': [{'data_type': 'x', 'conditions': 5}]}
+    generation = manager.generation
+    assert not manager.add_policies({'fourth': LOCATION_POLICY, 'bad': broken})
+    assert manager.generation is generation
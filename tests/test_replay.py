@@ -0,0 +1,58 @@
+import time
+from src.replay import replay
+
+
+class FailingEngine:
+    """Answers like an engine whose checks fail at different layers."""
+
+    def __init__(self):
+        self.reasons = iter(['Error during check', 'System error', 'Denied'])
+
+    def check_access(self, user_id, data_type, action, context):
+        return {'allowed': False, 'reason': next(self.reasons)}
+
+
+def test_replay_counts_enforcer_and_engine_errors():
+    events = [
+        (i, 'alice', 'customer_data', 'read', 0, '{"location": "office"}')
+        for i in range(3)
+    ]
+    stats = replay(FailingEngine(), events)
+    assert stats['errors'] == 2
+    assert stats['denied'] == 3
+
+
+class SlowEngine:
+    """Allows everything, taking ``delay`` seconds per check."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def check_access(self, user_id, data_type, action, context):
+        time.sleep(self.delay)
+        return {'allowed': True}
+
+
+def test_paced_replay_measures_latency_from_due_time():
+    events = [
+        (i, 'alice', 'customer_data', 'read', 1, None) for i in range(20)
+    ]
+    # Each check takes twice the send interval, so the run falls behind
+    stats = replay(SlowEngine(0.01), events, rate=200)
+
+    assert stats['calls'] == 20
+    assert stats['changed_decisions'] == 0
+    assert stats['p99_us'] < 50_000
+    # The last event is due at 95ms but finishes around 200ms
+    assert stats['corrected_p99_us'] > 80_000
+    assert stats['max_lag_s'] > 0.05
+
+
+def test_unpaced_replay_reports_service_time_only(monkeypatch):
+    monkeypatch.setattr('src.replay.LATENCY_BLOCK', 2)
+    events = [
+        (i, 'alice', 'customer_data', 'read', 1, None) for i in range(5)
+    ]
+    stats = replay(SlowEngine(0), events)
+    assert stats['calls'] == 5
+    assert 'corrected_p99_us' not in stats
@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+from src.policy_manager import PolicyManager
+from src.rule_engine import RequestFacts, RuleCompilationError, RuleEngine
+
+WEEKDAY_NOON = datetime(2024, 1, 3, 12, 0)
+
+
+def facts(context, risk_score=0.0):
+    return RequestFacts('customer_data', 'read', context, risk_score,
+                        WEEKDAY_NOON)
+
+
+def test_broken_rule_raises():
+    with pytest.raises(RuleCompilationError):
+        RuleEngine().compile_rule({
+            'data_type': 'customer_data',
+            'conditions': {'time_range': ['9am', '5pm']},
+            'action': 'deny'
+        })
+
+
+def test_policy_with_broken_rule_is_rejected():
+    manager = PolicyManager()
+    added = manager.add_policy('broken', {
+        'rules': [{
+            'data_type': 'customer_data',
+            'conditions': {'time_range': ['9am', '5pm']},
+            'action': 'deny'
+        }]
+    })
+    assert added is False
+    assert 'broken' not in manager.policies
+    assert len(manager.get_rules_for('customer_data', 'read')) == 0
+
+
+def test_bare_number_is_equality_for_other_fields():
+    rule = RuleEngine().compile_rule({
+        'conditions': {'clearance': 3}, 'action': 'allow'
+    })
+    assert rule.matches(facts({'clearance': 3}))
+    assert not rule.matches(facts({'clearance': 2}))
+
+
+def test_bare_number_is_maximum_for_numeric_fields():
+    rule = RuleEngine().compile_rule({
+        'conditions': {'risk_score': 0.5}, 'action': 'allow'
+    })
+    assert rule.matches(facts({}, risk_score=0.4))
+    assert not rule.matches(facts({}, risk_score=0.6))
+
+
+def test_request_action_limits_mined_rules():
+    rule = {
+        'id': 'rule_read', 'data_type': 'customer_data',
+        'request_action': 'read', 'conditions': {'location': 'office'},
+        'action': 'allow'
+    }
+    compiled = RuleEngine().compile_rule(rule)
+    office = {'location': 'office'}
+    assert compiled.matches(facts(office))
+    assert not compiled.matches(
+        RequestFacts('customer_data', 'write', office, 0.0, WEEKDAY_NOON)
+    )
+
+    manager = PolicyManager()
+    manager.add_policy('mined', {'rules': [rule]})
+    assert len(manager.get_rules_for('customer_data', 'read')) == 1
+    assert len(manager.get_rules_for('customer_data', 'write')) == 0
+    assert len(manager.get_rules_for('customer_data', 'delete')) == 0
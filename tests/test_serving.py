@@ -0,0 +1,49 @@
+import os
+import joblib
+from src.benchmark import build_engine, generate_workload
+from src.serving import ProcessPoolEngine
+from tests.test_batch import make_engine, request
+
+REQUESTS = [
+    request('alice', 'office'),
+    request('bob', 'office'),
+    request('alice'),
+    request('carol', 'home'),
+    request('alice', 'home'),
+    request('bob'),
+    request('alice'),
+    request('dave')
+]
+
+
+def test_pool_matches_separate_calls():
+    single = make_engine()
+    expected = [
+        single.check_access(
+            r['user_id'], r['data_type'], r['action'], r['context']
+        )['allowed']
+        for r in REQUESTS
+    ]
+
+    with ProcessPoolEngine(make_engine(), workers=2, batch_size=2) as pool:
+        results = pool.check_access_batch(REQUESTS)
+
+    assert expected == [True, True, True, False, False, True, False, False]
+    assert [result['allowed'] for result in results] == expected
+    assert results[-1]['reason'] == 'No context available'
+
+
+def test_pool_serves_a_trained_model_from_the_compiled_forest():
+    workload = generate_workload(users=50, policies=5, requests=300, events=0)
+    expected = build_engine(workload).check_access_batch(workload['requests'])
+
+    engine = build_engine(workload)
+    with ProcessPoolEngine(engine, workers=2, batch_size=64) as pool:
+        results = pool.check_access_batch(workload['requests'])
+        saved = joblib.load(
+            os.path.join(pool._model_dir.name, 'model.joblib')
+        )
+
+    assert engine.ml_engine.compiled is not None
+    assert saved['model'] is None and saved['compiled'] is not None
+    assert [r['allowed'] for r in results] == [r['allowed'] for r in expected]
@@ -0,0 +1,19 @@
+import pytest
+from src.user_context import UserContext
+
+
+@pytest.mark.parametrize('factor', [0.6, 0.25, 0.1])
+@pytest.mark.parametrize('attempts', [0, 0.5, 1, 2, 3, 7])
+def test_failed_attempts_risk_is_exact(monkeypatch, factor, attempts):
+    monkeypatch.setattr(UserContext, '_time_bit', staticmethod(lambda: 0))
+    user_context = UserContext()
+    user_context.risk_factors['failed_attempts'] = factor
+    user_context.update_context(
+        'alice', {'vpn_enabled': True, 'failed_attempts': attempts}
+    )
+
+    # The scoring before risk masks: VPN plus capped failed attempts
+    expected = 0.2 + min(factor * attempts, 0.8)
+    assert user_context.evaluate_risk('alice') == pytest.approx(expected)
+    assert user_context.evaluate_risk_batch(['alice', 'nobody']).tolist() == \
+        pytest.approx([expected, 1.0])